@@ -1,5 +1,9 @@
 """circular-bias-detection package"""
+__version__ = "1.5.0"
+
 from .api import detect_bias
+from .multi_metric import detect_bias_multi
+from .sharding import merge_permutation_results
 from .adapters.sklearn_adapter import SklearnCBDModel
 
-__all__ = ["detect_bias", "SklearnCBDModel"]
+__all__ = ["detect_bias", "detect_bias_multi", "merge_permutation_results", "SklearnCBDModel"]
@@ -1,9 +1,27 @@
 """Core API: CBDModel protocol and detect_bias implementation (permutation test)."""
-from typing import Protocol, runtime_checkable, Optional, Callable, Any, Dict, List, Literal, Union
+from typing import Protocol, runtime_checkable, Optional, Callable, Any, Dict, Literal, Sequence, Union
+import time
 import numpy as np
-from copy import deepcopy
 import warnings
 from sklearn.utils import check_array, check_consistent_length
+from sklearn.utils.multiclass import type_of_target
+from scipy.sparse import issparse
+
+from .fast_metrics import metric_greater_is_better, resolve_batched_metric
+from .exact_null import binary_exact_null, sampled_table_null, mann_whitney_null, exceeds
+from .sequential import StoppingRule, TimeBudget, make_stopping_rule
+from .permutations import PermutationStream, as_seed_sequence
+from .scheduler import BlockScheduler, InnerThreads, resolve_inner_threads
+from .retrain import RetrainEngine, subsample_error_bound
+from .smoothers import as_smoother, smoother_from_estimator
+from .tail import gpd_tail_pvalue
+from .checkpoint import (PermutationCheckpoint, describe_callable, input_fingerprint,
+                         seed_from_state, seed_state)
+from .sharding import shard_bounds
+from .sketch import summarize_null
+from .progressive import NestedSampler, progressive_detect_bias
+from .cache import NullCache, default_null_cache, null_cache_key, stable_metric_identity
+from .autotune import CostModel, MachineProfile, default_profile
 
 MetricFn = Callable[[Any, Any], float]
 BackendType = Literal["threads", "processes"]
@@ -23,6 +41,31 @@ def _ensure_predict(model):
     if not hasattr(model, "predict"):
         raise ValueError("Model must implement predict(X)")
 
+def _row_indexable(X):
+    """X itself, or a CSR copy for sparse formats without row indexing (COO, DIA, ...)."""
+    if issparse(X) and X.format not in ("csr", "csc"):
+        return X.tocsr()
+    return X
+
+
+def _predict_method(model, allow_proba: bool) -> str:
+    """Name of the model method producing the predictions the metric is given."""
+    if not allow_proba:
+        return "predict"
+    if hasattr(model, "predict_proba"):
+        return "predict_proba"
+    if hasattr(model, "decision_function"):
+        warnings.warn(
+            "Model lacks predict_proba but has decision_function. Using decision_function as fallback.",
+            UserWarning
+        )
+        return "decision_function"
+    raise ValueError(
+        "allow_proba=True but model has neither predict_proba nor decision_function. "
+        "Set allow_proba=False or use a model with probability outputs."
+    )
+
+
 def detect_bias(model: CBDModel,
                 X,
                 y,
@@ -36,8 +79,31 @@ def detect_bias(model: CBDModel,
                 null_method: Literal["permute", "retrain"] = "permute",
                 subsample_size: Optional[int] = None,
                 confidence_level: float = 0.95,
-                stratify: bool = False,
-                alpha: float = 0.05) -> Dict[str, Any]:
+                stratify: Union[bool, Any] = False,
+                alpha: float = 0.05,
+                exact: bool = False,
+                auc_null: Literal["auto", "exact", "normal"] = "auto",
+                early_stopping: Optional[Union[str, StoppingRule]] = None,
+                chunk_size: Optional[int] = None,
+                retrain_strategy: str = "auto",
+                retrain_subsample: Optional[Union[int, float]] = None,
+                smoother=None,
+                tail_approximation: bool = False,
+                time_budget_s: Optional[float] = None,
+                checkpoint: Optional[str] = None,
+                checkpoint_every: Optional[int] = None,
+                shard_index: Optional[int] = None,
+                n_shards: Optional[int] = None,
+                null_summary: bool = False,
+                null_thresholds: Sequence[float] = (),
+                executor=None,
+                inner_threads: InnerThreads = "auto",
+                progressive: bool = False,
+                progressive_growth: float = 2.0,
+                null_cache: Union[bool, NullCache, None] = None,
+                auto_tune: Union[bool, MachineProfile] = False,
+                metric_key: Optional[str] = None,
+                greater_is_better: Optional[bool] = None) -> Dict[str, Any]:
     """
     Perform a permutation test to detect unusually high metric values that could indicate circular bias.
     
@@ -51,21 +117,30 @@ def detect_bias(model: CBDModel,
     y : array-like, shape (n_samples,)
         Target labels. Accepts numpy arrays, pandas Series, or lists.
         Will be converted to 1D numpy array internally.
-        Must contain at least 2 unique classes for meaningful testing.
+        Must contain at least 2 unique classes for meaningful testing, unless y is a
+        continuous target scored by a linear-in-labels metric (see Notes).
     metric : callable
         Metric function(y_true, y_pred) -> float
         For probability metrics (AUC, log_loss), set allow_proba=True
     n_permutations : int, default=1000
         Number of label shuffles for null distribution.
         Recommended: 100 for quick tests, >=1000 for robust results
-    random_state : int, optional
-        Random seed for reproducibility. Uses numpy.random.Generator internally.
+    random_state : int or numpy.random.SeedSequence, optional
+        Random seed for reproducibility. Uses numpy.random.Generator internally;
+        permutations come from per-block child streams of this seed (see
+        cbd.permutations), so results do not depend on chunk_size or n_jobs.
     return_permutations : bool, default=False
-        If True, return all permuted metric values
+        If True, return all permuted metric values as a float64 NumPy array
+        ('permuted_metrics'; 'null_support' and 'null_pmf' for exact binary nulls)
     n_jobs : int, default=1
-        Number of parallel workers. -1 uses all CPUs
+        Number of parallel workers. -1 uses all CPUs. Each worker evaluates contiguous
+        blocks of the permutation stream (see cbd.scheduler); results do not depend on n_jobs.
     backend : {'threads', 'processes'}, default='threads'
-        Parallel backend. Use 'processes' if model is picklable and GIL is a bottleneck
+        Parallel backend. Use 'processes' if model is picklable and GIL is a bottleneck.
+        With 'processes', y, the predictions and X (dense, or CSR/CSC components) are
+        written once per run to a temporary memory-mapped folder (in RAM under /dev/shm
+        when available) and workers, including retrain workers, use zero-copy views;
+        the folder is removed when the run ends, also on failure.
     allow_proba : bool, default=False
         If True, use predict_proba for metrics requiring probabilities (e.g., AUC, log_loss).
         Model must have predict_proba() or decision_function() method.
@@ -74,14 +149,163 @@ def detect_bias(model: CBDModel,
         'retrain': retrain model on each permutation (conservative but slow, requires fit())
     subsample_size : int, optional
         If specified, subsample this many samples for faster computation on large datasets.
-        Recommended for n_samples > 10000. If None, uses all samples.
+        Recommended for n_samples > 10000. If None, uses all samples. With
+        progressive=True, the size of the first subsample.
     confidence_level : float, default=0.95
         Confidence level for p-value confidence interval (when n_permutations >= 1000)
-    stratify : bool, default=False
+    stratify : bool or array-like of shape (n_samples,), default=False
         If True, preserve class distribution in each permutation (stratified shuffle).
+        An array of group labels instead restricts shuffles to within each group.
+        Permutations of all groups are generated a block at a time by
+        cbd.permutations.grouped_permutations.
         Recommended for imbalanced datasets to avoid spurious results.
     alpha : float, default=0.05
         Significance level for hypothesis test. Returned in conclusion.
+    exact : bool, default=False
+        Compute the permutation null analytically instead of by Monte Carlo. Requires
+        null_method='permute' and a count-based metric recognized by cbd.fast_metrics.
+        For binary labels the confusion table is hypergeometric and the p-value is exact
+        (n_permutations is ignored); for k classes, n_permutations contingency tables
+        are sampled directly from the multivariate hypergeometric null, at O(k^2) cost
+        per draw regardless of n_samples. For binary ROC AUC (see auc_null) the
+        Mann-Whitney U null is used.
+    auc_null : {'auto', 'exact', 'normal'}, default='auto'
+        U null used when exact=True with a recognized ROC AUC metric: the exact
+        distribution (untied scores only), the normal approximation with tie
+        correction, or 'auto' to pick exact for small, untied problems.
+    early_stopping : {'besag_clifford', 'sprt'} or cbd.sequential.StoppingRule, optional
+        Process permutations in chunks and stop once the decision at alpha is settled.
+        'besag_clifford' stops at the h-th exceedance (p = h / L); 'sprt' runs a Wald
+        sequential test around alpha with bounded error rates. n_permutations is then an
+        upper bound; the result reports 'n_permutations_used' and 'stopping_reason'
+        ('completed' if the budget ran out first).
+    chunk_size : int, optional
+        Number of permutations generated and evaluated at a time by each worker. Peak
+        memory of the null computation is about n_workers * chunk_size * n_samples
+        index entries. By default it is tuned to give each worker a few contiguous
+        blocks per round, capped at cbd.fast_metrics.MAX_BLOCK_ELEMENTS indices.
+    retrain_strategy : {'auto', 'closed_form', 'refit', 'warm_start', 'partial_fit'}, default='auto'
+        How null_method='retrain' refits the model (see cbd.retrain). 'closed_form'
+        computes all refit predictions as H @ y_perm for a linear smoother H (see
+        cbd.smoothers and the smoother parameter). 'refit' fits an unfitted clone,
+        reused by each worker; 'warm_start' starts every refit from the fitted model's
+        solution; 'partial_fit' runs a few partial_fit passes on a fresh clone. 'auto'
+        uses 'closed_form' for recognized smoothers (LinearRegression, Ridge,
+        KernelRidge, uniform KNeighborsRegressor), then 'warm_start' for convex linear
+        models with deterministic solvers (cbd.retrain.CONVEX_WARM_START: LogisticRegression,
+        Lasso, ElasticNet, ...), else 'refit'. Request 'warm_start' explicitly for other
+        estimators with a warm_start parameter (e.g. SGD models, MLPs)
+        only if refits started from the fitted model are acceptable: they are no longer
+        independent of the original fit.
+    retrain_subsample : int or float, optional
+        Refit on this many rows (or this fraction of rows) and predict on all rows. The
+        result's 'retrain' entry then reports an error bound measured on a few
+        permutations refit on all rows, and the p-value range it implies.
+    smoother : array-like of shape (n_samples, n_samples), sparse matrix or cbd.smoothers.LinearSmoother, optional
+        Explicit smoother operator H of a model whose refit predictions are H @ y, for
+        the closed-form retrain null. Overrides estimator recognition.
+    tail_approximation : bool, default=False
+        When fewer than 10 permuted statistics reach the observed one, fit a
+        generalized Pareto distribution to the upper tail of the null and report the
+        extrapolated p-value (p_value_method='gpd_tail') with a bootstrap confidence
+        interval, instead of the empirical p-value floored at 1 / (n_permutations + 1).
+        The fit details are reported under 'tail_fit' (see cbd.tail). Needs at least
+        80 permutations; cannot be combined with exact=True or early_stopping.
+    time_budget_s : float, optional
+        Wall-clock budget of the whole call in seconds. Permutations are generated and
+        evaluated in rounds sized from the measured throughput (see
+        cbd.sequential.TimeBudget) until the budget is nearly used; n_permutations is
+        then an upper bound (pass a large value to let the budget decide). A round in
+        progress is never interrupted, so the call may overrun by a fraction of one
+        round. The result reports 'n_permutations_used', 'elapsed_s',
+        'stopping_reason' ('time_budget' or 'completed'), the p-value interval
+        'p_value_ci' with its width 'p_value_ci_width', and 'decision_determined': True
+        when the whole interval lies on one side of alpha. Can be combined with
+        early_stopping, not with exact=True.
+    checkpoint : str or os.PathLike, optional
+        Base path of a checkpoint ('<path>.npz' with the permuted statistics so far,
+        '<path>.json' manifest with the stream position and an input fingerprint; see
+        cbd.checkpoint). Progress is saved every checkpoint_every permutations; rerunning
+        with the same inputs and arguments resumes after the last save and gives a
+        bit-identical null. n_jobs, backend, chunk_size and n_permutations may change
+        between runs (a larger n_permutations extends a finished run). Unseeded runs
+        reuse the seed recorded in the checkpoint. The files are kept after the run.
+        A checkpoint written with different inputs raises ValueError.
+    checkpoint_every : int, optional
+        Permutations between checkpoint saves (default: 5% of n_permutations)
+    shard_index, n_shards : int, optional
+        Compute only shard shard_index of n_shards disjoint, contiguous slices of the
+        permutation stream (see cbd.sharding), e.g. one per machine. All shards must be
+        called with the same arguments and an explicit random_state;
+        cbd.sharding.merge_permutation_results combines their outputs into the result
+        of the single-node run. A shard result reports its own slice's p-value, always
+        contains 'permuted_metrics' and has a 'shard' entry used by the merge. Cannot
+        be combined with exact=True, early_stopping, time_budget_s or
+        tail_approximation, which need the whole null.
+    null_summary : bool, default=False
+        If True, add 'null_summary': a JSON-ready dict of a few KB with a mergeable KLL
+        quantile sketch of the null, exact exceedance counts at the observed statistic
+        and at null_thresholds, and the null's count, mean, std, min and max. Load it
+        with cbd.sketch.NullSummary.from_dict to query quantiles or merge summaries.
+    null_thresholds : sequence of float, default=()
+        Extra thresholds t at which null_summary counts #{null >= t} exactly
+        (#{null <= t} when greater_is_better is False)
+    executor : concurrent.futures.Executor-compatible, optional
+        Run the permutation blocks on this executor (anything with submit(fn, *args)
+        returning futures, e.g. a ProcessPoolExecutor or a dask.distributed Client)
+        instead of a joblib pool; see cbd.scheduler. model and metric must be
+        picklable for process or cluster executors. The executor is not shut down.
+        Results are identical to a sequential run.
+    inner_threads : int, 'auto' or None, default='auto'
+        Native BLAS/OpenMP threads (OpenBLAS, MKL, OpenMP via threadpoolctl) allowed
+        per permutation worker, to avoid n_jobs workers each starting a full set of
+        native threads, e.g. with null_method='retrain'. 'auto' allows
+        cpu_count // n_workers threads when running in parallel and sets no limit
+        for sequential runs; None never limits. The effective layout is reported
+        in 'thread_layout'.
+    progressive : bool, default=False
+        Progressive subsampling for very large test sets (see cbd.progressive): test
+        a subsample of subsample_size rows (default 1000; class-stratified for
+        classification targets), then grow it by progressive_growth until the
+        decision p_value <= alpha agrees at two consecutive sizes or all rows are
+        used. Subsamples are nested and only the added rows are predicted. The
+        result is that of the last step, with a 'progressive' entry listing every
+        step. Requires null_method='permute'; cannot be combined with checkpoint or
+        shard_index / n_shards.
+    progressive_growth : float, default=2.0
+        Growth factor of the subsample between progressive steps (> 1)
+    null_cache : cbd.cache.NullCache or bool, optional
+        Look the permutation null up in this cache (True: the process-wide in-memory
+        cache, cbd.cache.default_null_cache()) before permuting, and store it after.
+        The key is a hash of y, the predictions, the metric, the permutation groups,
+        the seed and n_permutations, so a hit returns the identical null and only the
+        predictions and observed statistic are computed. 'null_cache' in the result
+        reports whether it was a hit and the cache's hit/miss counters. Requires
+        null_method='permute' and an explicit random_state; cannot be combined with
+        exact=True, early_stopping, time_budget_s, checkpoint or shard_index / n_shards.
+        Lambdas, closures and bound methods need metric_key.
+    auto_tune : bool or cbd.autotune.MachineProfile, default=False
+        Choose n_jobs, backend and chunk_size (overriding the arguments) from a
+        benchmarked machine profile (True: the stored profile, calibrated and
+        saved on first use with a warning; run cbd.autotune.calibrate or
+        'python -m cbd.autotune' ahead of time to avoid that), and with time_budget_s
+        lower n_permutations to what the profile predicts fits the budget.
+        'auto_tune' in the result reports the plan, its predicted and the actual
+        seconds of the null computation, and whether the run was folded into the
+        profile's runtime correction ('observed'; not for null_cache hits or resumed
+        checkpoints). Requires null_method='permute'; cannot be
+        combined with exact=True or executor.
+    metric_key : str, optional
+        Name identifying the metric in the null_cache key, in place of its
+        qualified name; required to cache metrics without a stable identity
+        (lambdas, closures, bound methods)
+    greater_is_better : bool, optional
+        Orientation of the metric. The test counts permuted values at least as good
+        as the observed one: >= for scores, <= for losses. None detects scikit-learn
+        losses (mean_squared_error, brier_score_loss, log_loss, ...; see
+        cbd.fast_metrics.metric_greater_is_better) and treats everything else as a
+        score; pass False for custom losses. permuted_metrics are reported as metric
+        values either way.
     
     Returns:
     --------
@@ -93,9 +317,10 @@ def detect_bias(model: CBDModel,
     ValueError
         - If model lacks required methods
         - If X and y have inconsistent lengths
-        - If y has fewer than 2 unique classes
+        - If y has fewer than 2 unique classes (classification targets)
         - If allow_proba=True but model lacks predict_proba/decision_function
         - If null_method='retrain' but model lacks fit()
+        - If exact=True with an unsupported metric, null_method or stratify
     
     Notes:
     ------
@@ -104,6 +329,22 @@ def detect_bias(model: CBDModel,
       or sampling variation. Always combine with reproducibility checks and data audits.
     - For multiple comparisons, consider Bonferroni or Benjamini-Hochberg correction.
     - Random state handling uses numpy.random.Generator for improved reproducibility.
+    - With null_method='permute', recognized scikit-learn metrics (accuracy, balanced
+      accuracy, precision/recall/F1 and MCC, optionally wrapped in functools.partial)
+      are evaluated on whole blocks of permutations by vectorized kernels, and binary
+      ROC AUC (roc_auc_score on 1D scores, or cbd.fast_metrics.roc_auc_positive) by
+      a rank-sum kernel. MSE, R^2, Brier score, binary log-loss and
+      cbd.fast_metrics.pearson_r are linear in the labels and their whole null is a
+      single matrix-vector product; for these, continuous targets are accepted
+      without the two-class check. Other callables are invoked once per permutation.
+    - Memory: X is passed to predict as given (no copy; CSR/CSC and float32 are
+      preserved) and is never densified; with subsample_size or progressive, other
+      sparse formats are converted to CSR to select rows. For count-based metrics,
+      labels are encoded as uint8 codes (uint16 beyond 256 classes) and permutation
+      blocks hold at most cbd.fast_metrics.MAX_BLOCK_ELEMENTS cells of int32 indices
+      and compact codes plus a bounded int64 key buffer, so peak memory beyond the
+      inputs and predictions is about 30 MB plus a few tens of bytes per sample for
+      label encoding, whatever the size of X.
     
     Examples:
     ---------
@@ -122,44 +363,160 @@ def detect_bias(model: CBDModel,
     """
     import numpy as _np
 
+    t_start = time.perf_counter()
     _ensure_predict(model)
 
     # ===== INPUT VALIDATION =====
-    # Standardize X to numpy array (supports pandas, sparse, etc.)
-    X_a = check_array(X, accept_sparse=True, force_all_finite=False, ensure_2d=True)
+    # Standardize X to numpy array (supports pandas, sparse, etc.). Arrays and
+    # sparse matrices are passed through without a copy and keep their format
+    # and dtype (float32 stays float32); only pandas and lists are converted
+    X_a = check_array(X, accept_sparse=True, force_all_finite=False, ensure_2d=True,
+                      dtype=None, copy=False)
     
     # Standardize y to 1D numpy array
     y_a = _np.asarray(y).ravel()
     
     # Check consistent lengths
     check_consistent_length(X_a, y_a)
+
+    # Stratification groups: the classes of y, or user-supplied groups
+    stratify_by_class = isinstance(stratify, (bool, _np.bool_)) and bool(stratify)
+    if stratify is None or isinstance(stratify, (bool, _np.bool_)):
+        groups = None
+    else:
+        groups = _np.asarray(stratify).ravel()
+        check_consistent_length(y_a, groups)
     
-    # Validate y has at least 2 unique classes
-    unique_classes = _np.unique(y_a)
-    n_classes = len(unique_classes)
-    if n_classes < 2:
-        raise ValueError(
-            f"y must contain at least 2 unique classes for meaningful permutation test. "
-            f"Found {n_classes} class(es): {unique_classes}. "
-            f"Single-class data makes metrics like accuracy undefined."
-        )
+    # Metrics with a vectorized null kernel (label permutation only)
+    batched_metric = resolve_batched_metric(metric) if null_method == "permute" else None
+
+    # Validate y has at least 2 unique classes; continuous targets scored by a
+    # linear-in-labels metric (MSE, R^2, ...) have no classes to count
+    if (batched_metric is not None and batched_metric.family == "linear"
+            and type_of_target(y_a) == "continuous"):
+        n_classes = None
+    else:
+        unique_classes = _np.unique(y_a)
+        n_classes = len(unique_classes)
+        if n_classes < 2:
+            raise ValueError(
+                f"y must contain at least 2 unique classes for meaningful permutation test. "
+                f"Found {n_classes} class(es): {unique_classes}. "
+                f"Single-class data makes metrics like accuracy undefined."
+            )
     
     # Validate alpha
     if not 0 < alpha < 1:
         raise ValueError(f"alpha must be in (0, 1), got {alpha}")
     
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError(f"chunk_size must be >= 1, got {chunk_size}")
+    if executor is not None and not callable(getattr(executor, "submit", None)):
+        raise ValueError("executor must provide submit(fn, *args), like concurrent.futures.Executor")
+    resolve_inner_threads(inner_threads, 1)
+
+    if progressive:
+        if null_method != "permute":
+            raise ValueError("progressive subsampling requires null_method='permute'")
+        if checkpoint is not None or shard_index is not None or n_shards is not None:
+            raise ValueError("progressive cannot be combined with checkpoint or shard_index / n_shards")
+        return progressive_detect_bias(
+            model, _row_indexable(X_a), y_a, metric, _predict_method(model, allow_proba),
+            start_size=subsample_size, growth=progressive_growth,
+            stratify_sample=n_classes is not None and type_of_target(y_a) in ("binary", "multiclass"),
+            groups=groups, random_state=random_state, alpha=alpha,
+            n_permutations=n_permutations, return_permutations=return_permutations,
+            n_jobs=n_jobs, backend=backend, confidence_level=confidence_level,
+            stratify=stratify_by_class, exact=exact, auc_null=auc_null,
+            early_stopping=early_stopping, chunk_size=chunk_size,
+            tail_approximation=tail_approximation, time_budget_s=time_budget_s,
+            null_summary=null_summary, null_thresholds=null_thresholds,
+            executor=executor, inner_threads=inner_threads, null_cache=null_cache,
+            auto_tune=auto_tune, metric_key=metric_key, greater_is_better=greater_is_better,
+        )
+
     # ===== RANDOM STATE SETUP =====
-    # Use numpy.random.Generator for improved reproducibility
-    if random_state is None:
-        rng = _np.random.default_rng()
-    else:
-        rng = _np.random.default_rng(random_state)
+    # Use numpy.random.Generator for improved reproducibility; permutations are
+    # drawn from child streams of the same master seed
+    sharded = shard_index is not None or n_shards is not None
+    range_start, range_stop = 0, n_permutations
+    if sharded:
+        if shard_index is None or n_shards is None:
+            raise ValueError("shard_index and n_shards must be given together")
+        range_start, range_stop = shard_bounds(n_permutations, shard_index, n_shards)
+        if not isinstance(random_state, (int, _np.integer, _np.random.SeedSequence)):
+            raise ValueError("Sharded runs need an explicit integer or SeedSequence random_state")
+        if exact or early_stopping is not None or time_budget_s is not None or tail_approximation:
+            raise ValueError(
+                "shard_index / n_shards cannot be combined with exact=True, early_stopping, "
+                "time_budget_s or tail_approximation"
+            )
+
+    cache = (default_null_cache() if null_cache is True
+             else None if null_cache is None or null_cache is False else null_cache)
+    if cache is not None:
+        if not isinstance(random_state, (int, _np.integer, _np.random.SeedSequence)):
+            raise ValueError("null_cache needs an explicit integer or SeedSequence random_state")
+        if (null_method != "permute" or exact or early_stopping is not None
+                or time_budget_s is not None or checkpoint is not None or sharded):
+            raise ValueError(
+                "null_cache requires null_method='permute' and cannot be combined with "
+                "exact=True, early_stopping, time_budget_s, checkpoint or shard_index / n_shards"
+            )
+        if metric_key is None and stable_metric_identity(metric) is None:
+            raise ValueError(
+                "null_cache cannot identify a lambda, closure or bound method metric; "
+                "pass metric_key to name it"
+            )
+
+    tuner = None
+    if auto_tune is not None and auto_tune is not False:
+        if null_method != "permute" or exact or executor is not None:
+            raise ValueError(
+                "auto_tune requires null_method='permute' and cannot be combined with "
+                "exact=True or executor"
+            )
+        tuner = CostModel(default_profile() if auto_tune is True else auto_tune)
+
+    ckpt = None
+    resumed = None
+    fingerprint = None
+    if checkpoint is not None or sharded:
+        if exact:
+            raise ValueError("checkpoint requires the Monte Carlo null (exact=False)")
+        seeded = isinstance(random_state, (int, _np.integer, _np.random.SeedSequence))
+        fingerprint = input_fingerprint(
+            X_a, y_a, groups,
+            model=describe_callable(model), metric=describe_callable(metric),
+            random_state=(seed_state(random_state) if isinstance(random_state, _np.random.SeedSequence)
+                          else int(random_state) if seeded else "unseeded"),
+            stratify_by_class=stratify_by_class, null_method=null_method,
+            subsample_size=subsample_size, allow_proba=allow_proba,
+            retrain_strategy=retrain_strategy, retrain_subsample=retrain_subsample,
+            smoother=None if smoother is None else input_fingerprint(smoother),
+        )
+    if checkpoint is not None:
+        every = checkpoint_every if checkpoint_every is not None else max(1, -(-n_permutations // 20))
+        ckpt_fingerprint = fingerprint
+        if sharded:
+            ckpt_fingerprint = input_fingerprint(run=fingerprint, shard=(range_start, range_stop))
+        ckpt = PermutationCheckpoint(checkpoint, ckpt_fingerprint, every=every)
+        resumed = ckpt.load()
+        if resumed is not None and not seeded:
+            # Unseeded runs resume with the entropy the interrupted run drew
+            random_state = seed_from_state(ckpt.manifest)
+
+    seed = as_seed_sequence(random_state)
+    rng = _np.random.default_rng(seed)
     
     # Apply subsampling if requested
     if subsample_size is not None and subsample_size < len(y_a):
-        subsample_idx = rng.choice(len(y_a), size=subsample_size, replace=False)
-        X_a = X_a[subsample_idx]
+        # Memory proportional to the subsample, not to len(y)
+        subsample_idx = NestedSampler(len(y_a), random_state=rng).grow(subsample_size)
+        X_a = _row_indexable(X_a)[subsample_idx]
         y_a = y_a[subsample_idx]
+        if groups is not None:
+            groups = groups[subsample_idx]
         warnings.warn(
             f"Subsampling {subsample_size} samples from {len(y)} for performance. "
             f"Results are approximate.",
@@ -167,23 +524,8 @@ def detect_bias(model: CBDModel,
         )
 
     # Determine prediction method
-    if allow_proba:
-        if not hasattr(model, "predict_proba"):
-            if hasattr(model, "decision_function"):
-                warnings.warn(
-                    "Model lacks predict_proba but has decision_function. Using decision_function as fallback.",
-                    UserWarning
-                )
-                predict_fn = model.decision_function
-            else:
-                raise ValueError(
-                    "allow_proba=True but model has neither predict_proba nor decision_function. "
-                    "Set allow_proba=False or use a model with probability outputs."
-                )
-        else:
-            predict_fn = model.predict_proba
-    else:
-        predict_fn = model.predict
+    predict_method = _predict_method(model, allow_proba)
+    predict_fn = getattr(model, predict_method)
 
     # Compute observed metric
     y_pred = predict_fn(X_a)
@@ -192,181 +534,380 @@ def detect_bias(model: CBDModel,
     # Validate null_method
     if null_method == "retrain" and not hasattr(model, "fit"):
         raise ValueError("null_method='retrain' requires model to have fit() method")
+    engine = None
+    smoother_op = None
+    if null_method == "retrain":
+        closed_form = retrain_strategy in ("auto", "closed_form") and retrain_subsample is None
+        if smoother is not None:
+            smoother_op = as_smoother(smoother, len(y_a))
+        elif closed_form and predict_method == "predict":
+            smoother_op = smoother_from_estimator(model, X_a)
+        if retrain_strategy == "closed_form" and smoother_op is None:
+            raise ValueError(
+                "retrain_strategy='closed_form' requires a recognized linear smoother "
+                "(LinearRegression, Ridge, KernelRidge, uniform KNeighborsRegressor), "
+                "predictions from predict() and no retrain_subsample, or an explicit smoother"
+            )
+    if null_method == "retrain" and smoother_op is None:
+        fit_rows = None
+        if retrain_subsample is not None:
+            n_fit = (int(round(retrain_subsample * len(y_a)))
+                     if isinstance(retrain_subsample, float) else int(retrain_subsample))
+            if not 1 < n_fit <= len(y_a):
+                raise ValueError(
+                    f"retrain_subsample must select between 2 and {len(y_a)} rows, "
+                    f"got {retrain_subsample}"
+                )
+            if n_fit < len(y_a):
+                fit_rows = _np.sort(rng.choice(len(y_a), size=n_fit, replace=False))
+        engine = RetrainEngine(model, predict_method, strategy=retrain_strategy,
+                               fit_rows=fit_rows, classes=_np.unique(y_a))
 
-    # ===== GENERATE PERMUTATION INDICES =====
-    # Generate all permutation indices upfront for reproducibility
-    if stratify:
-        # Stratified permutation: preserve class distribution
-        perm_indices = _generate_stratified_permutations(y_a, n_permutations, rng)
-    else:
-        # Standard permutation: shuffle all labels
-        perm_indices = [rng.permutation(len(y_a)) for _ in range(n_permutations)]
-
-    # ===== COMPUTE NULL DISTRIBUTION =====
-    # Parallel or sequential execution
-    if n_jobs == 1:
-        # Sequential execution
-        permuted_metrics = _compute_permuted_metrics_sequential(
-            model, X_a, y_a, y_pred, metric, perm_indices, null_method, predict_fn
-        )
+    if greater_is_better is None:
+        greater_is_better = metric_greater_is_better(metric)
+    # Statistics are compared as sign * metric, so larger is always better
+    sign = 1.0 if greater_is_better else -1.0
+
+    # Recognized metrics are evaluated on whole permutation blocks
+    batched = None
+    if batched_metric is not None:
+        batched = batched_metric.prepare(y_a, y_pred)
+
+    if stratify_by_class:
+        groups = y_a
+    stratified = groups is not None
+
+    if exact:
+        if null_method != "permute" or stratified:
+            raise ValueError("exact=True requires null_method='permute' and stratify=False")
+        if not greater_is_better:
+            raise ValueError("exact=True requires a metric where greater is better")
+        if batched is None or batched.family == "linear":
+            raise ValueError(
+                "exact=True requires a count-based or ROC AUC metric recognized by "
+                "cbd.fast_metrics (e.g. accuracy_score, f1_score, roc_auc_positive)"
+            )
+
+    if early_stopping is not None and exact:
+        raise ValueError("early_stopping cannot be combined with exact=True")
+    stopping_rule = make_stopping_rule(early_stopping, alpha) if early_stopping is not None else None
+    if time_budget_s is not None and exact:
+        raise ValueError("time_budget_s cannot be combined with exact=True")
+    budget = TimeBudget(time_budget_s, start=t_start) if time_budget_s is not None else None
+    if tail_approximation and (exact or stopping_rule is not None):
+        raise ValueError("tail_approximation cannot be combined with exact=True or early_stopping")
+    stopping_reason = "completed"
+
+    tune_plan = None
+    if tuner is not None:
+        remaining = (None if time_budget_s is None
+                     else max(time_budget_s - (time.perf_counter() - t_start), 0.0))
+        tune_plan = tuner.plan(len(y_a), range_stop - range_start,
+                               "batched" if batched is not None else "per_call",
+                               time_budget_s=remaining)
+        n_jobs, backend, chunk_size = tune_plan["n_jobs"], tune_plan["backend"], tune_plan["chunk_size"]
+        range_stop = range_start + tune_plan["n_permutations"]
+        if not sharded:
+            n_permutations = range_stop
+    t_null = time.perf_counter()
+
+    # Exceedances are counted against the statistic the null was computed with
+    observed_stat = sign * (observed if batched is None else batched.observed())
+    permuted_metrics = None
+    exact_null = None
+    block_used = None
+    layout = None
+    retrain_info = None
+
+    if exact and batched.family == "rank":
+        # AUC is U / (n1 n0): use the Mann-Whitney U null
+        u_null = mann_whitney_null(batched, method=auc_null)
+        p_value = u_null["p_value"]
+        p_value_method = f"mann_whitney_{u_null['method']}"
+    elif exact and batched.n_classes == 2:
+        # Closed form: the 2x2 table is fixed by one hypergeometric cell
+        exact_null = binary_exact_null(batched)
+        p_value = exact_null["p_value"]
+        p_value_method = "hypergeometric"
+    elif exact:
+        # k classes: draw contingency tables directly instead of permuting labels
+        permuted_metrics = sampled_table_null(batched, n_permutations, rng)
+        p_value_method = "table_sampling"
     else:
-        # Parallel execution
-        permuted_metrics = _compute_permuted_metrics_parallel(
-            model, X_a, y_a, y_pred, metric, perm_indices, null_method, predict_fn, n_jobs, backend
-        )
+        p_value_method = "permutation"
+
+        # ===== COMPUTE NULL DISTRIBUTION =====
+        # Workers receive contiguous ranges of a lazily generated permutation
+        # stream; ranges are evaluated round by round so that a stopping rule
+        # can end the run as soon as the decision is settled
+        stream = PermutationStream(len(y_a), n_permutations, seed,
+                                   groups=groups)
+        if batched is not None:
+            task, task_kwargs = _batched_task, {"batched": batched.detach()}
+        elif null_method == "permute":
+            task, task_kwargs = _permute_task, {"metric": metric}
+        elif smoother_op is not None:
+            task, task_kwargs = _smoother_task, {"smoother": smoother_op, "metric": metric}
+        else:
+            task, task_kwargs = _retrain_task, {"engine": engine, "metric": metric}
+        timings = []
+        round_size = (stopping_rule.chunk_size if stopping_rule is not None
+                      else max(range_stop - range_start, 1))
+        chunks = []
+        start = range_start
+        n_resumed = 0
+        if ckpt is not None:
+            round_size = min(round_size, ckpt.every)
+            if resumed is not None:
+                # Permutation i depends only on the seed and i: continue the stream
+                values = resumed["null"][:range_stop - range_start]
+                n_resumed = len(values)
+                start = range_start + n_resumed
+                if engine is not None:
+                    timings.append(resumed["timings"][:n_resumed])
+                if stopping_rule is not None:
+                    n_keep, reason = stopping_rule.update(sign * values >= observed_stat)
+                    values = values[:n_keep]
+                    if reason is not None:
+                        stopping_reason = reason
+                chunks.append(values)
+        cache_key = None
+        if cache is not None:
+            cache_key = null_cache_key(y_a, y_pred, metric, seed_state(seed), n_permutations,
+                                       groups, metric_key=metric_key, batched=batched is not None)
+            cached = cache.get(cache_key)
+            cache_info = {"hit": cached is not None, "key": cache_key}
+            if cached is not None:
+                chunks.append(cached)
+                start = range_stop
+        with BlockScheduler(n_jobs=n_jobs, backend=backend, block_size=chunk_size,
+                            executor=executor, inner_threads=inner_threads) as scheduler:
+            if start < range_stop:
+                # Share only what the task reads: X is written for retrain tasks alone
+                if batched is not None:
+                    scheduler.share(**batched.arrays())
+                elif engine is not None:
+                    scheduler.share(y=y_a, X=X_a)
+                else:
+                    scheduler.share(y=y_a, y_pred=y_pred)
+            while start < range_stop and stopping_reason == "completed":
+                size = round_size
+                if budget is not None:
+                    size = min(size, budget.next_round(start - n_resumed, range_stop - start))
+                    if size == 0:
+                        stopping_reason = "time_budget"
+                        break
+                stop = min(start + size, range_stop)
+                values = scheduler.run(task, stream, start, stop, **task_kwargs)
+                start = stop
+                if engine is not None:
+                    # Retrain tasks also return per-permutation fit/predict times
+                    timings.append(values[:, 1:])
+                    values = values[:, 0]
+                if stopping_rule is not None:
+                    n_keep, reason = stopping_rule.update(sign * values >= observed_stat)
+                    chunks.append(values[:n_keep])
+                    if reason is not None:
+                        stopping_reason = reason
+                else:
+                    chunks.append(values)
+                if ckpt is not None:
+                    saved = {"null": _np.concatenate(chunks)}
+                    if engine is not None:
+                        saved["timings"] = _np.concatenate(timings)[:len(saved["null"])]
+                    ckpt.save(saved, stream_position=start, **seed_state(seed))
+            block_used = scheduler.last_block_size
+            layout = scheduler.layout()
+        permuted_metrics = _np.concatenate(chunks) if chunks else _np.empty(0)
+        if cache_key is not None:
+            if not cache_info["hit"]:
+                cache.put(cache_key, permuted_metrics)
+            cache_info.update(cache.stats())
+        if smoother_op is not None:
+            retrain_info = {"strategy": "closed_form", "smoother": smoother_op.kind}
+            if smoother_op.rank is not None:
+                retrain_info["rank"] = smoother_op.rank
+        if engine is not None:
+            timings = _np.concatenate(timings)[:len(permuted_metrics)] if timings else _np.empty((0, 2))
+            retrain_info = {
+                "strategy": engine.strategy,
+                "fit_times": timings[:, 0].tolist(),
+                "predict_times": timings[:, 1].tolist(),
+                "fit_time_total": float(timings[:, 0].sum()),
+                "predict_time_total": float(timings[:, 1].sum()),
+            }
+            if engine.fit_rows is not None:
+                retrain_info["subsample_size"] = int(len(engine.fit_rows))
+                retrain_info["approximation"] = subsample_error_bound(
+                    engine, X_a, y_a, stream.take(range_start, range_start + min(5, len(permuted_metrics))),
+                    metric, sign * permuted_metrics, sign * observed
+                )
+
+    if tune_plan is not None:
+        actual_s = time.perf_counter() - t_null
+        # Only a null computed in full here says anything about the machine:
+        # a cache hit or a resumed checkpoint skipped most of the work
+        reused = n_resumed > 0 or (cache_key is not None and cache_info["hit"])
+        if not reused:
+            tuner.observe(tune_plan, actual_s, len(permuted_metrics))
+        tune_plan = {**tune_plan, "actual_s": actual_s, "observed": not reused,
+                     "actual_to_predicted": actual_s / tune_plan["predicted_s"]
+                     if tune_plan["predicted_s"] > 0 else None}
 
-    # p-value: fraction of permuted metrics >= observed (one-sided test)
-    permuted_metrics = _np.array(permuted_metrics)
-    p_value = float((_np.sum(permuted_metrics >= observed) + 1) / (n_permutations + 1))
-    
-    # Compute confidence interval for p-value if enough permutations
     p_value_ci = None
-    if n_permutations >= 1000:
-        p_value_ci = _compute_pvalue_ci(p_value, n_permutations, confidence_level)
+    tail_fit = None
+    n_used = 0
+    if permuted_metrics is not None:
+        # p-value: fraction of permuted metrics at least as good as observed (one-sided test)
+        permuted_metrics = _np.array(permuted_metrics)
+        oriented = sign * permuted_metrics
+        n_used = len(permuted_metrics)
+        if stopping_rule is not None:
+            p_value = float(stopping_rule.p_value())
+        else:
+            if exact:
+                n_exceed = int(_np.sum(exceeds(oriented, observed_stat)))
+            else:
+                n_exceed = int(_np.sum(oriented >= observed_stat))
+            p_value = float((n_exceed + 1) / (n_used + 1))
+
+        # Compute confidence interval for p-value if enough permutations
+        if n_used >= 1000 or (budget is not None and n_used > 0):
+            p_value_ci = _compute_pvalue_ci(p_value, n_used, confidence_level)
+
+        if tail_approximation:
+            tail_fit = gpd_tail_pvalue(oriented, observed_stat,
+                                       confidence_level=confidence_level, random_state=rng)
+            if tail_fit["method"] == "gpd":
+                p_value = tail_fit["p_value"]
+                p_value_ci = tail_fit["p_value_ci"]
+                p_value_method = "gpd_tail"
 
     # Generate conclusion based on configurable alpha
-    if p_value <= alpha:
-        conclusion = f"Suspicious: p = {p_value:.4f} <= {alpha} — potential circular bias detected"
-    else:
-        conclusion = f"No strong evidence of circular bias (p = {p_value:.4f} > {alpha})"
+    conclusion = _conclusion(p_value, alpha)
 
     result = {
         "observed_metric": observed,
         "p_value": p_value,
-        "n_permutations": n_permutations,
+        "n_permutations": range_stop - range_start if permuted_metrics is not None else 0,
         "conclusion": conclusion,
         "alpha": alpha,
         "null_method": null_method,
-        "stratified": stratify,
-        "backend": backend if n_jobs != 1 else "sequential",
+        "stratified": stratified,
+        "backend": (f"executor:{type(executor).__name__}" if executor is not None
+                    else backend if n_jobs != 1 else "sequential"),
         "n_jobs": n_jobs,
+        "metric_engine": "batched" if batched is not None else "per_call",
         "n_samples": len(y_a),
         "n_classes": n_classes,
-        "subsampled": subsample_size is not None
+        "subsampled": subsample_size is not None,
+        "exact": exact,
+        "p_value_method": p_value_method,
+        "greater_is_better": greater_is_better,
     }
+    if block_used is not None:
+        result["block_size"] = block_used
+    if layout is not None:
+        result["thread_layout"] = layout
+    if cache is not None:
+        result["null_cache"] = cache_info
+    if tune_plan is not None:
+        result["auto_tune"] = tune_plan
+    if retrain_info is not None:
+        result["retrain"] = retrain_info
+    if stopping_rule is not None:
+        result["early_stopping"] = stopping_rule.name
+        result["n_permutations_used"] = n_used
+        result["stopping_reason"] = stopping_reason
+    if budget is not None:
+        result["time_budget_s"] = budget.budget_s
+        result["elapsed_s"] = budget.elapsed
+        result["n_permutations_used"] = n_used
+        result["stopping_reason"] = stopping_reason
+        result["decision_determined"] = p_value_ci is not None and (
+            p_value_ci[1] <= alpha or p_value_ci[0] > alpha
+        )
+        if p_value_ci is not None:
+            result["p_value_ci_width"] = p_value_ci[1] - p_value_ci[0]
+    if tail_fit is not None:
+        result["tail_fit"] = {k: v for k, v in tail_fit.items() if k not in ("p_value", "p_value_ci")}
+    if ckpt is not None:
+        result["checkpoint"] = {
+            "path": ckpt.manifest_path,
+            "resumed_from": n_resumed,
+            "n_saves": ckpt.n_saves,
+        }
     if p_value_ci is not None:
         result["p_value_ci"] = p_value_ci
         result["confidence_level"] = confidence_level
+    if sharded:
+        result["shard"] = {
+            "kind": "detect_bias",
+            "index": shard_index,
+            "n_shards": n_shards,
+            "start": range_start,
+            "stop": range_stop,
+            "n_permutations_total": n_permutations,
+            "observed_statistic": float(observed_stat),
+            "greater_is_better": greater_is_better,
+            "confidence_level": confidence_level,
+            "return_permutations": return_permutations,
+            "fingerprint": fingerprint,
+        }
+        result["permuted_metrics"] = permuted_metrics
+    if null_summary and permuted_metrics is not None:
+        result["null_summary"] = summarize_null(
+            permuted_metrics, [sign * observed_stat, *null_thresholds], random_state=0,
+            greater_is_better=greater_is_better,
+        ).to_dict()
     if return_permutations:
-        result["permuted_metrics"] = permuted_metrics.tolist()
+        if exact_null is not None:
+            result["null_support"] = _np.asarray(exact_null["support"])
+            result["null_pmf"] = _np.asarray(exact_null["pmf"])
+        else:
+            result["permuted_metrics"] = permuted_metrics
     return result
 
 
-def _generate_stratified_permutations(y, n_permutations, rng):
-    """Generate stratified permutation indices that preserve class distribution.
-    
-    Parameters:
-    -----------
-    y : array-like
-        Target labels
-    n_permutations : int
-        Number of permutations to generate
-    rng : numpy.random.Generator
-        Random number generator
-    
-    Returns:
-    --------
-    list of arrays
-        List of permutation indices
+def _conclusion(p_value: float, alpha: float) -> str:
+    """Conclusion sentence for a p-value at significance level alpha."""
+    if p_value <= alpha:
+        return f"Suspicious: p = {p_value:.4f} <= {alpha} — potential circular bias detected"
+    return f"No strong evidence of circular bias (p = {p_value:.4f} > {alpha})"
+
+
+def _batched_task(arrays, perm_block, batched) -> np.ndarray:
+    """Evaluate a recognized metric on a (B, n) block of permutations at once.
+
+    ``batched`` comes detached from its arrays, which the scheduler shares.
     """
-    import numpy as _np
-    
-    # Get unique classes and their indices
-    unique_classes = _np.unique(y)
-    class_indices = {cls: _np.where(y == cls)[0] for cls in unique_classes}
-    
-    perm_indices = []
-    for _ in range(n_permutations):
-        # Shuffle within each class, then concatenate
-        perm_idx = _np.empty(len(y), dtype=int)
-        for cls, indices in class_indices.items():
-            shuffled = rng.permutation(indices)
-            perm_idx[indices] = shuffled
-        perm_indices.append(perm_idx)
-    
-    return perm_indices
+    return batched.bind(arrays).evaluate(perm_block)
 
 
-def _compute_permuted_metrics_sequential(
-    model, X_a, y_a, y_pred, metric, perm_indices, null_method, predict_fn
-) -> List[float]:
-    """Compute permuted metrics sequentially."""
-    import numpy as _np
-    from copy import deepcopy
-    
-    permuted_metrics = []
-    for perm_idx in perm_indices:
+def _permute_task(arrays, perm_block, metric) -> np.ndarray:
+    """Evaluate metric(y_perm, y_pred) for each permutation of the block."""
+    y_a, y_pred = arrays["y"], arrays["y_pred"]
+    values = np.empty(len(perm_block))
+    for i, perm_idx in enumerate(perm_block):
         y_perm = y_a[perm_idx]
-        
-        if null_method == "permute":
-            # Fast: just evaluate metric with permuted labels
-            try:
-                m = float(metric(y_perm, y_pred))
-            except Exception:
-                m = float(metric(_np.array(y_perm), _np.array(y_pred)))
-        else:  # retrain
-            # Conservative: retrain model on permuted data
-            model_copy = deepcopy(model)
-            model_copy.fit(X_a, y_perm)
-            y_pred_perm = predict_fn(X_a) if predict_fn == model.predict or predict_fn == model.predict_proba else model_copy.predict(X_a)
-            m = float(metric(y_perm, y_pred_perm))
-        
-        permuted_metrics.append(m)
-    
-    return permuted_metrics
+        try:
+            values[i] = float(metric(y_perm, y_pred))
+        except Exception:
+            values[i] = float(metric(np.array(y_perm), np.array(y_pred)))
+    return values
 
 
-def _compute_permuted_metrics_parallel(
-    model, X_a, y_a, y_pred, metric, perm_indices, null_method, predict_fn, n_jobs, backend
-) -> List[float]:
-    """Compute permuted metrics in parallel using joblib."""
-    try:
-        from joblib import Parallel, delayed
-    except ImportError:
-        warnings.warn(
-            "joblib not available. Falling back to sequential execution. "
-            "Install joblib for parallel processing: pip install joblib",
-            UserWarning
-        )
-        return _compute_permuted_metrics_sequential(
-            model, X_a, y_a, y_pred, metric, perm_indices, null_method, predict_fn
-        )
-    
-    import numpy as _np
-    from copy import deepcopy
-    
-    def _compute_single_permutation(perm_idx):
-        """Compute metric for a single permutation."""
-        y_perm = y_a[perm_idx]
-        
-        if null_method == "permute":
-            try:
-                return float(metric(y_perm, y_pred))
-            except Exception:
-                return float(metric(_np.array(y_perm), _np.array(y_pred)))
-        else:  # retrain
-            model_copy = deepcopy(model)
-            model_copy.fit(X_a, y_perm)
-            if predict_fn == model.predict:
-                y_pred_perm = model_copy.predict(X_a)
-            elif predict_fn == model.predict_proba:
-                y_pred_perm = model_copy.predict_proba(X_a)
-            else:
-                y_pred_perm = model_copy.decision_function(X_a)
-            return float(metric(y_perm, y_pred_perm))
-    
-    # Determine joblib backend
-    if backend == "processes":
-        joblib_backend = "loky"  # Better than multiprocessing for pickling
-    else:
-        joblib_backend = "threading"
-    
-    # Execute in parallel
-    permuted_metrics = Parallel(n_jobs=n_jobs, backend=joblib_backend)(
-        delayed(_compute_single_permutation)(perm_idx) for perm_idx in perm_indices
-    )
-    
-    return permuted_metrics
+def _retrain_task(arrays, perm_block, engine, metric) -> np.ndarray:
+    """Refit on each permutation; returns (metric, fit seconds, predict seconds) rows."""
+    return engine.evaluate(arrays["X"], arrays["y"], perm_block, metric)
+
+
+def _smoother_task(arrays, perm_block, smoother, metric) -> np.ndarray:
+    """Closed-form retrain null: refit predictions are H @ y_perm for the whole block."""
+    y_block = arrays["y"][perm_block]
+    predictions = smoother.apply(y_block)
+    return np.array([float(metric(y_perm, y_hat))
+                     for y_perm, y_hat in zip(y_block, predictions)])
 
 
 def _compute_pvalue_ci(p_value: float, n_permutations: int, confidence_level: float) -> tuple:
@@ -389,18 +930,17 @@ def _compute_pvalue_ci(p_value: float, n_permutations: int, confidence_level: fl
     from scipy import stats
     
     # Number of permuted metrics >= observed
-    k = int(p_value * (n_permutations + 1)) - 1
-    k = max(0, k)  # Ensure non-negative
+    k = int(round(p_value * (n_permutations + 1))) - 1
+    k = min(max(0, k), n_permutations)  # Ensure within [0, n]
     n = n_permutations
     
     # Wilson score interval for binomial proportion
     z = stats.norm.ppf((1 + confidence_level) / 2)
     
-    denominator = 1 + z**2 / n
     center = (k + z**2 / 2) / (n + z**2)
-    margin = z * np.sqrt((k * (n - k) / n + z**2 / 4) / (n + z**2))
+    margin = z * np.sqrt(k * (n - k) / n + z**2 / 4) / (n + z**2)
     
-    lower = max(0.0, (center - margin) / denominator)
-    upper = min(1.0, (center + margin) / denominator)
+    lower = max(0.0, center - margin)
+    upper = min(1.0, center + margin)
     
     return (float(lower), float(upper))
@@ -0,0 +1,517 @@
+"""Machine profile, cost model and autotuner for permutation runs.
+
+:func:`calibrate` micro-benchmarks the local machine once, through the same
+:class:`~cbd.scheduler.BlockScheduler` code path detect_bias uses:
+
+- metric throughput: seconds per permutation of the batched engine
+  (vectorized confusion counts) and of the per-call engine (one scikit-learn
+  call per permutation), fitted as ``a + b * n_samples``;
+- predict latency of a reference linear model, ``a + b * n_rows``;
+- parallel scaling: speedup of 2, 4, ... workers for the thread and process
+  backends and each engine, the per-task dispatch overhead and the process
+  pool start-up time.
+
+The result is a :class:`MachineProfile`, stored as JSON (by default under
+``~/.cache/cbd``, or at ``$CBD_PROFILE_PATH``).  :class:`CostModel` predicts
+the runtime of a configuration from it and :meth:`CostModel.plan` picks
+``n_jobs``, backend, chunk size and, under a time budget, the number of
+permutations.  ``detect_bias(..., auto_tune=True)`` runs the plan and reports
+predicted versus actual runtime; :meth:`CostModel.observe` folds the ratio
+into a per-engine correction so later predictions in the process improve.
+
+Without a calibrated profile, :meth:`MachineProfile.nominal` reproduces the
+fixed timing assumptions cbd.thresholds.estimate_computation_time used
+before.  ``detect_bias(auto_tune=True)`` without a stored profile calibrates
+on first use (a few seconds, with a process pool) and warns; run
+:func:`calibrate` ahead of time, or from the command line with::
+
+    python -m cbd.autotune [--output PATH]
+"""
+from typing import Any, Dict, Optional, Sequence
+import argparse
+import json
+import os
+import platform
+import time
+import warnings
+import numpy as np
+
+from .fast_metrics import block_size as memory_block_size
+from .fast_metrics import resolve_batched_metric
+from .permutations import PermutationStream
+from .scheduler import BlockScheduler
+
+PROFILE_VERSION = 1
+
+ENGINES = ("batched", "per_call")
+
+BACKENDS = ("threads", "processes")
+
+# Seconds of work per scheduler task relative to its dispatch overhead
+TASK_OVERHEAD_RATIO = 20
+
+# Weight of the latest run in the per-engine runtime correction
+CORRECTION_WEIGHT = 0.3
+
+
+def default_profile_path() -> str:
+    """$CBD_PROFILE_PATH, else machine_profile.json in the user cache directory."""
+    path = os.environ.get("CBD_PROFILE_PATH")
+    if path:
+        return path
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "cbd", "machine_profile.json")
+
+
+def machine_signature() -> Dict[str, Any]:
+    """Properties a profile is only valid for."""
+    return {"cpu_count": os.cpu_count() or 1, "machine": platform.machine(),
+            "python": platform.python_version(), "numpy": np.__version__}
+
+
+class MachineProfile:
+    """Benchmarked costs of the local machine.
+
+    Parameters:
+    -----------
+    engines : dict
+        Engine ('batched', 'per_call') -> {'s_per_permutation', 's_per_element'}
+    predict : dict
+        {'s_per_call', 's_per_row'} of the reference model's predict
+    parallel : dict
+        Backend -> {'speedup': {engine: {n_workers: speedup}}, 'task_overhead_s',
+        'startup_s'}; worker counts between measured ones are interpolated.
+        The nominal profile has no measurements and assumes a speedup of n_workers
+    table_lookup_s : float
+        Seconds of a cbd.null_tables p-value lookup
+    machine : dict, optional
+        machine_signature() of the calibrated machine (None for nominal)
+    corrections : dict, optional
+        Engine/backend -> log ratio of actual to predicted runtime
+    """
+
+    def __init__(self, engines: Dict[str, Dict[str, float]], predict: Dict[str, float],
+                 parallel: Dict[str, Dict[str, Any]], table_lookup_s: float,
+                 machine: Optional[Dict[str, Any]] = None,
+                 corrections: Optional[Dict[str, float]] = None, created: Optional[str] = None):
+        self.engines = engines
+        self.predict = predict
+        self.parallel = {
+            backend: {**info, "speedup": {engine: {int(w): float(s) for w, s in curve.items()}
+                                          for engine, curve in info.get("speedup", {}).items()}}
+            for backend, info in parallel.items()
+        }
+        self.table_lookup_s = float(table_lookup_s)
+        self.machine = machine
+        self.corrections = dict(corrections or {})
+        self.created = created
+
+    @property
+    def calibrated(self) -> bool:
+        return self.machine is not None
+
+    @classmethod
+    def nominal(cls) -> "MachineProfile":
+        """Uncalibrated profile: 0.002 s per permutation per 1000 samples, linear scaling."""
+        return cls(
+            engines={"batched": {"s_per_permutation": 0.0, "s_per_element": 2e-6},
+                     "per_call": {"s_per_permutation": 0.0, "s_per_element": 2e-6}},
+            predict={"s_per_call": 0.0, "s_per_row": 0.0},
+            parallel={backend: {"speedup": {}, "task_overhead_s": 0.0, "startup_s": 0.0}
+                      for backend in BACKENDS},
+            table_lookup_s=0.05,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        parallel = {
+            backend: {**info, "speedup": {engine: {str(w): s for w, s in curve.items()}
+                                          for engine, curve in info["speedup"].items()}}
+            for backend, info in self.parallel.items()
+        }
+        return {"version": PROFILE_VERSION, "created": self.created, "machine": self.machine,
+                "engines": self.engines, "predict": self.predict, "parallel": parallel,
+                "table_lookup_s": self.table_lookup_s, "corrections": self.corrections}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MachineProfile":
+        if data.get("version") != PROFILE_VERSION:
+            raise ValueError(f"Machine profile version {data.get('version')} is not supported "
+                             f"(expected {PROFILE_VERSION}); recalibrate with python -m cbd.autotune")
+        return cls(data["engines"], data["predict"], data["parallel"], data["table_lookup_s"],
+                   machine=data.get("machine"), corrections=data.get("corrections"),
+                   created=data.get("created"))
+
+    def save(self, path=None) -> str:
+        """Write the profile as JSON (atomically); returns the path."""
+        path = os.fspath(path) if path is not None else default_profile_path()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp, path)
+        return path
+
+
+def load_profile(path=None) -> Optional[MachineProfile]:
+    """Stored profile, or None if missing or calibrated on another machine (with a warning)."""
+    path = os.fspath(path) if path is not None else default_profile_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            profile = MachineProfile.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError) as exc:
+        warnings.warn(f"Machine profile {path} could not be loaded ({exc}); recalibrate",
+                      UserWarning)
+        return None
+    signature = machine_signature()
+    stale = {key for key in ("cpu_count", "machine")
+             if (profile.machine or {}).get(key) != signature[key]}
+    if stale:
+        warnings.warn(f"Machine profile {path} was calibrated on a different machine "
+                      f"({', '.join(sorted(stale))} differ); recalibrate", UserWarning)
+        return None
+    return profile
+
+
+def _fit_linear(sizes: Sequence[int], seconds: Sequence[float]) -> Dict[str, float]:
+    """Least-squares a + b * size, both clipped at 0."""
+    slope, intercept = np.polyfit(np.asarray(sizes, dtype=float), np.asarray(seconds), 1)
+    slope = max(float(slope), 0.0)
+    if slope == 0.0:
+        intercept = float(np.mean(seconds))
+    return max(float(intercept), 0.0), slope
+
+
+def _benchmark_task(engine: str, n_samples: int, seed: int):
+    """Task, kwargs and shared arrays of a representative accuracy null."""
+    from sklearn.metrics import accuracy_score
+    from .api import _batched_task, _permute_task
+
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 2, n_samples)
+    y_pred = np.where(rng.random(n_samples) < 0.7, y, 1 - y)
+    if engine == "batched":
+        batched = resolve_batched_metric(accuracy_score).prepare(y, y_pred)
+        return _batched_task, {"batched": batched.detach()}, batched.arrays()
+    return _permute_task, {"metric": accuracy_score}, {"y": y, "y_pred": y_pred}
+
+
+def _time_run(engine: str, n_samples: int, n_permutations: int, n_jobs: int = 1,
+              backend: str = "threads", block_size: Optional[int] = None,
+              repeats: int = 1, seed: int = 0) -> float:
+    """Best wall time of a scheduler run over a fresh pool; repeats reuse the pool."""
+    task, kwargs, arrays = _benchmark_task(engine, n_samples, seed)
+    stream = PermutationStream(n_samples, n_permutations, random_state=seed)
+    best = float("inf")
+    with BlockScheduler(n_jobs=n_jobs, backend=backend, block_size=block_size,
+                        inner_threads=None) as scheduler:
+        if arrays:
+            scheduler.share(**arrays)
+        for _ in range(repeats):
+            t_start = time.perf_counter()
+            scheduler.run(task, stream, 0, n_permutations, **kwargs)
+            best = min(best, time.perf_counter() - t_start)
+    return best
+
+
+def _worker_grid(max_workers: int):
+    grid = []
+    w = 2
+    while w < max_workers:
+        grid.append(w)
+        w *= 2
+    if max_workers > 1:
+        grid.append(max_workers)
+    return grid
+
+
+def calibrate(sizes: Sequence[int] = (1000, 10000), target_s: float = 0.2,
+              max_workers: Optional[int] = None, backends: Sequence[str] = BACKENDS,
+              random_state: int = 0, verbose: bool = False) -> MachineProfile:
+    """Micro-benchmark this machine and return its profile.
+
+    Parameters:
+    -----------
+    sizes : sequence of int, default=(1000, 10000)
+        Sample sizes at which per-permutation costs are measured (at least two)
+    target_s : float, default=0.2
+        Approximate sequential seconds of each timed workload
+    max_workers : int, optional
+        Largest worker count measured (default: cpu_count)
+    backends : sequence of str, default=('threads', 'processes')
+        Parallel backends measured
+    random_state : int, default=0
+        Seed of the synthetic benchmark data
+    verbose : bool, default=False
+        Print each measurement
+
+    Returns:
+    --------
+    MachineProfile
+    """
+    if len(sizes) < 2:
+        raise ValueError("calibrate needs at least two sizes")
+    if target_s <= 0:
+        raise ValueError(f"target_s must be > 0, got {target_s}")
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        raise ValueError(f"Unknown backends {sorted(unknown)}; choose from {BACKENDS}")
+    max_workers = int(max_workers or os.cpu_count() or 1)
+
+    def log(message):
+        if verbose:
+            print(message)
+
+    # Metric throughput: time a small run, then one sized to target_s
+    engines = {}
+    for engine in ENGINES:
+        per_permutation = []
+        for n in sizes:
+            probe = _time_run(engine, n, 16, seed=random_state) / 16
+            count = int(np.clip(target_s / max(probe, 1e-9) / len(sizes), 16, 100_000))
+            per_permutation.append(_time_run(engine, n, count, repeats=2, seed=random_state) / count)
+            log(f"{engine} n={n}: {per_permutation[-1] * 1e6:.1f} us/permutation")
+        intercept, slope = _fit_linear(sizes, per_permutation)
+        engines[engine] = {"s_per_permutation": intercept, "s_per_element": slope}
+
+    # Predict latency of a reference linear model
+    from sklearn.linear_model import LogisticRegression
+    rng = np.random.default_rng(random_state)
+    X = rng.normal(size=(max(sizes), 20))
+    model = LogisticRegression().fit(X[:200], rng.integers(0, 2, 200))
+    predict_times = []
+    for n in sizes:
+        t_start = time.perf_counter()
+        for _ in range(5):
+            model.predict(X[:n])
+        predict_times.append((time.perf_counter() - t_start) / 5)
+    intercept, slope = _fit_linear(sizes, predict_times)
+    predict = {"s_per_call": intercept, "s_per_row": slope}
+    log(f"predict: {intercept * 1e6:.1f} us + {slope * 1e9:.1f} ns/row")
+
+    # Null-table lookup of fast mode
+    from .null_tables import load_null_tables
+    tables = load_null_tables()
+    table_lookup_s = 0.0
+    if tables is not None:
+        y = np.arange(1000) % 2
+        t_start = time.perf_counter()
+        for _ in range(20):
+            tables.p_value("accuracy", y, y[::-1], 0.5)
+        table_lookup_s = (time.perf_counter() - t_start) / 20
+
+    # Parallel scaling on the largest size
+    n = max(sizes)
+    parallel = {}
+    workers = _worker_grid(max_workers)
+    for backend in backends:
+        info = {"speedup": {}, "task_overhead_s": 0.0, "startup_s": 0.0}
+        if workers:
+            # Dispatch overhead: many near-empty tasks on a warm pool
+            tiny = 64 * max(workers)
+            cold = _time_run("batched", 8, tiny, n_jobs=max(workers), backend=backend, block_size=1)
+            warm = _time_run("batched", 8, tiny, n_jobs=max(workers), backend=backend,
+                             block_size=1, repeats=2)
+            info["task_overhead_s"] = warm * max(workers) / tiny
+            info["startup_s"] = max(cold - warm, 0.0) if backend == "processes" else 0.0
+        for engine in ENGINES:
+            per_perm = engines[engine]["s_per_permutation"] + engines[engine]["s_per_element"] * n
+            count = int(np.clip(target_s / max(per_perm, 1e-9), 32, 100_000))
+            sequential = _time_run(engine, n, count, repeats=2, seed=random_state)
+            curve = {}
+            for w in workers:
+                t_w = _time_run(engine, n, count, n_jobs=w, backend=backend, repeats=2,
+                                seed=random_state)
+                curve[w] = sequential / t_w
+                log(f"{backend} {engine} x{w}: speedup {curve[w]:.2f}")
+            info["speedup"][engine] = curve
+        parallel[backend] = info
+
+    return MachineProfile(engines, predict, parallel, table_lookup_s, machine=machine_signature(),
+                          created=time.strftime("%Y-%m-%dT%H:%M:%S"))
+
+
+_default_profile: Optional[MachineProfile] = None
+
+
+def default_profile() -> MachineProfile:
+    """Process-wide profile for detect_bias(auto_tune=True): loaded, or calibrated and saved once.
+
+    Calibrating takes a few seconds and starts a process pool, so it warns; a
+    profile directory that cannot be written (read-only or missing cache) only
+    means the calibration is not kept for the next process.
+    """
+    global _default_profile
+    if _default_profile is None:
+        path = default_profile_path()
+        profile = load_profile(path)
+        if profile is None:
+            warnings.warn(f"No machine profile at {path}: calibrating this machine for "
+                          f"auto_tune (a few seconds). Run cbd.autotune.calibrate() or "
+                          f"'python -m cbd.autotune' ahead of time to avoid this", UserWarning)
+            profile = calibrate()
+            try:
+                profile.save(path)
+            except OSError as exc:
+                warnings.warn(f"Machine profile could not be saved to {path} ({exc}); it "
+                              f"will be recalibrated in the next process", UserWarning)
+        _default_profile = profile
+    return _default_profile
+
+
+class CostModel:
+    """Runtime predictions and tuning from a machine profile.
+
+    Parameters:
+    -----------
+    profile : MachineProfile, optional
+        Default: the stored profile, else the nominal one
+    """
+
+    def __init__(self, profile: Optional[MachineProfile] = None):
+        if profile is None:
+            profile = load_profile() or MachineProfile.nominal()
+        self.profile = profile
+
+    def permutation_seconds(self, n_samples: int, engine: str) -> float:
+        """Sequential seconds per permutation."""
+        costs = self.profile.engines[engine]
+        return costs["s_per_permutation"] + costs["s_per_element"] * n_samples
+
+    def predict_seconds(self, n_samples: int) -> float:
+        """Seconds of one predict call on n_samples rows (reference model)."""
+        return self.profile.predict["s_per_call"] + self.profile.predict["s_per_row"] * n_samples
+
+    def speedup(self, engine: str, backend: str, n_workers: int) -> float:
+        """Measured (interpolated) speedup of n_workers over sequential execution."""
+        if n_workers <= 1:
+            return 1.0
+        curve = self.profile.parallel.get(backend, {}).get("speedup", {}).get(engine)
+        if not curve:
+            return float(n_workers)
+        points = sorted({1: 1.0, **curve}.items())
+        return float(np.interp(n_workers, [w for w, _ in points], [s for _, s in points]))
+
+    def _correction(self, engine: str, backend: str) -> float:
+        return float(np.exp(self.profile.corrections.get(f"{engine}/{backend}", 0.0)))
+
+    def seconds(self, n_samples: int, n_permutations: int, engine: str,
+                n_jobs: int = 1, backend: str = "threads") -> float:
+        """Predicted seconds of a permutation null."""
+        backend = backend if n_jobs > 1 else "sequential"
+        work = n_permutations * self.permutation_seconds(n_samples, engine)
+        seconds = work / self.speedup(engine, backend, n_jobs)
+        if n_jobs > 1:
+            seconds += self.profile.parallel.get(backend, {}).get("startup_s", 0.0)
+        return seconds * self._correction(engine, backend)
+
+    def chunk_size(self, n_samples: int, n_permutations: int, engine: str,
+                   n_jobs: int, backend: str) -> int:
+        """Permutations per task: large enough to amortize dispatch, small enough to balance."""
+        memory = memory_block_size(n_samples, n_permutations)
+        if n_jobs <= 1:
+            return memory
+        overhead = self.profile.parallel.get(backend, {}).get("task_overhead_s", 0.0)
+        per_perm = max(self.permutation_seconds(n_samples, engine), 1e-12)
+        amortized = int(np.ceil(TASK_OVERHEAD_RATIO * overhead / per_perm))
+        balanced = int(np.ceil(n_permutations / (4 * n_jobs)))
+        return int(max(1, min(memory, max(amortized, balanced))))
+
+    def plan(self, n_samples: int, n_permutations: int, engine: str,
+             time_budget_s: Optional[float] = None, max_jobs: Optional[int] = None,
+             backends: Sequence[str] = BACKENDS, safety: float = 0.9) -> Dict[str, Any]:
+        """Fastest configuration, with n_permutations reduced to fit a time budget.
+
+        Parameters:
+        -----------
+        n_samples, n_permutations : int
+            Size of the null (n_permutations is an upper bound)
+        engine : {'batched', 'per_call'}
+            Metric engine of the run
+        time_budget_s : float, optional
+            Seconds available for the null
+        max_jobs : int, optional
+            Largest worker count considered (default: cpu_count)
+        backends : sequence of str
+            Parallel backends considered
+        safety : float, default=0.9
+            Fraction of the budget planned for
+
+        Returns:
+        --------
+        dict
+            n_jobs, backend, chunk_size, n_permutations, n_permutations_requested,
+            predicted_s, engine, budget_limited and profile ('calibrated' or 'nominal')
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be one of {ENGINES}, got {engine!r}")
+        max_jobs = int(max_jobs or os.cpu_count() or 1)
+        candidates = [(1, "threads")]
+        for backend in backends:
+            measured = self.profile.parallel.get(backend, {}).get("speedup", {}).get(engine)
+            # A calibrated profile only offers the worker counts it measured
+            counts = (sorted(measured) if measured
+                      else [] if self.profile.calibrated else _worker_grid(max_jobs))
+            candidates += [(w, backend) for w in counts if 1 < w <= max_jobs]
+        timed = [(self.seconds(n_samples, n_permutations, engine, w, backend), w, backend)
+                 for w, backend in candidates]
+        best = min(t for t, _, _ in timed)
+        # Fewest workers within 5% of the fastest
+        predicted, n_jobs, backend = min(
+            ((t, w, b) for t, w, b in timed if t <= 1.05 * best), key=lambda c: (c[1], c[0])
+        )
+        n_run = int(n_permutations)
+        budget_limited = False
+        if time_budget_s is not None and predicted > safety * time_budget_s:
+            unit = self.seconds(n_samples, 1, engine, n_jobs, backend)
+            fixed = self.seconds(n_samples, 0, engine, n_jobs, backend)
+            n_run = int(max(1, min(n_run, (safety * time_budget_s - fixed) // max(unit - fixed, 1e-12))))
+            predicted = self.seconds(n_samples, n_run, engine, n_jobs, backend)
+            budget_limited = True
+        return {
+            "n_jobs": n_jobs,
+            "backend": backend,
+            "chunk_size": self.chunk_size(n_samples, n_run, engine, n_jobs, backend),
+            "n_permutations": n_run,
+            "n_permutations_requested": int(n_permutations),
+            "predicted_s": float(predicted),
+            "engine": engine,
+            "budget_limited": budget_limited,
+            "profile": "calibrated" if self.profile.calibrated else "nominal",
+        }
+
+    def observe(self, plan: Dict[str, Any], actual_s: float, n_permutations: int) -> None:
+        """Fold the actual runtime of a planned run into the profile's correction."""
+        if n_permutations < 1 or actual_s <= 0:
+            return
+        backend = plan["backend"] if plan["n_jobs"] > 1 else "sequential"
+        key = f"{plan['engine']}/{backend}"
+        predicted = plan["predicted_s"] * n_permutations / max(plan["n_permutations"], 1)
+        if predicted <= 0:
+            return
+        log_ratio = float(np.log(actual_s / predicted))
+        previous = self.profile.corrections.get(key, 0.0)
+        self.profile.corrections[key] = previous + CORRECTION_WEIGHT * log_ratio
+
+
+def main(argv=None) -> None:
+    """Command-line calibration: python -m cbd.autotune [--output PATH]"""
+    parser = argparse.ArgumentParser(
+        prog="python -m cbd.autotune",
+        description="Benchmark this machine for detect_bias(auto_tune=True)",
+    )
+    parser.add_argument("--output", default=None,
+                        help=f"Profile path (default: {default_profile_path()})")
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--target-s", type=float, default=0.2,
+                        help="Seconds per timed workload")
+    args = parser.parse_args(argv)
+
+    profile = calibrate(max_workers=args.max_workers, target_s=args.target_s, verbose=True)
+    print(f"Wrote {profile.save(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""Content-addressed cache of permutation nulls.
+
+Re-auditing the same predictions (e.g. on every dashboard refresh) recomputes
+an identical null: with a fixed seed, the null of a label-permutation test is
+a function of ``y``, ``y_pred``, the metric, the permutation groups, the seed
+and ``n_permutations`` only (and of the permutation stream layout, so the
+package version and ``STREAM_BLOCK`` are hashed too).  Metrics are identified by
+name, so lambdas, closures and other callables without a stable identity are
+refused unless the caller names them with an explicit ``metric_key``.  :class:`NullCache` stores nulls under a BLAKE2b
+digest of exactly these (:func:`null_cache_key`), in memory with LRU eviction
+and optionally in a directory shared between processes, both bounded in
+bytes.  ``cbd.detect_bias(..., null_cache=cache)`` looks the null up before
+permuting and stores it afterwards; on a hit only the predictions and the
+observed statistic are computed.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import hashlib
+import inspect
+import os
+import sys
+import numpy as np
+
+from . import __version__
+from .checkpoint import _update_hash, describe_callable
+from .permutations import STREAM_BLOCK
+
+DEFAULT_MAX_BYTES = 64 * 2 ** 20
+DEFAULT_MAX_DISK_BYTES = 2 ** 30
+
+
+def stable_metric_identity(metric) -> Optional[str]:
+    """Description of a metric that is the same in every process, or None.
+
+    Module-level functions, instances of module-level classes, estimators
+    (class plus get_params) and partials of these with plainly printable
+    arguments qualify.  Lambdas, functions defined inside other functions,
+    closures and bound methods do not: their qualified name does not
+    determine what they compute.
+    """
+    if hasattr(metric, "get_params"):
+        return describe_callable(metric)
+    inner = getattr(metric, "func", None)  # functools.partial
+    if inner is not None:
+        identity = stable_metric_identity(inner)
+        arguments = repr((getattr(metric, "args", ()), sorted(getattr(metric, "keywords", {}).items())))
+        if identity is None or " at 0x" in arguments:
+            return None
+        return f"partial({identity}, {arguments})"
+    if inspect.ismethod(metric):
+        return None
+    target = metric if inspect.isfunction(metric) or inspect.isclass(metric) else type(metric)
+    module = getattr(target, "__module__", None)
+    name = getattr(target, "__qualname__", "")
+    # Like pickle: the name must lead back to the object, which rules out
+    # lambdas, functions built inside other functions and their closures
+    found = sys.modules.get(module)
+    for part in name.split("."):
+        found = getattr(found, part, None)
+    if found is not target:
+        return None
+    return f"{module}.{name}"
+
+
+def null_cache_key(y, y_pred, metric, seed_state: Dict[str, Any], n_permutations: int,
+                   groups=None, metric_key: Optional[str] = None, **params) -> str:
+    """Digest identifying a permutation null.
+
+    Parameters:
+    -----------
+    y, y_pred : array-like
+        Labels and the predictions the metric is given
+    metric : callable
+        Metric (identified by :func:`stable_metric_identity` unless metric_key is given)
+    seed_state : dict
+        State of the master SeedSequence (cbd.checkpoint.seed_state)
+    n_permutations : int
+        Number of permutations
+    groups : array-like, optional
+        Permutation groups
+    metric_key : str, optional
+        Caller-chosen name of the metric, required for metrics without a
+        stable identity (lambdas, closures, bound methods)
+    **params
+        Other arguments the null depends on
+
+    Returns:
+    --------
+    str
+        Hex BLAKE2b digest (32 characters)
+
+    Raises:
+    -------
+    ValueError
+        If the metric has no stable identity and no metric_key is given
+    """
+    if metric_key is not None:
+        identity = f"key:{metric_key}"
+    else:
+        identity = stable_metric_identity(metric)
+        if identity is None:
+            raise ValueError(
+                f"Cannot cache the null of {describe_callable(metric)}: lambdas, closures and "
+                "bound methods have no stable identity; pass metric_key to name the metric"
+            )
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"cbd={__version__};stream_block={STREAM_BLOCK};".encode())
+    for value in (y, y_pred, groups):
+        _update_hash(h, value)
+    h.update(identity.encode())
+    h.update(repr(sorted(seed_state.items())).encode())
+    h.update(f"n_permutations={int(n_permutations)};".encode())
+    for key in sorted(params):
+        h.update(f"{key}={params[key]!r};".encode())
+    return h.hexdigest()
+
+
+class NullCache:
+    """LRU cache of null arrays, in memory and optionally on disk.
+
+    Parameters:
+    -----------
+    max_bytes : int, default=64 MiB
+        Memory bound; least recently used nulls are evicted beyond it
+    cache_dir : str or os.PathLike, optional
+        Directory for '<key>.npy' files shared across runs and processes
+    max_disk_bytes : int, default=1 GiB
+        Bound on the files in cache_dir; least recently used files are removed
+
+    Attributes:
+    -----------
+    hits, disk_hits, misses, evictions : int
+        Counters since creation (disk_hits are included in hits)
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, cache_dir=None,
+                 max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES):
+        if max_bytes < 0 or max_disk_bytes < 0:
+            raise ValueError("max_bytes and max_disk_bytes must be >= 0")
+        self.max_bytes = int(max_bytes)
+        self.max_disk_bytes = int(max_disk_bytes)
+        self.cache_dir = os.fspath(cache_dir) if cache_dir is not None else None
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries or (self._path(key) is not None and os.path.exists(self._path(key)))
+
+    def _path(self, key: str) -> Optional[str]:
+        return os.path.join(self.cache_dir, f"{key}.npy") if self.cache_dir is not None else None
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """The cached null (read-only) or None; counts a hit or a miss."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        path = self._path(key)
+        if path is not None and os.path.exists(path):
+            try:
+                values = np.load(path)
+            except (OSError, ValueError):
+                values = None
+            if values is not None:
+                os.utime(path)
+                self.hits += 1
+                self.disk_hits += 1
+                self._remember(key, values)
+                return values
+        self.misses += 1
+        return None
+
+    def put(self, key: str, values) -> None:
+        """Store a null in memory and, with cache_dir, on disk."""
+        values = np.array(values, dtype=float)
+        self._remember(key, values)
+        path = self._path(key)
+        if path is not None:
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, values)
+            os.replace(tmp, path)
+            self._trim_disk()
+
+    def _remember(self, key: str, values: np.ndarray) -> None:
+        values.setflags(write=False)
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key).nbytes
+        if values.nbytes > self.max_bytes:
+            return
+        self._entries[key] = values
+        self.nbytes += values.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def _trim_disk(self) -> None:
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npy"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop all entries (memory and disk); counters are kept."""
+        self._entries.clear()
+        self.nbytes = 0
+        if self.cache_dir is not None:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".npy"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and current size."""
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "nbytes": self.nbytes,
+        }
+
+
+_default_cache: Optional[NullCache] = None
+
+
+def default_null_cache() -> NullCache:
+    """Process-wide in-memory cache used by detect_bias(null_cache=True)."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = NullCache()
+    return _default_cache
@@ -0,0 +1,175 @@
+"""Exact and table-sampling nulls for count-based classification metrics.
+
+With ``null_method='permute'`` the predictions are fixed and the true labels
+are shuffled, so the confusion matrix of a permutation is a random contingency
+table whose row margins (true class counts) and column margins (predicted
+class counts) never change.  Its distribution is multivariate hypergeometric
+and does not depend on the order of the samples.
+
+- Binary problems: the whole 2x2 table is determined by the true-positive
+  cell, which is hypergeometric.  Every count-based metric is therefore a
+  function of one hypergeometric variable and its exact null is obtained by
+  evaluating the metric on each of the at most ``n/2 + 1`` possible tables.
+- k classes: tables are sampled directly from the multivariate hypergeometric
+  distribution, column by column, with ``O(k^2)`` vectorized draws per block
+  of tables instead of permuting ``n`` labels.
+- Binary ROC AUC: the AUC is ``U / (n1 n0)`` with ``U`` the Mann-Whitney
+  statistic of the fixed scores, so its null is the exact or tie-corrected
+  normal-approximation distribution of ``U``.
+"""
+from typing import Any, Dict
+import numpy as np
+from scipy import stats
+
+from .fast_metrics import PreparedBatchedMetric, PreparedRankAUC
+
+# Relative tolerance used when comparing kernel outputs of identical tables.
+_TIE_RTOL = 1e-12
+
+# Largest n1 * n0 for which the exact U distribution is chosen by method='auto'.
+_MWU_EXACT_MAX_PAIRS = 10000
+
+
+def _margins(batched: PreparedBatchedMetric):
+    k = batched.n_classes
+    true_counts = np.bincount(batched.true_codes, minlength=k)
+    pred_counts = np.bincount(batched.pred_codes, minlength=k)
+    return true_counts, pred_counts
+
+
+def exceeds(values: np.ndarray, observed: float) -> np.ndarray:
+    """Boolean mask of null values >= observed, tolerant to last-bit rounding."""
+    return values >= observed - _TIE_RTOL * max(1.0, abs(observed))
+
+
+def binary_exact_null(batched: PreparedBatchedMetric) -> Dict[str, Any]:
+    """Exact null distribution of a binary count-based metric.
+
+    Parameters:
+    -----------
+    batched : PreparedBatchedMetric
+        Metric prepared on binary data (two label codes)
+
+    Returns:
+    --------
+    dict
+        ``support`` (metric value of each reachable table), ``pmf`` (its
+        hypergeometric probability) and ``p_value`` = P(metric >= observed)
+    """
+    if batched.n_classes != 2:
+        raise ValueError("binary_exact_null requires exactly two label codes")
+    true_counts, pred_counts = _margins(batched)
+    n = int(true_counts.sum())
+    r1, s1 = int(true_counts[1]), int(pred_counts[1])
+    tp = np.arange(max(0, r1 + s1 - n), min(r1, s1) + 1)
+
+    tables = np.empty((len(tp), 2, 2), dtype=np.int64)
+    tables[:, 1, 1] = tp
+    tables[:, 1, 0] = r1 - tp
+    tables[:, 0, 1] = s1 - tp
+    tables[:, 0, 0] = n - r1 - s1 + tp
+
+    support = batched.from_confusion(tables)
+    pmf = stats.hypergeom.pmf(tp, n, r1, s1)
+    observed = batched.observed()
+    p_value = float(min(1.0, pmf[exceeds(support, observed)].sum()))
+    return {"support": support, "pmf": pmf, "p_value": p_value, "observed": observed}
+
+
+def sample_contingency_tables(true_counts: np.ndarray, pred_counts: np.ndarray,
+                              n_tables: int, rng: np.random.Generator) -> np.ndarray:
+    """Draw contingency tables with fixed margins from the permutation null.
+
+    Each predicted-class column draws its ``pred_counts[c]`` samples without
+    replacement from the pool of true labels not yet assigned; within a column
+    the multivariate hypergeometric draw is decomposed into sequential
+    univariate hypergeometric draws, vectorized across tables.
+
+    Parameters:
+    -----------
+    true_counts : np.ndarray, shape (k,)
+        Row margins (number of true labels per class)
+    pred_counts : np.ndarray, shape (k,)
+        Column margins (number of predictions per class)
+    n_tables : int
+        Number of tables to draw
+    rng : numpy.random.Generator
+        Random number generator
+
+    Returns:
+    --------
+    np.ndarray, shape (n_tables, k, k)
+        ``T[b, t, p]`` = count of true class t predicted as p
+    """
+    k = len(true_counts)
+    tables = np.zeros((n_tables, k, k), dtype=np.int64)
+    remaining = np.tile(np.asarray(true_counts, dtype=np.int64), (n_tables, 1))
+    for c in range(k - 1):
+        to_draw = np.full(n_tables, int(pred_counts[c]), dtype=np.int64)
+        rest = remaining.sum(axis=1)
+        for t in range(k - 1):
+            rest = rest - remaining[:, t]
+            x = rng.hypergeometric(remaining[:, t], rest, to_draw)
+            tables[:, t, c] = x
+            remaining[:, t] -= x
+            to_draw -= x
+        tables[:, k - 1, c] = to_draw
+        remaining[:, k - 1] -= to_draw
+    # The last column takes whatever is left
+    tables[:, :, k - 1] = remaining
+    return tables
+
+
+def sampled_table_null(batched: PreparedBatchedMetric, n_tables: int,
+                       rng: np.random.Generator, chunk_size: int = 65536) -> np.ndarray:
+    """Monte Carlo null of a count-based metric from sampled contingency tables.
+
+    The cost is ``O(k^2)`` per table and independent of the number of samples.
+    """
+    true_counts, pred_counts = _margins(batched)
+    values = []
+    for start in range(0, n_tables, chunk_size):
+        size = min(chunk_size, n_tables - start)
+        tables = sample_contingency_tables(true_counts, pred_counts, size, rng)
+        values.append(batched.from_confusion(tables))
+    return np.concatenate(values) if values else np.empty(0)
+
+
+def mann_whitney_null(ranked: PreparedRankAUC, method: str = "auto") -> Dict[str, Any]:
+    """Analytic null of binary ROC AUC under label permutation.
+
+    Parameters:
+    -----------
+    ranked : PreparedRankAUC
+        AUC metric prepared on binary labels and fixed scores
+    method : {'auto', 'exact', 'normal'}, default='auto'
+        'exact': exact distribution of U (only valid without tied scores).
+        'normal': normal approximation with tie and continuity correction.
+        'auto': 'exact' when there are no ties and n1 * n0 is small, else 'normal'.
+
+    Returns:
+    --------
+    dict
+        ``p_value`` = P(AUC >= observed), ``u_statistic``, ``method`` and ``observed``
+    """
+    if method not in ("auto", "exact", "normal"):
+        raise ValueError(f"method must be 'auto', 'exact' or 'normal', got {method!r}")
+    positive = ranked.true_codes.astype(bool)
+    has_ties = len(np.unique(ranked.scores)) < len(ranked.scores)
+    if method == "exact" and has_ties:
+        raise ValueError("The exact U null assumes untied scores; use method='normal'")
+    if method == "auto":
+        small = ranked.n_pos * ranked.n_neg <= _MWU_EXACT_MAX_PAIRS
+        method = "exact" if small and not has_ties else "normal"
+
+    res = stats.mannwhitneyu(
+        ranked.scores[positive], ranked.scores[~positive],
+        alternative="greater",
+        method="exact" if method == "exact" else "asymptotic",
+    )
+    return {
+        "p_value": float(res.pvalue),
+        "u_statistic": float(res.statistic),
+        "method": method,
+        "observed": ranked.observed(),
+    }
@@ -0,0 +1,600 @@
+"""Vectorized batched-permutation metric kernels.
+
+Under the label-permutation null, ``y_pred`` is fixed and only ``y_true`` is
+shuffled, so every count-based classification metric is a function of the
+confusion matrix of each permutation.  This module evaluates such metrics for
+a whole ``(B, n)`` block of permutations at once: labels are encoded to integer
+codes, confusion matrices are counted with a single ``np.bincount`` over the
+combined codes ``row * k * k + true * k + pred``, and the metric is derived
+from the ``(B, k, k)`` count tensor.
+
+Recognized callables (plain functions or ``functools.partial`` objects binding
+supported keyword arguments) are:
+
+- ``sklearn.metrics.accuracy_score``
+- ``sklearn.metrics.balanced_accuracy_score``
+- ``sklearn.metrics.precision_score`` / ``recall_score`` / ``f1_score``
+  with ``average`` in {'binary', 'micro', 'macro', 'weighted'}
+- ``sklearn.metrics.matthews_corrcoef``
+
+Binary ROC AUC is handled by a rank-based kernel: permuting labels never
+changes the ranks of the scores, so AUC is an affine function of the rank sum
+of the positive labels (Mann-Whitney U).  Ranks are computed once and every
+permutation costs one gather-and-sum.  Recognized callables are
+``sklearn.metrics.roc_auc_score`` (1D scores) and :func:`roc_auc_positive`,
+which also accepts a ``(n_samples, 2)`` ``predict_proba`` output.
+
+Regression and proper-scoring metrics are linear in the labels: since the
+multiset of labels is fixed, ``sum(y)`` and ``sum(y ** 2)`` never change and the
+metric reduces to ``const + y_perm @ w`` with ``w`` precomputed from
+``y_pred``.  The whole null is then one ``(B, n) x (n,)`` matrix-vector
+product.  Recognized callables are ``mean_squared_error``, ``r2_score``,
+``brier_score_loss``, binary ``log_loss`` (1D positive-class probabilities or
+a ``(n_samples, 2)`` ``predict_proba`` output) and :func:`pearson_r`.
+
+The test is one-sided towards better scores, so losses (``mean_squared_error``,
+``brier_score_loss``, ``log_loss`` and the other scikit-learn ``*_error`` /
+``*_loss`` functions) are oriented by negation; see :func:`metric_greater_is_better`.
+
+Anything else (lambdas, custom callables, unsupported keyword arguments) is
+not recognized and ``detect_bias`` falls back to calling the metric once per
+permutation.
+"""
+from copy import copy
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Tuple
+import numpy as np
+from scipy.stats import rankdata
+from sklearn import metrics as _skm
+
+# Upper bound on the number of label cells materialized per (B, n) block.
+MAX_BLOCK_ELEMENTS = 2 ** 22
+
+# Upper bound on the number of int64 bincount keys built at once by confusion_counts.
+MAX_KEY_ELEMENTS = 2 ** 20
+
+
+def block_size(n_samples: int, n_permutations: int,
+               max_elements: int = MAX_BLOCK_ELEMENTS) -> int:
+    """Number of permutations evaluated per block for ``n_samples`` labels."""
+    return int(max(1, min(n_permutations, max_elements // max(n_samples, 1))))
+
+
+def code_dtype(n_codes: int) -> np.dtype:
+    """Smallest unsigned integer dtype holding the codes 0..n_codes - 1."""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if n_codes - 1 <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+def encode_labels(y_true, y_pred) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Encode ``y_true`` and ``y_pred`` onto the codes of their joint label set.
+
+    Returns:
+    --------
+    tuple or None
+        ``(classes, true_codes, pred_codes)``, or None if the inputs are not
+        1D label vectors with mutually comparable values.  Codes use the
+        smallest unsigned dtype for the number of classes (see :func:`code_dtype`),
+        so permuted label blocks take one byte per cell for up to 256 classes.
+    """
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    if y_true.ndim != 1 or y_pred.ndim != 1 or y_true.shape != y_pred.shape:
+        return None
+    if y_true.dtype.kind == "f" and not np.all(np.mod(y_true, 1) == 0):
+        return None
+    try:
+        classes = np.unique(np.concatenate([y_true, y_pred]))
+    except TypeError:
+        return None
+    dtype = code_dtype(len(classes))
+    true_codes = np.searchsorted(classes, y_true).astype(dtype)
+    pred_codes = np.searchsorted(classes, y_pred).astype(dtype)
+    return classes, true_codes, pred_codes
+
+
+def confusion_counts(true_codes_block: np.ndarray, pred_codes: np.ndarray,
+                     n_classes: int) -> np.ndarray:
+    """Count confusion matrices for a block of permuted label codes.
+
+    Parameters:
+    -----------
+    true_codes_block : np.ndarray, shape (B, n)
+        Integer codes of the permuted true labels, one row per permutation
+    pred_codes : np.ndarray, shape (n,)
+        Integer codes of the fixed predictions
+    n_classes : int
+        Number of label codes k
+
+    Returns:
+    --------
+    np.ndarray, shape (B, k, k)
+        ``C[b, t, p]`` = number of samples with true code t and predicted code p
+    """
+    n_rows, n = true_codes_block.shape
+    kk = n_classes * n_classes
+    counts = np.empty((n_rows, n_classes, n_classes), dtype=np.intp)
+    # Compact codes are widened into intp bincount keys a few rows at a time,
+    # so the keys never take more than MAX_KEY_ELEMENTS * 8 bytes
+    step = max(1, MAX_KEY_ELEMENTS // max(n, 1))
+    for lo in range(0, n_rows, step):
+        part = true_codes_block[lo:lo + step]
+        combined = part.astype(np.intp)
+        combined *= n_classes
+        combined += pred_codes
+        combined += (np.arange(len(part), dtype=np.intp) * kk)[:, None]
+        counts[lo:lo + len(part)] = np.bincount(
+            combined.ravel(), minlength=len(part) * kk
+        ).reshape(len(part), n_classes, n_classes)
+    return counts
+
+
+def _safe_divide(num: np.ndarray, den: np.ndarray, zero_division: float) -> np.ndarray:
+    out = np.full(np.broadcast(num, den).shape, float(zero_division))
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+def _zero_division_value(zero_division) -> float:
+    if isinstance(zero_division, str):
+        # 'warn' behaves like 0 in scikit-learn
+        return 0.0
+    return float(zero_division)
+
+
+def _accuracy(C, normalize=True):
+    correct = np.trace(C, axis1=1, axis2=2).astype(float)
+    if normalize:
+        return correct / C[0].sum()
+    return correct
+
+
+def _balanced_accuracy(C, adjusted=False):
+    support = C.sum(axis=2).astype(float)
+    diag = np.diagonal(C, axis1=1, axis2=2).astype(float)
+    present = support[0] > 0
+    per_class = diag[:, present] / support[:, present]
+    score = per_class.mean(axis=1)
+    if adjusted:
+        chance = 1.0 / present.sum()
+        score = (score - chance) / (1.0 - chance)
+    return score
+
+
+def _per_class_counts(C):
+    tp = np.diagonal(C, axis1=1, axis2=2).astype(float)
+    fp = C.sum(axis=1) - tp
+    fn = C.sum(axis=2) - tp
+    return tp, fp, fn
+
+
+def _make_prf_kernel(kind: str):
+    def kernel(C, average="binary", pos_label=1, zero_division="warn", pos_index=None):
+        zd = _zero_division_value(zero_division)
+        tp, fp, fn = _per_class_counts(C)
+        if kind == "precision":
+            num, den = tp, tp + fp
+        elif kind == "recall":
+            num, den = tp, tp + fn
+        else:
+            num, den = 2 * tp, 2 * tp + fp + fn
+        if average == "micro":
+            return _safe_divide(num.sum(axis=1), den.sum(axis=1), zd)
+        if average == "binary":
+            return _safe_divide(num[:, pos_index], den[:, pos_index], zd)
+        per_class = _safe_divide(num, den, zd)
+        if average == "macro":
+            return per_class.mean(axis=1)
+        # weighted by true support, which is permutation invariant
+        support = (tp + fn)[0]
+        if support.sum() == 0:
+            return np.full(C.shape[0], zd)
+        return per_class @ (support / support.sum())
+    return kernel
+
+
+def _mcc(C):
+    t_sum = C.sum(axis=2).astype(float)
+    p_sum = C.sum(axis=1).astype(float)
+    n_correct = np.trace(C, axis1=1, axis2=2).astype(float)
+    n_samples = p_sum.sum(axis=1)
+    cov_ytyp = n_correct * n_samples - np.einsum("bk,bk->b", t_sum, p_sum)
+    cov_ypyp = n_samples ** 2 - np.einsum("bk,bk->b", p_sum, p_sum)
+    cov_ytyt = n_samples ** 2 - np.einsum("bk,bk->b", t_sum, t_sum)
+    den = np.sqrt(cov_ytyt * cov_ypyp)
+    return _safe_divide(cov_ytyp, den, 0.0)
+
+
+def roc_auc_positive(y_true, y_score) -> float:
+    """ROC AUC of the positive (greater) label for binary targets.
+
+    Accepts either 1D scores or a ``(n_samples, 2)`` ``predict_proba`` output, in
+    which case the second column is used, so it can be passed directly to
+    ``detect_bias(..., allow_proba=True)``. Recognized by the rank-based AUC path.
+    """
+    y_score = np.asarray(y_score)
+    if y_score.ndim == 2:
+        y_score = y_score[:, 1]
+    return float(_skm.roc_auc_score(y_true, y_score))
+
+
+def pearson_r(y_true, y_pred) -> float:
+    """Pearson correlation between targets and predictions.
+
+    Convenience metric for ``detect_bias`` that returns a plain float (unlike
+    ``scipy.stats.pearsonr``); recognized by the linear-in-labels path.
+    """
+    return float(np.corrcoef(np.asarray(y_true, dtype=float),
+                             np.asarray(y_pred, dtype=float))[0, 1])
+
+
+class _BlockArrays:
+    """Split a prepared metric into its length-n arrays and its small state.
+
+    Parallel runs share :meth:`arrays` once (``BlockScheduler.share``) and
+    send :meth:`detach` with every task; the task rebuilds the metric with
+    :meth:`bind`.  ``_block_arrays`` names the arrays ``evaluate`` reads,
+    ``_local_arrays`` those only used in the calling process.
+    """
+
+    _block_arrays: Tuple[str, ...] = ()
+    _local_arrays: Tuple[str, ...] = ()
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """The arrays ``evaluate`` reads, by attribute name."""
+        return {name: getattr(self, name) for name in self._block_arrays}
+
+    def detach(self):
+        """Shallow copy without any length-n array."""
+        detached = copy(self)
+        for name in self._block_arrays + self._local_arrays:
+            setattr(detached, name, None)
+        return detached
+
+    def bind(self, arrays: Dict[str, np.ndarray]):
+        """Shallow copy evaluating on ``arrays`` (as returned by :meth:`arrays`)."""
+        bound = copy(self)
+        for name in self._block_arrays:
+            setattr(bound, name, arrays[name])
+        return bound
+
+
+class PreparedBatchedMetric(_BlockArrays):
+    """A batched metric bound to one (y_true, y_pred) pair.
+
+    ``evaluate(perm_block)`` returns the metric for every row of a ``(B, n)``
+    block of permutation indices applied to ``y_true``.
+    """
+
+    family = "confusion"
+    _block_arrays = ("true_codes", "pred_codes")
+
+    def __init__(self, name: str, kernel: Callable, kwargs: Dict[str, Any],
+                 classes: np.ndarray, true_codes: np.ndarray, pred_codes: np.ndarray):
+        self.name = name
+        self.kernel = kernel
+        self.kwargs = kwargs
+        self.classes = classes
+        self.n_classes = len(classes)
+        self.true_codes = true_codes
+        self.pred_codes = pred_codes
+
+    def from_confusion(self, C: np.ndarray) -> np.ndarray:
+        """Evaluate the metric on a ``(B, k, k)`` stack of confusion matrices."""
+        return np.asarray(self.kernel(C, **self.kwargs), dtype=float)
+
+    def evaluate_codes(self, true_codes_block: np.ndarray) -> np.ndarray:
+        """Evaluate the metric on a ``(B, n)`` block of permuted true-label codes."""
+        C = confusion_counts(true_codes_block, self.pred_codes, self.n_classes)
+        return self.from_confusion(C)
+
+    def evaluate(self, perm_block: np.ndarray) -> np.ndarray:
+        """Evaluate the metric for a ``(B, n)`` block of permutation indices."""
+        return self.evaluate_codes(self.true_codes[perm_block])
+
+    def observed(self) -> float:
+        """Metric on the unpermuted labels, computed by the same kernel."""
+        return float(self.evaluate_codes(self.true_codes[None, :])[0])
+
+
+class BatchedMetric:
+    """Recognized count-based metric with a vectorized confusion-matrix kernel."""
+
+    family = "confusion"
+
+    def __init__(self, name: str, kernel: Callable, kwargs: Dict[str, Any]):
+        self.name = name
+        self.kernel = kernel
+        self.kwargs = kwargs
+
+    def prepare(self, y_true, y_pred) -> Optional[PreparedBatchedMetric]:
+        """Bind the metric to data, or return None if the data is unsupported.
+
+        Unsupported data (probability outputs, continuous targets, a binary
+        average on more than two labels, ...) is left to the per-call path so
+        that scikit-learn produces its usual result or error.
+        """
+        encoded = encode_labels(y_true, y_pred)
+        if encoded is None:
+            return None
+        classes, true_codes, pred_codes = encoded
+        kwargs = dict(self.kwargs)
+        if self.name in ("precision", "recall", "f1"):
+            average = kwargs.get("average", "binary")
+            if average == "binary":
+                pos_label = kwargs.get("pos_label", 1)
+                if len(classes) > 2 or pos_label not in classes.tolist():
+                    return None
+                kwargs["pos_index"] = int(np.searchsorted(classes, pos_label))
+        return PreparedBatchedMetric(self.name, self.kernel, kwargs,
+                                     classes, true_codes, pred_codes)
+
+
+class PreparedRankAUC(_BlockArrays):
+    """Binary ROC AUC bound to fixed scores, evaluated from precomputed ranks.
+
+    With ``R1`` the sum of the (tie-averaged) score ranks of the positive
+    labels, ``AUC = (R1 - n1 (n1 + 1) / 2) / (n1 n0)``.
+    """
+
+    family = "rank"
+    _block_arrays = ("true_codes", "ranks")
+    _local_arrays = ("scores",)
+
+    def __init__(self, true_codes: np.ndarray, scores: np.ndarray):
+        self.true_codes = true_codes
+        self.scores = scores
+        self.ranks = rankdata(scores)
+        self.n_pos = int(true_codes.sum())
+        self.n_neg = len(true_codes) - self.n_pos
+        self._offset = self.n_pos * (self.n_pos + 1) / 2.0
+        self._scale = float(self.n_pos * self.n_neg)
+
+    def auc_from_rank_sums(self, rank_sums: np.ndarray) -> np.ndarray:
+        """Map positive-label rank sums to AUC values."""
+        return (rank_sums - self._offset) / self._scale
+
+    def evaluate(self, perm_block: np.ndarray) -> np.ndarray:
+        """AUC for a ``(B, n)`` block of permutation indices applied to ``y_true``."""
+        positives = self.true_codes[perm_block].astype(float)
+        return self.auc_from_rank_sums(positives @ self.ranks)
+
+    def observed(self) -> float:
+        """AUC on the unpermuted labels."""
+        return float(self.auc_from_rank_sums(self.true_codes @ self.ranks))
+
+
+class RankAUCMetric:
+    """Recognized binary ROC AUC metric with a rank-based kernel."""
+
+    name = "roc_auc"
+    family = "rank"
+
+    def __init__(self, accepts_proba: bool):
+        self.accepts_proba = accepts_proba
+
+    def prepare(self, y_true, y_pred) -> Optional[PreparedRankAUC]:
+        """Bind to data, or return None unless labels are binary and scores 1D."""
+        y_true = np.asarray(y_true)
+        scores = np.asarray(y_pred)
+        if self.accepts_proba and scores.ndim == 2 and scores.shape[1] == 2:
+            scores = scores[:, 1]
+        if y_true.ndim != 1 or scores.shape != y_true.shape:
+            return None
+        classes = np.unique(y_true)
+        if len(classes) != 2:
+            return None
+        true_codes = (y_true == classes[1]).astype(np.uint8)
+        return PreparedRankAUC(true_codes, scores.astype(float))
+
+
+class PreparedLinearMetric(_BlockArrays):
+    """Metric of the form ``const + y_perm @ w`` bound to fixed predictions.
+
+    ``label_values`` holds the per-sample quantity that is permuted: the
+    targets themselves for regression metrics, or positive-class indicators
+    for the binary scoring rules.
+    """
+
+    family = "linear"
+    _block_arrays = ("label_values", "weights")
+
+    def __init__(self, name: str, label_values: np.ndarray, const: float, weights: np.ndarray):
+        self.name = name
+        self.label_values = label_values
+        self.const = float(const)
+        self.weights = weights
+
+    def evaluate(self, perm_block: np.ndarray) -> np.ndarray:
+        """Metric for a ``(B, n)`` block of permutation indices applied to ``y_true``."""
+        return self.const + self.label_values[perm_block] @ self.weights
+
+    def observed(self) -> float:
+        """Metric on the unpermuted labels."""
+        return float(self.const + self.label_values @ self.weights)
+
+
+def _as_float_vector(a) -> Optional[np.ndarray]:
+    a = np.asarray(a)
+    if a.ndim != 1 or a.dtype.kind not in "biuf":
+        return None
+    return a.astype(float)
+
+
+def _positive_indicator(y_true) -> Optional[np.ndarray]:
+    """0/1 indicator of the greater label for numeric binary targets."""
+    y_true = np.asarray(y_true)
+    if y_true.ndim != 1 or y_true.dtype.kind not in "biuf":
+        return None
+    classes = np.unique(y_true)
+    if len(classes) != 2:
+        return None
+    return (y_true == classes[1]).astype(float)
+
+
+def _positive_proba(y_pred) -> Optional[np.ndarray]:
+    y_pred = np.asarray(y_pred, dtype=float)
+    if y_pred.ndim == 2 and y_pred.shape[1] == 2:
+        return y_pred[:, 1]
+    if y_pred.ndim == 1:
+        return y_pred
+    return None
+
+
+def _linear_mse(y_true, y_pred):
+    y, p = _as_float_vector(y_true), _as_float_vector(y_pred)
+    if y is None or p is None or y.shape != p.shape:
+        return None
+    n = len(y)
+    return y, (y @ y + p @ p) / n, -2.0 * p / n
+
+
+def _linear_r2(y_true, y_pred):
+    y, p = _as_float_vector(y_true), _as_float_vector(y_pred)
+    if y is None or p is None or y.shape != p.shape or len(y) < 2:
+        return None
+    sst = float(((y - y.mean()) ** 2).sum())
+    if sst == 0:
+        return None
+    return y, 1.0 - (y @ y + p @ p) / sst, 2.0 * p / sst
+
+
+def _linear_brier(y_true, y_pred):
+    y, p = _positive_indicator(y_true), _as_float_vector(y_pred)
+    if y is None or p is None or y.shape != p.shape:
+        return None
+    n = len(y)
+    return y, (y.sum() + p @ p) / n, -2.0 * p / n
+
+
+def _linear_log_loss(y_true, y_pred):
+    y, p = _positive_indicator(y_true), _positive_proba(y_pred)
+    if y is None or p is None or y.shape != p.shape:
+        return None
+    eps = np.finfo(float).eps
+    log_p1 = np.log(np.clip(p, eps, 1 - eps))
+    log_p0 = np.log(np.clip(1 - p, eps, 1 - eps))
+    n = len(y)
+    return y, -log_p0.sum() / n, -(log_p1 - log_p0) / n
+
+
+def _linear_pearson(y_true, y_pred):
+    y, p = _as_float_vector(y_true), _as_float_vector(y_pred)
+    if y is None or p is None or y.shape != p.shape:
+        return None
+    pc = p - p.mean()
+    denom = np.sqrt(((y - y.mean()) ** 2).sum() * (pc @ pc))
+    if denom == 0:
+        return None
+    return y, 0.0, pc / denom
+
+
+class LinearMetric:
+    """Recognized metric that is linear in the (permuted) labels."""
+
+    family = "linear"
+
+    def __init__(self, name: str, builder: Callable):
+        self.name = name
+        self.builder = builder
+
+    def prepare(self, y_true, y_pred) -> Optional[PreparedLinearMetric]:
+        """Bind to data, or return None if the data is unsupported."""
+        built = self.builder(y_true, y_pred)
+        if built is None:
+            return None
+        label_values, const, weights = built
+        return PreparedLinearMetric(self.name, label_values, const, weights)
+
+
+_PRF_KWARGS = {"average", "pos_label", "zero_division"}
+_PRF_AVERAGES = {"binary", "micro", "macro", "weighted"}
+
+_RECOGNIZED: Dict[Callable, Tuple[str, Callable, set]] = {
+    _skm.accuracy_score: ("accuracy", _accuracy, {"normalize"}),
+    _skm.balanced_accuracy_score: ("balanced_accuracy", _balanced_accuracy, {"adjusted"}),
+    _skm.precision_score: ("precision", _make_prf_kernel("precision"), _PRF_KWARGS),
+    _skm.recall_score: ("recall", _make_prf_kernel("recall"), _PRF_KWARGS),
+    _skm.f1_score: ("f1", _make_prf_kernel("f1"), _PRF_KWARGS),
+    _skm.matthews_corrcoef: ("mcc", _mcc, set()),
+}
+
+
+_RANK_METRICS: Dict[Callable, bool] = {
+    _skm.roc_auc_score: False,
+    roc_auc_positive: True,
+}
+
+
+_LINEAR_METRICS: Dict[Callable, Tuple[str, Callable]] = {
+    _skm.mean_squared_error: ("mse", _linear_mse),
+    _skm.r2_score: ("r2", _linear_r2),
+    _skm.brier_score_loss: ("brier", _linear_brier),
+    _skm.log_loss: ("log_loss", _linear_log_loss),
+    pearson_r: ("pearson", _linear_pearson),
+}
+
+
+_LOSSES = frozenset(
+    getattr(_skm, name) for name in (
+        "mean_squared_error", "root_mean_squared_error", "mean_squared_log_error",
+        "root_mean_squared_log_error", "mean_absolute_error", "median_absolute_error",
+        "mean_absolute_percentage_error", "max_error", "mean_pinball_loss",
+        "mean_poisson_deviance", "mean_gamma_deviance", "mean_tweedie_deviance",
+        "brier_score_loss", "log_loss", "hinge_loss", "zero_one_loss", "hamming_loss",
+    ) if hasattr(_skm, name)
+)
+
+
+def metric_greater_is_better(metric: Callable) -> bool:
+    """False for recognized scikit-learn losses (or partials of them), else True.
+
+    ``detect_bias`` counts null values at least as good as the observed one,
+    i.e. ``>=`` for scores and ``<=`` for losses.
+    """
+    func = metric.func if isinstance(metric, partial) else metric
+    try:
+        return func not in _LOSSES
+    except TypeError:  # unhashable callable
+        return True
+
+
+def resolve_batched_metric(metric: Callable):
+    """Return the batched implementation of ``metric``, or None if not recognized.
+
+    Parameters:
+    -----------
+    metric : callable
+        Metric passed to ``detect_bias``. Plain scikit-learn metric functions
+        and ``functools.partial`` objects binding supported keyword arguments
+        are recognized.
+
+    Returns:
+    --------
+    BatchedMetric, RankAUCMetric, LinearMetric or None
+    """
+    func, kwargs = metric, {}
+    if isinstance(metric, partial):
+        if metric.args:
+            return None
+        func, kwargs = metric.func, dict(metric.keywords)
+    try:
+        spec = _RECOGNIZED.get(func)
+        accepts_proba = _RANK_METRICS.get(func)
+        linear = _LINEAR_METRICS.get(func)
+    except TypeError:  # unhashable callable
+        return None
+    if linear is not None:
+        return None if kwargs else LinearMetric(*linear)
+    if accepts_proba is not None:
+        return None if kwargs else RankAUCMetric(accepts_proba)
+    if spec is None:
+        return None
+    name, kernel, allowed = spec
+    if set(kwargs) - allowed:
+        return None
+    if "average" in kwargs and kwargs["average"] not in _PRF_AVERAGES:
+        return None
+    return BatchedMetric(name, kernel, kwargs)
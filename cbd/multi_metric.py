@@ -0,0 +1,221 @@
+"""Single-pass permutation test for several metrics on the same predictions.
+
+Testing accuracy, F1, AUC and log-loss with four ``detect_bias`` calls
+validates X four times, runs inference four times and draws four sets of
+permutations.  :func:`detect_bias_multi` validates once, calls ``predict``
+and/or ``predict_proba`` at most once each, draws one shared permutation
+stream and evaluates every metric on each permutation block.  The result
+contains one entry per metric and the joint null matrix, whose rows are the
+metric values of the same permutation.
+"""
+from typing import Any, Callable, Dict, Iterable, Optional
+import warnings
+import numpy as np
+from sklearn.utils import check_array, check_consistent_length
+from sklearn.utils.multiclass import type_of_target
+
+from .api import _compute_pvalue_ci, _conclusion, _ensure_predict
+from .fast_metrics import metric_greater_is_better, resolve_batched_metric
+from .permutations import PermutationStream, as_seed_sequence
+from .scheduler import BlockScheduler
+
+MetricFn = Callable[[Any, Any], float]
+
+
+def _multi_metric_task(arrays, perm_block, evaluators) -> np.ndarray:
+    """(B, n_metrics) null values of one permutation block."""
+    y_a = arrays["y"]
+    out = np.empty((len(perm_block), len(evaluators)))
+    y_block = None
+    for j, (batched, metric, output) in enumerate(evaluators):
+        if batched is not None:
+            out[:, j] = batched.evaluate(perm_block)
+            continue
+        if y_block is None:
+            y_block = y_a[perm_block]
+        y_hat = arrays[output]
+        for i, y_perm in enumerate(y_block):
+            out[i, j] = float(metric(y_perm, y_hat))
+    return out
+
+
+def detect_bias_multi(model,
+                      X,
+                      y,
+                      metrics: Dict[str, MetricFn],
+                      n_permutations: int = 1000,
+                      random_state: Optional[int] = None,
+                      proba_metrics: Iterable[str] = (),
+                      n_jobs: int = 1,
+                      backend: str = "threads",
+                      stratify: bool = False,
+                      alpha: float = 0.05,
+                      confidence_level: float = 0.95,
+                      chunk_size: Optional[int] = None,
+                      lower_is_better: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    Permutation test of several metrics sharing predictions and permutations.
+
+    Parameters:
+    -----------
+    model : CBDModel
+        Object implementing predict(X) and, for probability metrics, predict_proba(X)
+        or decision_function(X)
+    X : array-like, shape (n_samples, n_features)
+        Feature matrix (validated once)
+    y : array-like, shape (n_samples,)
+        Target labels
+    metrics : dict of str -> callable
+        Metric functions(y_true, y_pred) -> float, keyed by the name used in the result
+    n_permutations : int, default=1000
+        Number of shared label shuffles
+    random_state : int or numpy.random.SeedSequence, optional
+        Seed of the shared permutation stream. With the same seed, each metric's null
+        equals the one detect_bias computes for it.
+    proba_metrics : iterable of str, default=()
+        Names of metrics that receive predict_proba output (decision_function if the
+        model has no predict_proba) instead of predict output
+    n_jobs : int, default=1
+        Number of parallel workers (see cbd.scheduler)
+    backend : {'threads', 'processes'}, default='threads'
+        Parallel backend
+    stratify : bool, default=False
+        Shuffle labels within classes
+    alpha : float, default=0.05
+        Significance level applied to each metric
+    confidence_level : float, default=0.95
+        Confidence level of p-value intervals (when n_permutations >= 1000)
+    chunk_size : int, optional
+        Permutations evaluated at a time by each worker
+    lower_is_better : iterable of str, default=()
+        Names of custom loss metrics, tested towards smaller values. Recognized
+        scikit-learn losses (log_loss, mean_squared_error, ...) are detected
+        automatically (see cbd.fast_metrics.metric_greater_is_better)
+
+    Returns:
+    --------
+    dict
+        'metrics': per-metric results (observed_metric, p_value, conclusion,
+        metric_engine, greater_is_better, optional p_value_ci); 'metric_names': column order of
+        'null_matrix'; 'null_matrix': np.ndarray of shape (n_permutations, n_metrics);
+        'inference_calls': number of predict / predict_proba calls made
+
+    Examples:
+    ---------
+    >>> from sklearn.metrics import accuracy_score, f1_score, log_loss
+    >>> from cbd.fast_metrics import roc_auc_positive
+    >>> result = detect_bias_multi(
+    ...     model, X_test, y_test,
+    ...     {"accuracy": accuracy_score, "f1": f1_score,
+    ...      "auc": roc_auc_positive, "log_loss": log_loss},
+    ...     proba_metrics=["auc", "log_loss"], n_permutations=1000, random_state=0)
+    >>> result["metrics"]["auc"]["p_value"], result["null_matrix"].shape
+    """
+    _ensure_predict(model)
+    if not metrics:
+        raise ValueError("metrics must contain at least one metric")
+    proba_metrics = set(proba_metrics)
+    unknown = proba_metrics - set(metrics)
+    if unknown:
+        raise ValueError(f"proba_metrics names not in metrics: {sorted(unknown)}")
+    lower_is_better = set(lower_is_better)
+    unknown = lower_is_better - set(metrics)
+    if unknown:
+        raise ValueError(f"lower_is_better names not in metrics: {sorted(unknown)}")
+    if not 0 < alpha < 1:
+        raise ValueError(f"alpha must be in (0, 1), got {alpha}")
+
+    # As in detect_bias: arrays and sparse matrices keep their format and dtype
+    X_a = check_array(X, accept_sparse=True, force_all_finite=False, ensure_2d=True,
+                      dtype=None, copy=False)
+    y_a = np.asarray(y).ravel()
+    check_consistent_length(X_a, y_a)
+
+    names = list(metrics)
+    batched_metrics = {name: resolve_batched_metric(metrics[name]) for name in names}
+    all_linear = all(b is not None and b.family == "linear" for b in batched_metrics.values())
+    if all_linear and type_of_target(y_a) == "continuous":
+        n_classes = None
+    else:
+        unique_classes = np.unique(y_a)
+        n_classes = len(unique_classes)
+        if n_classes < 2:
+            raise ValueError(
+                f"y must contain at least 2 unique classes for meaningful permutation test. "
+                f"Found {n_classes} class(es): {unique_classes}."
+            )
+
+    # ===== ONE INFERENCE PASS PER OUTPUT TYPE =====
+    outputs = {}
+    inference_calls = {"predict": 0, "predict_proba": 0}
+    if any(name not in proba_metrics for name in names):
+        outputs["y_pred"] = model.predict(X_a)
+        inference_calls["predict"] = 1
+    if proba_metrics:
+        if hasattr(model, "predict_proba"):
+            proba_fn = model.predict_proba
+        elif hasattr(model, "decision_function"):
+            warnings.warn(
+                "Model lacks predict_proba but has decision_function. Using decision_function as fallback.",
+                UserWarning
+            )
+            proba_fn = model.decision_function
+        else:
+            raise ValueError(
+                "proba_metrics given but model has neither predict_proba nor decision_function."
+            )
+        outputs["y_proba"] = proba_fn(X_a)
+        inference_calls["predict_proba"] = 1
+
+    evaluators = []
+    observed = {}
+    observed_stat = {}
+    signs = {name: -1.0 if name in lower_is_better or not metric_greater_is_better(metrics[name])
+             else 1.0 for name in names}
+    for name in names:
+        output = "y_proba" if name in proba_metrics else "y_pred"
+        y_hat = outputs[output]
+        observed[name] = float(metrics[name](y_a, y_hat))
+        batched = None
+        if batched_metrics[name] is not None:
+            batched = batched_metrics[name].prepare(y_a, y_hat)
+        observed_stat[name] = signs[name] * (observed[name] if batched is None else batched.observed())
+        evaluators.append((batched, metrics[name], output))
+
+    # ===== SHARED NULL =====
+    seed = as_seed_sequence(random_state)
+    stream = PermutationStream(len(y_a), n_permutations, seed,
+                               groups=y_a if stratify else None)
+    with BlockScheduler(n_jobs=n_jobs, backend=backend, block_size=chunk_size) as scheduler:
+        scheduler.share(y=y_a, **outputs)
+        null_matrix = scheduler.run(_multi_metric_task, stream, 0, n_permutations,
+                                    evaluators=evaluators)
+    null_matrix = null_matrix.reshape(n_permutations, len(names))
+
+    per_metric = {}
+    for j, name in enumerate(names):
+        n_exceed = int(np.sum(signs[name] * null_matrix[:, j] >= observed_stat[name]))
+        p_value = float((n_exceed + 1) / (n_permutations + 1))
+        entry = {
+            "observed_metric": observed[name],
+            "p_value": p_value,
+            "conclusion": _conclusion(p_value, alpha),
+            "metric_engine": "batched" if evaluators[j][0] is not None else "per_call",
+            "uses_proba": name in proba_metrics,
+            "greater_is_better": signs[name] > 0,
+        }
+        if n_permutations >= 1000:
+            entry["p_value_ci"] = _compute_pvalue_ci(p_value, n_permutations, confidence_level)
+        per_metric[name] = entry
+
+    return {
+        "metrics": per_metric,
+        "metric_names": names,
+        "null_matrix": null_matrix,
+        "n_permutations": n_permutations,
+        "alpha": alpha,
+        "stratified": stratify,
+        "n_samples": len(y_a),
+        "n_classes": n_classes,
+        "inference_calls": inference_calls,
+    }
@@ -5,7 +5,10 @@ of multi-task benchmarks like GLUE (9 tasks) and MMLU (57 subtasks).
 """
 from typing import List, Dict, Optional, Callable, Any, Tuple
 import numpy as np
-import warnings
+
+from .fast_metrics import block_size
+from .permutations import PermutationStream, as_seed_sequence, spawn_child
+from .scheduler import BlockScheduler
 
 
 def detect_multivariate_bias(
@@ -18,7 +21,8 @@ def detect_multivariate_bias(
     random_state: Optional[int] = None,
     method: str = "energy",
     alpha: float = 0.05,
-    n_jobs: int = 1
+    n_jobs: int = 1,
+    executor=None
 ) -> Dict:
     """Detect bias using multiple metrics jointly (multivariate test).
     
@@ -50,6 +54,10 @@ def detect_multivariate_bias(
         Significance level
     n_jobs : int, default=1
         Number of parallel workers
+    executor : concurrent.futures.Executor-compatible, optional
+        Evaluate permutations on this executor (e.g. a ProcessPoolExecutor or a
+        dask.distributed Client) in contiguous blocks, see cbd.scheduler.BlockScheduler;
+        overrides n_jobs. model predictions are computed once, locally.
     
     Returns:
     --------
@@ -82,30 +90,21 @@ def detect_multivariate_bias(
     if len(metric_names) != len(metrics):
         raise ValueError("metric_names must have same length as metrics")
     
-    # Setup random state
-    if random_state is None:
-        rng = np.random.default_rng()
-    else:
-        rng = np.random.default_rng(random_state)
-    
     # Compute observed metric vector
     y_pred = model.predict(X)
     observed_metrics = np.array([metric(y, y_pred) for metric in metrics])
     
-    # Generate permutation indices
-    perm_indices = [rng.permutation(len(y)) for _ in range(n_permutations)]
-    
-    # Compute permuted metric vectors
-    if n_jobs == 1:
-        permuted_metric_vectors = _compute_permuted_metrics_multivariate_sequential(
-            model, X, y, metrics, perm_indices
-        )
-    else:
-        permuted_metric_vectors = _compute_permuted_metrics_multivariate_parallel(
-            model, X, y, metrics, perm_indices, n_jobs
+    # Permutation indices are streamed in bounded blocks (see cbd.permutations)
+    # and evaluated against the predictions above on one worker pool
+    stream = PermutationStream(len(y), n_permutations, random_state)
+    with BlockScheduler(n_jobs=n_jobs, executor=executor) as scheduler:
+        scheduler.share(y=y, y_pred=y_pred)
+        permuted_metric_vectors = scheduler.run(
+            _multivariate_task, stream, 0, n_permutations, metrics=metrics
         )
-    
-    permuted_metric_vectors = np.array(permuted_metric_vectors)  # Shape: (n_permutations, n_metrics)
+    permuted_metric_vectors = permuted_metric_vectors.reshape(
+        n_permutations, len(metrics)
+    )  # Shape: (n_permutations, n_metrics)
     
     # Compute test statistic based on method
     if method == "energy":
@@ -169,44 +168,11 @@ def detect_multivariate_bias(
     }
 
 
-def _compute_permuted_metrics_multivariate_sequential(
-    model, X, y, metrics, perm_indices
-) -> List[np.ndarray]:
-    """Compute permuted metric vectors sequentially."""
-    permuted_vectors = []
-    y_pred = model.predict(X)
-    
-    for perm_idx in perm_indices:
-        y_perm = y[perm_idx]
-        metric_vector = np.array([metric(y_perm, y_pred) for metric in metrics])
-        permuted_vectors.append(metric_vector)
-    
-    return permuted_vectors
-
-
-def _compute_permuted_metrics_multivariate_parallel(
-    model, X, y, metrics, perm_indices, n_jobs
-) -> List[np.ndarray]:
-    """Compute permuted metric vectors in parallel."""
-    try:
-        from joblib import Parallel, delayed
-    except ImportError:
-        warnings.warn("joblib not available, falling back to sequential")
-        return _compute_permuted_metrics_multivariate_sequential(
-            model, X, y, metrics, perm_indices
-        )
-    
-    y_pred = model.predict(X)
-    
-    def compute_single(perm_idx):
-        y_perm = y[perm_idx]
-        return np.array([metric(y_perm, y_pred) for metric in metrics])
-    
-    permuted_vectors = Parallel(n_jobs=n_jobs, backend='threading')(
-        delayed(compute_single)(perm_idx) for perm_idx in perm_indices
-    )
-    
-    return permuted_vectors
+def _multivariate_task(arrays, perm_block, metrics) -> np.ndarray:
+    """(B, n_metrics) metric vectors of one permutation block."""
+    y, y_pred = arrays["y"], arrays["y_pred"]
+    return np.array([[metric(y[perm_idx], y_pred) for metric in metrics]
+                     for perm_idx in perm_block]).reshape(len(perm_block), len(metrics))
 
 
 def _energy_distance_test(
@@ -371,44 +337,34 @@ def detect_multitask_bias(
     if set(X_dict.keys()) != set(task_names) or set(y_dict.keys()) != set(task_names):
         raise ValueError("models, X_dict, and y_dict must have same keys")
     
-    # Setup random state
-    if random_state is None:
-        rng = np.random.default_rng()
-    else:
-        rng = np.random.default_rng(random_state)
+    # Each task streams its permutations from its own child of the master seed
+    seed = as_seed_sequence(random_state)
     
     # Compute observed performance vector (one value per task)
     observed_performances = []
+    task_predictions = {}
     for task_name in task_names:
         model = models[task_name]
         X = X_dict[task_name]
-        y = y_dict[task_name]
+        y = np.asarray(y_dict[task_name])
         y_pred = model.predict(X)
+        task_predictions[task_name] = y_pred
         perf = metric(y, y_pred)
         observed_performances.append(perf)
     
     observed_performances = np.array(observed_performances)
     
-    # Generate permuted performance vectors
-    permuted_performances = []
-    for _ in range(n_permutations):
-        perm_perf = []
-        for task_name in task_names:
-            model = models[task_name]
-            X = X_dict[task_name]
-            y = y_dict[task_name]
-            
-            # Permute labels for this task
-            perm_idx = rng.permutation(len(y))
-            y_perm = y[perm_idx]
-            
-            y_pred = model.predict(X)
-            perf = metric(y_perm, y_pred)
-            perm_perf.append(perf)
-        
-        permuted_performances.append(perm_perf)
-    
-    permuted_performances = np.array(permuted_performances)
+    # Generate permuted performance vectors, task by task
+    permuted_performances = np.empty((n_permutations, n_tasks))
+    for t, task_name in enumerate(task_names):
+        y = np.asarray(y_dict[task_name])
+        y_pred = task_predictions[task_name]
+        stream = PermutationStream(len(y), n_permutations, spawn_child(seed, t))
+        row = 0
+        for perm_indices in stream.chunks(block_size(len(y), n_permutations)):
+            for perm_idx in perm_indices:
+                permuted_performances[row, t] = metric(y[perm_idx], y_pred)
+                row += 1
     
     # Apply multivariate test
     if method == "energy":
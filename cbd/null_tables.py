@@ -0,0 +1,445 @@
+"""Precomputed, interpolated permutation-null tables for fast mode.
+
+Under label permutation the null of accuracy, binary F1 and binary ROC AUC
+depends on the data only through the class counts of the labels and the
+predictions (and, for AUC, the score ties).  Their mean and variance are known
+in closed form (:func:`null_moments`), so what a table has to supply is the
+*shape* of the standardized null ``z = (metric - mean) / std``: its
+discreteness and skew, which vary smoothly with the number of samples, the
+class balance and the number of classes.
+
+:func:`generate_null_tables` simulates that shape over a grid, with the
+vectorized engine (sampled contingency tables for count-based metrics, the
+rank kernel on permutation blocks for AUC), and stores upper-tail quantiles of
+``z`` at fixed levels in a compact ``.npz`` artifact shipped in ``cbd/data``.
+:meth:`NullTables.p_value` interpolates the quantiles of the query's cell
+(linearly in log n and balance) and reads off a p-value in microseconds.
+
+The tables assume the predictions have the class proportions of the labels;
+location and scale are exact for any predictions.  Regenerate the artifact
+with::
+
+    python -m cbd.null_tables --output cbd/data/null_tables.npz
+"""
+from typing import Any, Dict, Optional, Sequence
+import argparse
+import os
+import time
+import warnings
+import numpy as np
+from scipy.stats import rankdata
+
+from .exact_null import sample_contingency_tables
+from .fast_metrics import PreparedBatchedMetric, PreparedRankAUC, block_size, resolve_batched_metric
+from .permutations import PermutationStream, as_seed_sequence, spawn_child
+
+TABLE_METRICS = ("accuracy", "f1", "auc")
+
+DEFAULT_N_GRID = (20, 30, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+# Balance = n_classes * (smallest class count) / n: 1 for equal classes
+DEFAULT_BALANCE_GRID = (0.1, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+DEFAULT_CLASS_GRID = (2, 3, 4, 5)
+
+# Upper-tail probabilities P(z >= q) at which quantiles are stored
+TAIL_LEVELS = np.array([
+    1.0, 0.99, 0.95, 0.9, 0.8, 0.7, 0.6, 0.5, 0.4, 0.3, 0.25, 0.2, 0.15, 0.1,
+    0.075, 0.05, 0.04, 0.03, 0.025, 0.02, 0.015, 0.01, 0.0075, 0.005, 0.004,
+    0.003, 0.0025, 0.002, 0.0015, 0.001, 0.0005, 0.0002,
+])
+
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(__file__), "data", "null_tables.npz")
+
+TABLE_FORMAT_VERSION = 1
+
+
+def class_balance(counts) -> float:
+    """Balance of class counts: n_classes * smallest count / n (1 = equal classes)."""
+    counts = np.asarray(counts)
+    return float(len(counts) * counts.min() / counts.sum())
+
+
+def grid_class_counts(n: int, n_classes: int, balance: float) -> np.ndarray:
+    """Class counts of a grid cell: the smallest class at the given balance, the rest equal."""
+    smallest = int(min(max(1, round(balance * n / n_classes)), n // n_classes))
+    rest = n - smallest
+    counts = np.full(n_classes, rest // (n_classes - 1), dtype=np.int64)
+    counts[1:1 + rest % (n_classes - 1)] += 1
+    counts[0] = smallest
+    return counts
+
+
+def _label_counts(y_true, y_pred):
+    labels, inverse = np.unique(np.concatenate([y_true, y_pred]), return_inverse=True)
+    n = len(y_true)
+    true_counts = np.bincount(inverse[:n], minlength=len(labels))
+    pred_counts = np.bincount(inverse[n:], minlength=len(labels))
+    return labels, true_counts, pred_counts
+
+
+def _accuracy_moments(true_counts: np.ndarray, pred_counts: np.ndarray):
+    # Matches M = sum_i [y_perm_i == y_pred_i]; pairs of positions give E[M (M - 1)]
+    a = true_counts.astype(float)
+    b = pred_counts.astype(float)
+    n = a.sum()
+    ab = float(a @ b)
+    mean_m = ab / n
+    pairs = ab ** 2 - float(a ** 2 @ b) - float(a @ b ** 2) + ab
+    var_m = mean_m + pairs / (n * (n - 1)) - mean_m ** 2
+    return mean_m / n, np.sqrt(max(var_m, 0.0)) / n
+
+
+def _f1_moments(n: int, n_true: int, n_pred: int):
+    # F1 = 2 TP / (n_true + n_pred) with TP hypergeometric
+    mean_tp = n_true * n_pred / n
+    var_tp = n_true * n_pred * (n - n_true) * (n - n_pred) / (n ** 2 * (n - 1))
+    scale = 2.0 / (n_true + n_pred)
+    return scale * mean_tp, scale * np.sqrt(var_tp)
+
+
+def _auc_moments(positive: np.ndarray, scores: np.ndarray):
+    # The positive rank sum is a sample of n1 midranks drawn without replacement
+    ranks = rankdata(scores)
+    n = len(ranks)
+    n1 = int(positive.sum())
+    n0 = n - n1
+    var_ranks = float(np.mean((ranks - ranks.mean()) ** 2))
+    mean_r1 = n1 * ranks.mean()
+    var_r1 = n1 * var_ranks * n0 / (n - 1)
+    scale = n1 * n0
+    return (mean_r1 - n1 * (n1 + 1) / 2.0) / scale, np.sqrt(var_r1) / scale
+
+
+def null_moments(metric_name: str, y_true, y_pred, pos_label=1) -> Optional[Dict[str, Any]]:
+    """Exact mean and standard deviation of a metric's label-permutation null.
+
+    Parameters:
+    -----------
+    metric_name : str
+        'accuracy', 'f1' (binary, of pos_label) or 'auc' (binary, scores or a
+        (n_samples, 2) predict_proba output)
+    y_true, y_pred : array-like
+        Labels and predictions (or scores)
+    pos_label : default=1
+        Positive label of F1
+
+    Returns:
+    --------
+    dict or None
+        'mean', 'std', 'step' (spacing of the metric's lattice of null
+        values), 'n_classes' and 'balance' (of y_true), or None if the metric
+        or data is not supported
+    """
+    y_true = np.asarray(y_true).ravel()
+    y_pred = np.asarray(y_pred)
+    n = len(y_true)
+    if n < 2:
+        return None
+    if metric_name == "auc":
+        if y_pred.ndim == 2 and y_pred.shape[1] == 2:
+            y_pred = y_pred[:, 1]
+        classes, true_counts = np.unique(y_true, return_counts=True)
+        if y_pred.shape != y_true.shape or len(classes) != 2:
+            return None
+        mean, std = _auc_moments(y_true == classes[1], y_pred.astype(float))
+        # U moves in steps of 1, or 1/2 with tied scores
+        n1 = int(true_counts[1])
+        tied = len(np.unique(y_pred)) < n
+        step = (0.5 if tied else 1.0) / (n1 * (n - n1))
+    elif metric_name in ("accuracy", "f1"):
+        if y_pred.ndim != 1 or len(y_pred) != n:
+            return None
+        labels, true_counts, pred_counts = _label_counts(y_true, y_pred)
+        if metric_name == "accuracy":
+            mean, std = _accuracy_moments(true_counts, pred_counts)
+            # With two classes matches change in pairs: accuracy = (2 TP + const) / n
+            step = (2.0 if len(labels) == 2 else 1.0) / n
+        else:
+            if len(labels) > 2 or pos_label not in labels.tolist():
+                return None
+            pos = labels.tolist().index(pos_label)
+            n_true, n_pred = int(true_counts[pos]), int(pred_counts[pos])
+            if n_true + n_pred == 0:
+                return None
+            mean, std = _f1_moments(n, n_true, n_pred)
+            step = 2.0 / (n_true + n_pred)
+        true_counts = true_counts[true_counts > 0]
+    else:
+        return None
+    return {"mean": float(mean), "std": float(std), "step": float(step),
+            "n_classes": int(len(true_counts)),
+            "balance": class_balance(true_counts)}
+
+
+class NullTables:
+    """Standardized null quantiles over a grid of (n_classes, n, balance).
+
+    Parameters:
+    -----------
+    n_grid, balance_grid, class_grid : sequence
+        Grid axes (increasing)
+    quantiles : dict
+        Metric name -> float array of shape (n_class_grid, n_n_grid,
+        n_balance_grid, n_levels); NaN marks cells without a table
+    levels : np.ndarray
+        Upper-tail probabilities of the quantiles (decreasing)
+    n_permutations : int
+        Null draws per cell
+    """
+
+    def __init__(self, n_grid: Sequence[int], balance_grid: Sequence[float],
+                 class_grid: Sequence[int], quantiles: Dict[str, np.ndarray],
+                 levels=TAIL_LEVELS, n_permutations: int = 0):
+        self.n_grid = np.asarray(n_grid, dtype=np.int64)
+        self.balance_grid = np.asarray(balance_grid, dtype=float)
+        self.class_grid = np.asarray(class_grid, dtype=np.int64)
+        self.levels = np.asarray(levels, dtype=float)
+        self.quantiles = {name: np.asarray(q, dtype=float) for name, q in quantiles.items()}
+        self.n_permutations = int(n_permutations)
+        self._log_n = np.log(self.n_grid)
+        self._log_levels = np.log(self.levels)
+
+    @property
+    def metrics(self):
+        return tuple(self.quantiles)
+
+    def save(self, path) -> None:
+        """Write the tables as a compressed .npz (quantiles stored as float32)."""
+        arrays = {f"q_{name}": q.astype(np.float32) for name, q in self.quantiles.items()}
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f, version=TABLE_FORMAT_VERSION, n_grid=self.n_grid.astype(np.int32),
+                balance_grid=self.balance_grid.astype(np.float32),
+                class_grid=self.class_grid.astype(np.int16), levels=self.levels,
+                n_permutations=self.n_permutations, **arrays
+            )
+
+    @classmethod
+    def load(cls, path) -> "NullTables":
+        """Read tables written by :meth:`save`."""
+        with np.load(path) as data:
+            if int(data["version"]) != TABLE_FORMAT_VERSION:
+                raise ValueError(
+                    f"Null table format {int(data['version'])} is not supported "
+                    f"(expected {TABLE_FORMAT_VERSION}); regenerate with python -m cbd.null_tables"
+                )
+            quantiles = {key[2:]: data[key] for key in data.files if key.startswith("q_")}
+            return cls(data["n_grid"], data["balance_grid"], data["class_grid"], quantiles,
+                       levels=data["levels"], n_permutations=int(data["n_permutations"]))
+
+    def covers(self, metric_name: str, n: int, n_classes: int, balance: float) -> bool:
+        """Whether the query lies inside the grid of metric_name."""
+        return self.cell_quantiles(metric_name, n, n_classes, balance) is not None
+
+    def cell_quantiles(self, metric_name: str, n: int, n_classes: int,
+                       balance: float) -> Optional[np.ndarray]:
+        """Quantiles interpolated linearly in log n and balance, or None outside the grid."""
+        q = self.quantiles.get(metric_name)
+        if q is None or n_classes not in self.class_grid.tolist():
+            return None
+        if not (self.n_grid[0] <= n <= self.n_grid[-1]):
+            return None
+        if not (self.balance_grid[0] <= balance <= self.balance_grid[-1] + 1e-9):
+            return None
+        table = q[self.class_grid.tolist().index(n_classes)]
+        log_n = np.log(n)
+        i = int(np.clip(np.searchsorted(self._log_n, log_n) - 1, 0, len(self.n_grid) - 2))
+        j = int(np.clip(np.searchsorted(self.balance_grid, balance) - 1, 0,
+                        len(self.balance_grid) - 2))
+        u = (log_n - self._log_n[i]) / (self._log_n[i + 1] - self._log_n[i])
+        v = (min(balance, self.balance_grid[-1]) - self.balance_grid[j]) / (
+            self.balance_grid[j + 1] - self.balance_grid[j])
+        cell = ((1 - u) * (1 - v) * table[i, j] + u * (1 - v) * table[i + 1, j]
+                + (1 - u) * v * table[i, j + 1] + u * v * table[i + 1, j + 1])
+        if np.isnan(cell).any():
+            return None
+        # Quantiles must stay non-decreasing as the tail probability decreases
+        return np.maximum.accumulate(cell)
+
+    def tail_probability(self, quantiles: np.ndarray, z: float):
+        """P(z_null >= z) from a cell's quantiles; second value is True when z is beyond the table."""
+        j = int(np.searchsorted(quantiles, z, side="left"))
+        if j == 0:
+            return 1.0, False
+        if j == len(quantiles):
+            return float(self.levels[-1]), True
+        lo, hi = quantiles[j - 1], quantiles[j]
+        if hi <= lo:
+            return float(self.levels[j]), False
+        t = (z - lo) / (hi - lo)
+        return float(np.exp((1 - t) * self._log_levels[j - 1] + t * self._log_levels[j])), False
+
+    def p_value(self, metric_name: str, y_true, y_pred, observed: float,
+                pos_label=1) -> Optional[Dict[str, Any]]:
+        """Interpolated permutation p-value P(metric_null >= observed).
+
+        Parameters:
+        -----------
+        metric_name : str
+            'accuracy', 'f1' or 'auc'
+        y_true, y_pred : array-like
+            Labels and the predictions the metric was computed on
+        observed : float
+            Observed metric value
+        pos_label : default=1
+            Positive label of F1
+
+        Returns:
+        --------
+        dict or None
+            'p_value', 'p_value_is_bound' (True when the observed value is
+            beyond the last tabulated level, so the p-value is at most
+            'p_value'), 'z', 'null_mean', 'null_std', 'n_classes' and
+            'balance'; None outside the grid
+        """
+        moments = null_moments(metric_name, y_true, y_pred, pos_label=pos_label)
+        if moments is None:
+            return None
+        n = len(np.asarray(y_true).ravel())
+        info = {"null_mean": moments["mean"], "null_std": moments["std"],
+                "n_classes": moments["n_classes"], "balance": moments["balance"]}
+        if moments["std"] == 0:
+            # Every permutation gives the observed value
+            return {"p_value": 1.0, "p_value_is_bound": False, "z": 0.0, **info}
+        quantiles = self.cell_quantiles(metric_name, n, moments["n_classes"], moments["balance"])
+        if quantiles is None:
+            return None
+        z = (observed - moments["mean"]) / moments["std"]
+        # Continuity correction: interpolated quantiles are smooth while the
+        # null lives on a lattice, so P(null >= observed) is read half a step lower
+        p, bound = self.tail_probability(quantiles, z - 0.5 * moments["step"] / moments["std"])
+        return {"p_value": p, "p_value_is_bound": bound, "z": float(z), **info}
+
+
+def _cell_null(metric_name: str, counts: np.ndarray, n_permutations: int,
+               seed: np.random.SeedSequence) -> np.ndarray:
+    """Standardized null draws of one grid cell."""
+    n = int(counts.sum())
+    labels = np.repeat(np.arange(len(counts)), counts)
+    if metric_name == "auc":
+        # Untied scores: only the positive count matters
+        prepared = PreparedRankAUC(labels.astype(np.uint8), np.arange(n, dtype=float))
+        stream = PermutationStream(n, n_permutations, random_state=seed)
+        values = np.concatenate([prepared.evaluate(block)
+                                 for block in stream.chunks(block_size(n, n_permutations))])
+        y_pred = np.arange(n, dtype=float)
+    else:
+        from sklearn.metrics import accuracy_score, f1_score
+        y_pred = labels
+        func = accuracy_score if metric_name == "accuracy" else f1_score
+        prepared: PreparedBatchedMetric = resolve_batched_metric(func).prepare(labels, y_pred)
+        rng = np.random.default_rng(seed)
+        chunk = 65536
+        values = np.concatenate([
+            prepared.from_confusion(sample_contingency_tables(
+                counts, counts, min(chunk, n_permutations - start), rng))
+            for start in range(0, n_permutations, chunk)
+        ])
+    moments = null_moments(metric_name, labels, y_pred)
+    return (values - moments["mean"]) / moments["std"]
+
+
+def generate_null_tables(n_grid: Sequence[int] = DEFAULT_N_GRID,
+                         balance_grid: Sequence[float] = DEFAULT_BALANCE_GRID,
+                         class_grid: Sequence[int] = DEFAULT_CLASS_GRID,
+                         n_permutations: int = 100_000,
+                         metrics: Sequence[str] = TABLE_METRICS,
+                         random_state=0, verbose: bool = False) -> NullTables:
+    """Simulate standardized null quantiles over a grid.
+
+    Parameters:
+    -----------
+    n_grid, balance_grid, class_grid : sequence
+        Sample sizes, balances (n_classes * smallest class share) and numbers
+        of classes; F1 and AUC are tabulated for two classes only
+    n_permutations : int, default=100000
+        Null draws per cell; the smallest level that can be resolved is
+        about 10 / n_permutations
+    metrics : sequence of str
+        Subset of ('accuracy', 'f1', 'auc')
+    random_state : int or SeedSequence, default=0
+        Master seed; cell (metric, k, n, balance) uses its own child stream
+    verbose : bool, default=False
+        Print progress per metric
+
+    Returns:
+    --------
+    NullTables
+    """
+    unknown = set(metrics) - set(TABLE_METRICS)
+    if unknown:
+        raise ValueError(f"Unknown table metrics {sorted(unknown)}; choose from {TABLE_METRICS}")
+    if n_permutations < 1:
+        raise ValueError(f"n_permutations must be >= 1, got {n_permutations}")
+    seed = as_seed_sequence(random_state)
+    shape = (len(class_grid), len(n_grid), len(balance_grid), len(TAIL_LEVELS))
+    quantiles = {}
+    cell_id = 0
+    for metric_name in metrics:
+        t_start = time.perf_counter()
+        table = np.full(shape, np.nan)
+        for a, k in enumerate(class_grid):
+            for i, n in enumerate(n_grid):
+                for j, balance in enumerate(balance_grid):
+                    cell_id += 1
+                    if metric_name != "accuracy" and k != 2:
+                        continue
+                    counts = grid_class_counts(int(n), int(k), float(balance))
+                    z = _cell_null(metric_name, counts, n_permutations, spawn_child(seed, cell_id))
+                    # Order statistic with P(z >= q) >= level
+                    z.sort()
+                    index = np.floor((1 - TAIL_LEVELS) * (len(z) - 1)).astype(np.int64)
+                    table[a, i, j] = z[index]
+        quantiles[metric_name] = table
+        if verbose:
+            print(f"{metric_name}: {time.perf_counter() - t_start:.1f}s")
+    return NullTables(n_grid, balance_grid, class_grid, quantiles, n_permutations=n_permutations)
+
+
+_loaded: Dict[str, Optional[NullTables]] = {}
+
+
+def load_null_tables(path=None) -> Optional[NullTables]:
+    """Tables shipped with the package (or at path), loaded once per process.
+
+    Returns None, with a UserWarning, if the file is missing or unreadable.
+    """
+    path = os.fspath(path) if path is not None else DEFAULT_TABLE_PATH
+    if path not in _loaded:
+        try:
+            _loaded[path] = NullTables.load(path)
+        except (OSError, ValueError, KeyError) as exc:
+            warnings.warn(f"Null tables at {path} could not be loaded ({exc}); "
+                          f"fast mode falls back to a quick permutation test", UserWarning)
+            _loaded[path] = None
+    return _loaded[path]
+
+
+def main(argv=None) -> None:
+    """Command-line generator: python -m cbd.null_tables [--output PATH] ..."""
+    parser = argparse.ArgumentParser(
+        prog="python -m cbd.null_tables",
+        description="Simulate the null tables used by cbd.thresholds.detect_bias_fast",
+    )
+    parser.add_argument("--output", default=DEFAULT_TABLE_PATH, help="Output .npz path")
+    parser.add_argument("--n-permutations", type=int, default=100_000,
+                        help="Null draws per grid cell")
+    parser.add_argument("--n-grid", type=int, nargs="+", default=list(DEFAULT_N_GRID))
+    parser.add_argument("--balance-grid", type=float, nargs="+", default=list(DEFAULT_BALANCE_GRID))
+    parser.add_argument("--class-grid", type=int, nargs="+", default=list(DEFAULT_CLASS_GRID))
+    parser.add_argument("--metrics", nargs="+", default=list(TABLE_METRICS), choices=TABLE_METRICS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    tables = generate_null_tables(args.n_grid, args.balance_grid, args.class_grid,
+                                  n_permutations=args.n_permutations, metrics=args.metrics,
+                                  random_state=args.seed, verbose=True)
+    directory = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(directory, exist_ok=True)
+    tables.save(args.output)
+    print(f"Wrote {args.output} ({os.path.getsize(args.output)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Constant-memory streaming generation of permutation indices.
+
+Permutation tests used to materialize all ``n_permutations`` index arrays
+before evaluating any of them, which needs ``8 * n * n_permutations`` bytes.
+:class:`PermutationStream` instead yields ``(B, n)`` chunks on demand, so peak
+memory is bounded by the chunk size.
+
+Reproducibility does not depend on how the stream is cut: permutation ``i``
+belongs to stream block ``i // STREAM_BLOCK``, and every stream block draws
+from its own Generator seeded with a child of the master ``SeedSequence``
+(the ``j``-th child is exactly what ``SeedSequence.spawn`` returns for block
+``j``).  Any range of permutations can therefore be regenerated on its own,
+and results are bit-identical for every chunk size and worker count.
+"""
+from typing import Iterator, Optional, Union
+import numpy as np
+
+# Permutations drawn from one child stream of the master seed.
+STREAM_BLOCK = 64
+
+# Random keys from Generator.random are multiples of 2 ** -KEY_BITS in [0, 1).
+KEY_BITS = 53
+
+SeedLike = Union[None, int, np.random.SeedSequence, np.random.Generator]
+
+
+def as_seed_sequence(random_state: SeedLike = None) -> np.random.SeedSequence:
+    """Turn a ``random_state`` argument into a master ``SeedSequence``.
+
+    Integers give the same sequence as ``numpy.random.default_rng(seed)``;
+    None draws fresh OS entropy; a Generator contributes entropy drawn from it.
+    """
+    if isinstance(random_state, np.random.SeedSequence):
+        return random_state
+    if isinstance(random_state, np.random.Generator):
+        return np.random.SeedSequence(random_state.integers(2 ** 63, size=4).tolist())
+    return np.random.SeedSequence(random_state)
+
+
+def spawn_child(seed: np.random.SeedSequence, key: int) -> np.random.SeedSequence:
+    """The ``key``-th child of ``seed``, as ``seed.spawn`` would produce it.
+
+    Unlike ``spawn``, children are addressed by index and the parent is not
+    mutated, so any child can be rebuilt independently in any process.
+    """
+    return np.random.SeedSequence(
+        seed.entropy,
+        spawn_key=tuple(seed.spawn_key) + (int(key),),
+        pool_size=seed.pool_size,
+    )
+
+
+def grouped_permutations(group_codes: np.ndarray, keys: np.ndarray,
+                         group_order: Optional[np.ndarray] = None) -> np.ndarray:
+    """Within-group permutations for every row of a ``(B, n)`` block of random keys.
+
+    Sorting a row by (group, key) lists the positions of each group in random
+    order; scattering the sorted positions back onto the group-sorted
+    positions permutes all B rows within their groups at once.  With at most
+    ``2 ** (64 - KEY_BITS)`` groups the (group, key) pair is packed exactly
+    into one uint64 (group code in the high bits, the key's 53 significant
+    bits in the low bits) and sorted with a single argsort; more groups use
+    ``np.lexsort``.
+
+    Parameters:
+    -----------
+    group_codes : np.ndarray, shape (n,)
+        Integer group codes 0..k-1
+    keys : np.ndarray, shape (B, n)
+        Uniform random keys in [0, 1), as drawn by Generator.random
+    group_order : np.ndarray, shape (n,), optional
+        ``np.argsort(group_codes, kind='stable')``, if already computed
+
+    Returns:
+    --------
+    np.ndarray, shape (B, n)
+        ``perm[b]`` maps every position to a position of the same group
+    """
+    group_codes = np.asarray(group_codes)
+    if group_order is None:
+        group_order = np.argsort(group_codes, kind="stable")
+    if len(group_codes) == 0 or int(group_codes.max()) < 2 ** (64 - KEY_BITS):
+        packed = (keys * 2.0 ** KEY_BITS).astype(np.uint64)
+        packed |= group_codes.astype(np.uint64) << np.uint64(KEY_BITS)
+        order = np.argsort(packed, axis=1)
+    else:
+        order = np.lexsort((keys, np.broadcast_to(group_codes, keys.shape)), axis=-1)
+    perms = np.empty(keys.shape, dtype=group_order.dtype)
+    perms[:, group_order] = order
+    return perms
+
+
+def permute_within_groups(groups, n_permutations: int,
+                          rng: np.random.Generator) -> np.ndarray:
+    """``(n_permutations, n)`` block of permutation indices that stay within ``groups``.
+
+    Convenience wrapper around :func:`grouped_permutations` drawing the keys
+    from ``rng``.
+    """
+    _, codes = np.unique(np.asarray(groups).ravel(), return_inverse=True)
+    keys = rng.random((int(n_permutations), len(codes)))
+    return grouped_permutations(codes, keys)
+
+
+def index_dtype(n_samples: int) -> np.dtype:
+    """Smallest index dtype able to address ``n_samples`` positions."""
+    return np.dtype(np.int32 if n_samples <= np.iinfo(np.int32).max else np.int64)
+
+
+class PermutationStream:
+    """Lazy, chunked source of permutation indices.
+
+    Parameters:
+    -----------
+    n_samples : int
+        Length of each permutation
+    n_permutations : int
+        Total number of permutations in the stream
+    random_state : int, SeedSequence, Generator or None
+        Master seed; see :func:`as_seed_sequence`
+    groups : array-like, shape (n_samples,), optional
+        If given, samples are only shuffled within their group (stratified
+        permutations, generated a block at a time by
+        :func:`grouped_permutations`); singleton groups stay fixed
+
+    Examples:
+    ---------
+    >>> stream = PermutationStream(len(y), 1000, random_state=0)
+    >>> for perm_block in stream.chunks(100):
+    ...     values = metric_kernel(y[perm_block])
+    """
+
+    def __init__(self, n_samples: int, n_permutations: int,
+                 random_state: SeedLike = None, groups=None):
+        if n_samples < 1:
+            raise ValueError(f"n_samples must be >= 1, got {n_samples}")
+        if n_permutations < 0:
+            raise ValueError(f"n_permutations must be >= 0, got {n_permutations}")
+        self.n_samples = int(n_samples)
+        self.n_permutations = int(n_permutations)
+        self.seed = as_seed_sequence(random_state)
+        self.dtype = index_dtype(self.n_samples)
+        self._identity = np.arange(self.n_samples, dtype=self.dtype)
+        self.group_codes: Optional[np.ndarray] = None
+        self._group_order: Optional[np.ndarray] = None
+        if groups is not None:
+            groups = np.asarray(groups).ravel()
+            if len(groups) != self.n_samples:
+                raise ValueError(
+                    f"groups has {len(groups)} entries, expected {self.n_samples}"
+                )
+            _, codes = np.unique(groups, return_inverse=True)
+            self.group_codes = codes.ravel()
+            self._group_order = np.argsort(codes, kind="stable").astype(self.dtype)
+
+    def __getstate__(self):
+        # Workers rebuild the identity permutation instead of receiving it
+        state = self.__dict__.copy()
+        del state["_identity"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._identity = np.arange(self.n_samples, dtype=self.dtype)
+
+    def block_generator(self, block: int) -> np.random.Generator:
+        """Generator of stream block ``block`` (permutations ``block * STREAM_BLOCK`` ...)."""
+        return np.random.default_rng(spawn_child(self.seed, block))
+
+    def _skip(self, rng: np.random.Generator, n_rows: int) -> None:
+        """Advance ``rng`` past the draws of ``n_rows`` permutations."""
+        if self.group_codes is not None:
+            # One 64-bit PCG64 output per uniform key
+            rng.bit_generator.advance(n_rows * self.n_samples)
+        else:
+            scratch = np.empty(self.n_samples, dtype=self.dtype)
+            for _ in range(n_rows):
+                scratch[:] = self._identity
+                rng.shuffle(scratch)
+
+    def _fill(self, rng: np.random.Generator, rows: np.ndarray) -> None:
+        if self.group_codes is not None:
+            keys = rng.random((len(rows), self.n_samples))
+            rows[:] = grouped_permutations(self.group_codes, keys, self._group_order)
+        else:
+            for row in rows:
+                row[:] = self._identity
+                rng.shuffle(row)
+
+    def chunks(self, chunk_size: int, start: int = 0,
+               stop: Optional[int] = None) -> Iterator[np.ndarray]:
+        """Yield ``(B, n_samples)`` blocks covering permutations ``[start, stop)``.
+
+        Parameters:
+        -----------
+        chunk_size : int
+            Maximum number of permutations per yielded block
+        start, stop : int, optional
+            Range of permutation numbers to generate (default: the whole stream)
+        """
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be >= 1, got {chunk_size}")
+        stop = self.n_permutations if stop is None else min(int(stop), self.n_permutations)
+        position = int(start)
+        rng, rng_block = None, -1
+        while position < stop:
+            size = min(int(chunk_size), stop - position)
+            out = np.empty((size, self.n_samples), dtype=self.dtype)
+            r = 0
+            while r < size:
+                block, offset = divmod(position + r, STREAM_BLOCK)
+                if block != rng_block:
+                    rng, rng_block = self.block_generator(block), block
+                    # Skip ahead when the range starts inside a stream block
+                    self._skip(rng, offset)
+                n_rows = min(size - r, STREAM_BLOCK - offset)
+                self._fill(rng, out[r:r + n_rows])
+                r += n_rows
+            yield out
+            position += size
+
+    def take(self, start: int, stop: int) -> np.ndarray:
+        """All permutations ``[start, stop)`` as one ``(stop - start, n_samples)`` array."""
+        stop = min(int(stop), self.n_permutations)
+        size = max(0, stop - int(start))
+        if size == 0:
+            return np.empty((0, self.n_samples), dtype=self.dtype)
+        return next(self.chunks(size, start, stop))
@@ -0,0 +1,233 @@
+"""Progressive subsampling for permutation tests on very large test sets.
+
+Instead of one fixed subsample, :func:`progressive_detect_bias` tests a small
+(class-stratified) subsample, then grows it geometrically, until the decision
+``p_value <= alpha`` is the same at two consecutive sizes or the whole data set
+is used.  Subsamples are nested: each step adds rows to the previous one, so
+only the new rows are passed to the model and earlier predictions are reused.
+
+:class:`NestedSampler` draws the rows without replacement.  Unstratified, it
+uses memory proportional to the subsample, not to the data: candidates are
+drawn in vectorized batches and rejected if already selected (Floyd's idea of
+resolving collisions against the selected set, batched).  Stratified, each
+class's quota is taken from a shuffled list of that class's rows, so rare
+classes cost no more than common ones.
+"""
+from typing import Any, Dict, Optional
+import time
+import numpy as np
+
+from .permutations import as_seed_sequence, spawn_child
+
+DEFAULT_START_SIZE = 1000
+
+# Once the next size exceeds this fraction of the data, the whole data set is used:
+# rejection sampling slows down as the sample fills the population.
+FULL_DATA_FRACTION = 0.5
+
+
+class NestedSampler:
+    """Growing uniform (optionally stratified) sample of row indices without replacement.
+
+    Parameters:
+    -----------
+    n : int
+        Population size
+    strata : array-like of shape (n,), optional
+        Class of each row; quotas keep each class's share of the sample equal to
+        its share of the population (at least one row per class)
+    random_state : int, SeedSequence or Generator, optional
+        Seed of the draws
+    """
+
+    def __init__(self, n: int, strata=None, random_state=None):
+        self.n = int(n)
+        self.rng = np.random.default_rng(random_state)
+        self.strata = strata
+        self.indices = np.empty(0, dtype=np.int64)
+        self._sorted = self.indices
+        if strata is not None:
+            self.classes, counts = np.unique(strata, return_counts=True)
+            self.shares = counts / self.n
+            self.taken = np.zeros(len(self.classes), dtype=np.int64)
+            self.counts = counts
+        self._class_rows = None
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def _quotas(self, k: int) -> np.ndarray:
+        # Largest-remainder allocation, at least one row per class, never below
+        # what earlier steps already took
+        raw = self.shares * k
+        quotas = np.maximum(np.maximum(np.floor(raw).astype(np.int64), 1), self.taken)
+        quotas = np.minimum(quotas, self.counts)
+        order = np.argsort(quotas - raw)
+        order = order[quotas[order] < self.counts[order]]
+        quotas[order[:max(0, k - quotas.sum())]] += 1
+        return quotas
+
+    def grow(self, k: int) -> np.ndarray:
+        """Extend the sample to (about) k rows and return the new indices."""
+        k = min(int(k), self.n)
+        if k >= self.n:
+            mask = np.ones(self.n, dtype=bool)
+            mask[self.indices] = False
+            new = np.flatnonzero(mask)
+            self.rng.shuffle(new)
+            return self._add(new)
+        if self.strata is not None:
+            return self._add(self._grow_stratified(k))
+        need = k - len(self.indices)
+        new = []
+        n_new = 0
+        while n_new < need:
+            candidates = self.rng.integers(0, self.n, size=2 * (need - n_new) + 16)
+            # First occurrence of each candidate, in draw order
+            _, first = np.unique(candidates, return_index=True)
+            candidates = candidates[np.sort(first)]
+            candidates = candidates[~self._contains(candidates)]
+            if new:
+                candidates = candidates[~np.isin(candidates, np.concatenate(new))]
+            candidates = candidates[:need - n_new]
+            new.append(candidates)
+            n_new += len(candidates)
+        return self._add(np.concatenate(new) if new else np.empty(0, dtype=np.int64))
+
+    def _grow_stratified(self, k: int) -> np.ndarray:
+        # Each class's rows in a random order, drawn once; every step takes the
+        # next quota of each, so samples are nested and uniform within classes
+        if self._class_rows is None:
+            codes = np.searchsorted(self.classes, np.asarray(self.strata))
+            by_class = np.split(np.argsort(codes, kind="stable"), np.cumsum(self.counts)[:-1])
+            self._class_rows = [self.rng.permutation(rows) for rows in by_class]
+        quotas = self._quotas(k)
+        return np.concatenate([rows[taken:quota] for rows, taken, quota
+                               in zip(self._class_rows, self.taken, quotas)])
+
+    def _contains(self, candidates: np.ndarray) -> np.ndarray:
+        pos = np.searchsorted(self._sorted, candidates)
+        pos = np.minimum(pos, max(len(self._sorted) - 1, 0))
+        return (self._sorted[pos] == candidates) if len(self._sorted) else np.zeros(len(candidates), bool)
+
+    def _add(self, new: np.ndarray) -> np.ndarray:
+        new = new.astype(np.int64)
+        self.indices = np.concatenate([self.indices, new])
+        self._sorted = np.sort(self.indices)
+        if self.strata is not None:
+            codes = np.searchsorted(self.classes, np.asarray(self.strata)[new])
+            self.taken += np.bincount(codes, minlength=len(self.classes))
+        return new
+
+
+class _StoredPredictions:
+    """Model stand-in returning precomputed predictions for the row indices in X[:, 0]."""
+
+    def __init__(self, predictions):
+        self.predictions = predictions
+
+    def predict(self, X):
+        return self.predictions[np.asarray(X)[:, 0].astype(np.int64)]
+
+
+def progressive_detect_bias(model, X, y, metric, predict_method: str,
+                            start_size: Optional[int] = None, growth: float = 2.0,
+                            stratify_sample: bool = True, groups=None,
+                            random_state=None, alpha: float = 0.05,
+                            **step_kwargs) -> Dict[str, Any]:
+    """Permutation test on a geometrically growing subsample until the decision is stable.
+
+    Parameters:
+    -----------
+    model, X, y, metric
+        As for cbd.detect_bias (X and y already validated)
+    predict_method : str
+        Model method producing the predictions ('predict', 'predict_proba', ...)
+    start_size : int, optional
+        Size of the first subsample (default 1000)
+    growth : float, default=2.0
+        Factor by which the subsample grows between steps (> 1)
+    stratify_sample : bool, default=True
+        Keep the class proportions of y in every subsample
+    groups : array-like of shape (n_samples,), optional
+        Permutation groups (detect_bias stratify array), subset with the rows
+    random_state : int or SeedSequence, optional
+        Master seed; child 0 draws the rows, child s + 1 the permutations of step s
+    alpha : float, default=0.05
+        Significance level of the decision
+    **step_kwargs
+        Passed to cbd.detect_bias for every step; a time_budget_s covers the
+        whole run, each step gets what is left of it and no step starts once
+        it is spent
+
+    Returns:
+    --------
+    dict
+        Result of the last step, with 'n_samples' its subsample size and a
+        'progressive' entry: the steps (n_samples, p_value, significant,
+        elapsed_s), whether the decision was stable and the total row count
+    """
+    from .api import detect_bias
+
+    if growth <= 1:
+        raise ValueError(f"progressive_growth must be > 1, got {growth}")
+    n = len(y)
+    size = int(start_size) if start_size is not None else DEFAULT_START_SIZE
+    if size < 2:
+        raise ValueError(f"subsample_size must be >= 2 for progressive subsampling, got {size}")
+    seed = as_seed_sequence(random_state)
+    sampler = NestedSampler(n, y if stratify_sample else None, random_state=spawn_child(seed, 0))
+    predict_fn = getattr(model, predict_method)
+
+    stratify = step_kwargs.pop("stratify", False)
+    time_budget_s = step_kwargs.pop("time_budget_s", None)
+    t_start = time.perf_counter()
+    predictions = None
+    steps = []
+    result = None
+    stable = False
+    while True:
+        if size >= FULL_DATA_FRACTION * n:
+            size = n
+        t_step = time.perf_counter()
+        if time_budget_s is not None:
+            remaining = time_budget_s - (t_step - t_start)
+            if steps and remaining <= 0:
+                break
+            step_kwargs["time_budget_s"] = remaining if steps else time_budget_s
+        new = sampler.grow(size)
+        new_predictions = np.asarray(predict_fn(X[new]))
+        predictions = (new_predictions if predictions is None
+                       else np.concatenate([predictions, new_predictions]))
+        rows = sampler.indices
+        step_groups = None if groups is None else np.asarray(groups)[rows]
+        result = detect_bias(
+            _StoredPredictions(predictions), np.arange(len(rows)).reshape(-1, 1), y[rows], metric,
+            random_state=spawn_child(seed, len(steps) + 1), alpha=alpha,
+            stratify=step_groups if step_groups is not None else stratify,
+            **step_kwargs
+        )
+        significant = bool(result["p_value"] <= alpha)
+        steps.append({
+            "n_samples": int(len(rows)),
+            "p_value": result["p_value"],
+            "significant": significant,
+            "elapsed_s": time.perf_counter() - t_step,
+        })
+        if len(steps) >= 2 and steps[-2]["significant"] == significant:
+            stable = True
+            break
+        if len(rows) >= n:
+            break
+        size = int(np.ceil(len(rows) * growth))
+
+    result["n_samples"] = int(len(sampler))
+    result["subsampled"] = len(sampler) < n
+    result["progressive"] = {
+        "steps": steps,
+        "stable": stable,
+        "growth": growth,
+        "n_samples_total": n,
+        "stratified_sample": stratify_sample,
+    }
+    return result
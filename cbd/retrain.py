@@ -0,0 +1,243 @@
+"""Retrain-null engine for ``detect_bias(null_method='retrain')``.
+
+Refitting the model on every permuted label vector is the expensive part of
+the conservative retrain null.  :class:`RetrainEngine` keeps that cost down:
+
+- Models are refit from an unfitted ``sklearn.clone`` template instead of a
+  deepcopy of the fitted model, and each worker thread or process reuses one
+  estimator for all the permutations it handles.
+- ``strategy='warm_start'`` starts every refit from the solution of the
+  original fitted model (``warm_start=True``), which lets iterative solvers
+  converge in a few iterations.  Every permutation starts from the same
+  state, so results do not depend on the order in which workers see them.
+  ``strategy='auto'`` only picks it for the convex linear models with
+  deterministic solvers listed in :data:`CONVEX_WARM_START`, whose refits
+  reach the same optimum from any start.  For non-convex models (MLPs),
+  stochastic solvers (SGD, Perceptron, PassiveAggressive) or boosting the
+  starting point changes the refit model and couples every permuted refit
+  to the original fit.
+- ``strategy='partial_fit'`` replaces each full fit by ``partial_fit_epochs``
+  passes of ``partial_fit`` on a fresh clone.
+- ``fit_rows`` refits on a fixed subsample of the rows and predicts on all
+  of them; :func:`subsample_error_bound` quantifies the resulting error.
+
+Fit and predict wall-clock times are measured for every permutation.
+"""
+from copy import copy, deepcopy
+from typing import Any, Dict, Optional, Tuple
+import threading
+import time
+import uuid
+import numpy as np
+
+RETRAIN_STRATEGIES = ("auto", "refit", "warm_start", "partial_fit")
+
+# sklearn.linear_model estimators solving a convex problem with coordinate
+# descent or lbfgs/newton: a warm start only saves iterations.
+CONVEX_WARM_START = frozenset({
+    "LogisticRegression", "Lasso", "ElasticNet", "MultiTaskLasso", "MultiTaskElasticNet",
+    "HuberRegressor", "PoissonRegressor", "GammaRegressor", "TweedieRegressor",
+})
+
+# Per-thread (and therefore per-process) estimator reused across permutations.
+_WORKER = threading.local()
+
+
+def unfitted_template(model):
+    """Unfitted copy of ``model``: ``sklearn.clone`` when possible, else a deepcopy."""
+    try:
+        from sklearn.base import clone
+        return clone(model)
+    except Exception:
+        return deepcopy(model)
+
+
+def supports_warm_start(model) -> bool:
+    """True if ``warm_start`` means "initialize from the previous solution".
+
+    Ensembles are excluded: for them warm starting adds estimators to the
+    fitted ensemble instead of refitting it.
+    """
+    if not hasattr(model, "get_params"):
+        return False
+    try:
+        params = model.get_params(deep=False)
+    except Exception:
+        return False
+    return "warm_start" in params and not type(model).__module__.startswith("sklearn.ensemble")
+
+
+def convex_warm_start(model) -> bool:
+    """True if a warm-started refit of ``model`` converges to the cold-fit optimum.
+
+    Only the ``sklearn.linear_model`` estimators in :data:`CONVEX_WARM_START`
+    qualify: for them the starting point affects the number of iterations, not
+    the solution.  Stochastic solvers (SGD, Perceptron, PassiveAggressive) do
+    not, since the solution they stop at depends on where they start.
+    """
+    return (supports_warm_start(model)
+            and type(model).__module__.startswith("sklearn.linear_model")
+            and type(model).__name__ in CONVEX_WARM_START)
+
+
+def resolve_strategy(model, strategy: str) -> str:
+    """Validate ``strategy`` and resolve 'auto' for ``model``."""
+    if strategy not in RETRAIN_STRATEGIES:
+        raise ValueError(
+            f"retrain_strategy must be one of {RETRAIN_STRATEGIES}, got {strategy!r}"
+        )
+    if strategy == "auto":
+        return "warm_start" if convex_warm_start(model) else "refit"
+    if strategy == "warm_start" and not supports_warm_start(model):
+        raise ValueError(f"{type(model).__name__} does not support warm_start refits")
+    if strategy == "partial_fit" and not hasattr(model, "partial_fit"):
+        raise ValueError(f"{type(model).__name__} has no partial_fit method")
+    return strategy
+
+
+class RetrainEngine:
+    """Refit a model on permuted labels and predict with the refit model.
+
+    Parameters:
+    -----------
+    model : estimator
+        Fitted model whose predictions produced the observed metric
+    predict_method : str
+        'predict', 'predict_proba' or 'decision_function'
+    strategy : {'auto', 'refit', 'warm_start', 'partial_fit'}, default='auto'
+        How each permutation is refit; 'auto' uses 'warm_start' for convex
+        linear models (see convex_warm_start) and 'refit' otherwise
+    fit_rows : np.ndarray, optional
+        Row indices used for fitting (subsample approximation); all rows by default
+    partial_fit_epochs : int, default=5
+        Passes of partial_fit per permutation with strategy='partial_fit'
+    classes : np.ndarray, optional
+        Class labels passed to the first partial_fit call of classifiers
+    """
+
+    def __init__(self, model, predict_method: str, strategy: str = "auto",
+                 fit_rows: Optional[np.ndarray] = None, partial_fit_epochs: int = 5,
+                 classes: Optional[np.ndarray] = None):
+        if partial_fit_epochs < 1:
+            raise ValueError(f"partial_fit_epochs must be >= 1, got {partial_fit_epochs}")
+        self.strategy = resolve_strategy(model, strategy)
+        self.predict_method = predict_method
+        self.fit_rows = fit_rows
+        self.partial_fit_epochs = int(partial_fit_epochs)
+        self.classes = classes
+        self.template = unfitted_template(model)
+        self.warm_source = None
+        if self.strategy == "warm_start":
+            self.warm_source = deepcopy(model)
+            self.warm_source.set_params(warm_start=True)
+        # Identifies this run in the per-worker estimator cache
+        self.token = uuid.uuid4().hex
+
+    def _worker_estimator(self):
+        if getattr(_WORKER, "token", None) != self.token:
+            _WORKER.token = self.token
+            _WORKER.estimator = unfitted_template(self.template)
+        return _WORKER.estimator
+
+    def _fit(self, X_fit, y_fit):
+        if self.strategy == "refit":
+            estimator = self._worker_estimator()
+            estimator.fit(X_fit, y_fit)
+        elif self.strategy == "warm_start":
+            estimator = deepcopy(self.warm_source)
+            estimator.fit(X_fit, y_fit)
+        else:
+            from sklearn.base import is_classifier
+            estimator = unfitted_template(self.template)
+            kwargs = {"classes": self.classes} if is_classifier(estimator) else {}
+            for _ in range(self.partial_fit_epochs):
+                estimator.partial_fit(X_fit, y_fit, **kwargs)
+        return estimator
+
+    def fit_predict(self, X, y_perm, X_fit=None) -> Tuple[Any, float, float]:
+        """Refit on ``y_perm`` and predict on ``X``.
+
+        Parameters:
+        -----------
+        X : array-like
+            Evaluation features (all rows)
+        y_perm : np.ndarray
+            Permuted labels for all rows
+        X_fit : array-like, optional
+            ``X[fit_rows]`` if already extracted by the caller
+
+        Returns:
+        --------
+        tuple
+            (predictions, fit seconds, predict seconds)
+        """
+        if self.fit_rows is not None:
+            if X_fit is None:
+                X_fit = X[self.fit_rows]
+            y_fit = y_perm[self.fit_rows]
+        else:
+            X_fit, y_fit = X, y_perm
+        t0 = time.perf_counter()
+        estimator = self._fit(X_fit, y_fit)
+        t1 = time.perf_counter()
+        y_pred = getattr(estimator, self.predict_method)(X)
+        t2 = time.perf_counter()
+        return y_pred, t1 - t0, t2 - t1
+
+    def evaluate(self, X, y_a, perm_block, metric) -> np.ndarray:
+        """Metric, fit time and predict time for each permutation of a block.
+
+        Returns:
+        --------
+        np.ndarray, shape (B, 3)
+        """
+        X_fit = X[self.fit_rows] if self.fit_rows is not None else None
+        out = np.empty((len(perm_block), 3))
+        for i, perm_idx in enumerate(perm_block):
+            y_perm = y_a[perm_idx]
+            y_pred_perm, fit_s, predict_s = self.fit_predict(X, y_perm, X_fit)
+            out[i] = float(metric(y_perm, y_pred_perm)), fit_s, predict_s
+        return out
+
+
+def subsample_error_bound(engine: RetrainEngine, X, y_a, perm_block, metric,
+                          null_values: np.ndarray, observed: float) -> Dict[str, Any]:
+    """Bound the effect of fitting on a subsample on the retrain null.
+
+    The first permutations are refit both on the subsample and on all rows;
+    ``max_abs_error`` is the largest metric difference seen.  Null values
+    within that distance of the observed metric could fall on either side of
+    it, which gives the reported bracket for the p-value.
+
+    Parameters:
+    -----------
+    engine : RetrainEngine
+        Engine configured with ``fit_rows``
+    perm_block : np.ndarray, shape (k, n)
+        Calibration permutations (the first ones of the stream)
+    null_values : np.ndarray
+        Retrain null computed on the subsample
+    observed : float
+        Observed metric
+
+    Returns:
+    --------
+    dict
+        ``n_calibration``, ``max_abs_error``, ``mean_abs_error`` and ``p_value_bounds``
+    """
+    full = copy(engine)
+    full.fit_rows = None
+    full.token = uuid.uuid4().hex
+    approx = engine.evaluate(X, y_a, perm_block, metric)[:, 0]
+    exact = full.evaluate(X, y_a, perm_block, metric)[:, 0]
+    errors = np.abs(approx - exact)
+    delta = float(errors.max()) if len(errors) else 0.0
+    n = len(null_values)
+    low = (np.sum(null_values >= observed + delta) + 1) / (n + 1)
+    high = (np.sum(null_values >= observed - delta) + 1) / (n + 1)
+    return {
+        "n_calibration": int(len(errors)),
+        "max_abs_error": delta,
+        "mean_abs_error": float(errors.mean()) if len(errors) else 0.0,
+        "p_value_bounds": (float(low), float(high)),
+    }
@@ -0,0 +1,435 @@
+"""Block scheduler for parallel permutation nulls.
+
+Submitting one task per permutation makes dispatch overhead dominate and, with
+the process backend, pickles the labels, predictions and features into every
+task.  :class:`BlockScheduler` instead hands each worker a contiguous range of
+the permutation stream.  The worker regenerates that range from the stream's
+seed (see :mod:`cbd.permutations`), so a task carries two integers besides the
+task function, and results are concatenated in range order: they do not depend
+on the number of workers or on scheduling.
+
+With the process backend, arrays registered through :meth:`BlockScheduler.share`
+are written once per run to a temporary folder (in RAM under ``/dev/shm`` when
+available) and workers open read-only memory maps of them instead of receiving
+pickled copies.  CSR/CSC matrices are shared component-wise.  The folder is
+removed when the scheduler is closed, including when the run fails.
+
+Instead of the joblib backends, blocks can be submitted to any object with the
+``concurrent.futures.Executor`` interface, i.e. a ``submit(fn, *args)`` method
+returning futures with ``result()``: a ``ProcessPoolExecutor``, a
+``dask.distributed.Client`` (local or multi-node) or an adapter around a Ray
+pool.  The executor belongs to the caller and is not shut down.
+:func:`map_blocks` applies the same contiguous-block submission to per-item
+workers (e.g. one seed per permutation).
+
+Native thread pools (OpenBLAS, MKL, OpenMP) of the code run inside the tasks
+are limited with threadpoolctl according to an ``inner_threads`` policy (see
+:func:`resolve_inner_threads`), so that n workers times the native threads of
+each do not oversubscribe the machine.  Thread workers share one process and
+its pools, so for them the limit is set once around the whole run; process
+and executor workers apply it inside each task.
+"""
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+import os
+import warnings
+import shutil
+import tempfile
+import numpy as np
+
+from .fast_metrics import block_size as memory_block_size
+from .permutations import PermutationStream
+
+# Blocks submitted per worker and round; > 1 evens out uneven task durations.
+BLOCKS_PER_WORKER = 4
+
+# Arrays smaller than this are cheaper to pickle than to memory-map.
+MIN_SHARED_BYTES = 1 << 20
+
+BlockTask = Callable[..., np.ndarray]
+InnerThreads = Optional[Union[int, str]]
+
+
+def effective_n_jobs(n_jobs: int) -> int:
+    """Number of workers for a joblib-style ``n_jobs`` (-1 = all CPUs)."""
+    if n_jobs == 0:
+        raise ValueError("n_jobs == 0 has no meaning; use 1 for sequential execution")
+    try:
+        from joblib import effective_n_jobs as _joblib_effective_n_jobs
+        return int(_joblib_effective_n_jobs(n_jobs))
+    except ImportError:
+        n_cpus = os.cpu_count() or 1
+        return n_jobs if n_jobs > 0 else max(1, n_cpus + 1 + n_jobs)
+
+
+def resolve_inner_threads(inner_threads: InnerThreads, n_workers: int) -> Optional[int]:
+    """Native threads allowed per worker, or None for no limit.
+
+    Parameters:
+    -----------
+    inner_threads : int, 'auto' or None
+        - None: leave native thread pools alone
+        - 'auto': cpu_count // n_workers (at least 1) when n_workers > 1, else no limit
+        - int >= 1: that many threads per worker
+    n_workers : int
+        Number of parallel workers
+    """
+    if inner_threads is None:
+        return None
+    if isinstance(inner_threads, str):
+        if inner_threads != "auto":
+            raise ValueError(f"inner_threads must be None, 'auto' or an int >= 1, got {inner_threads!r}")
+        if n_workers <= 1:
+            return None
+        return max(1, (os.cpu_count() or 1) // n_workers)
+    if int(inner_threads) != inner_threads or inner_threads < 1:
+        raise ValueError(f"inner_threads must be None, 'auto' or an int >= 1, got {inner_threads!r}")
+    return int(inner_threads)
+
+
+@contextmanager
+def limit_inner_threads(n_threads: Optional[int]):
+    """Limit native BLAS/OpenMP thread pools of this process to ``n_threads``.
+
+    A no-op when n_threads is None; warns and does nothing when threadpoolctl
+    is not installed.
+    """
+    if n_threads is None:
+        yield
+        return
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        warnings.warn(
+            "threadpoolctl not available, native thread pools are not limited. "
+            "Install it to use inner_threads: pip install threadpoolctl",
+            UserWarning
+        )
+        yield
+        return
+    with threadpool_limits(limits=n_threads):
+        yield
+
+
+def call_limited(n_threads: Optional[int], fn: Callable, *args, **kwargs):
+    """``fn(*args, **kwargs)`` under :func:`limit_inner_threads` (a picklable task wrapper)."""
+    with limit_inner_threads(n_threads):
+        return fn(*args, **kwargs)
+
+
+def thread_layout(n_workers: int, inner_threads: InnerThreads, n_threads: Optional[int],
+                  scope: str) -> Dict[str, Any]:
+    """Effective worker/thread layout of a run, for result dicts.
+
+    Returns:
+    --------
+    dict
+        n_workers, inner_threads (policy), threads_per_worker (None = not
+        limited), scope ('process' if the limit was set once for the calling
+        process, 'worker' if inside each task), total_threads (None if not
+        limited) and the native thread-pool libraries found
+    """
+    try:
+        from threadpoolctl import threadpool_info
+        libraries = sorted({info.get("internal_api", "?") for info in threadpool_info()})
+    except ImportError:
+        libraries = []
+    return {
+        "n_workers": int(n_workers),
+        "inner_threads": inner_threads,
+        "threads_per_worker": n_threads,
+        "scope": scope,
+        "total_threads": n_workers * n_threads if n_threads is not None else None,
+        "native_libraries": libraries,
+    }
+
+
+def executor_workers(executor, default: int = 1) -> int:
+    """Worker count of an executor, or ``default`` when it cannot be determined.
+
+    Recognizes ``concurrent.futures`` pools (``_max_workers``) and
+    ``dask.distributed.Client`` (total threads over its workers).
+    """
+    n = getattr(executor, "_max_workers", None)
+    if n is None and hasattr(executor, "nthreads"):
+        try:
+            n = sum(executor.nthreads().values())
+        except Exception:
+            n = None
+    return int(n) if n else max(1, default)
+
+
+def _gather(futures) -> list:
+    """Results of ``futures`` in submission order; pending ones are cancelled on failure."""
+    try:
+        return [future.result() for future in futures]
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+def _map_block(fn: Callable, items, args, kwargs, n_threads=None) -> list:
+    with limit_inner_threads(n_threads):
+        return [fn(item, *args, **kwargs) for item in items]
+
+
+def map_blocks(executor, fn: Callable, items: Sequence, *args,
+               n_workers: Optional[int] = None, n_threads: Optional[int] = None,
+               **kwargs) -> List[Any]:
+    """``[fn(item, *args, **kwargs) for item in items]`` evaluated on an executor.
+
+    Items are grouped into contiguous blocks (about BLOCKS_PER_WORKER per
+    worker) and each block is one submitted task, so ``args`` are pickled once
+    per block rather than once per item.  Results are returned in item order.
+
+    Parameters:
+    -----------
+    executor : concurrent.futures.Executor-compatible
+        Object with submit(fn, *args) returning futures with result()
+    fn : callable
+        Per-item worker, must be picklable for process or cluster executors
+    items : sequence
+        Items to map over
+    n_workers : int, optional
+        Worker count used to size the blocks; detected from the executor when None
+    n_threads : int, optional
+        Native threads allowed inside each task (see :func:`limit_inner_threads`)
+    """
+    if n_workers is None:
+        n_workers = executor_workers(executor)
+    block = -(-len(items) // max(1, n_workers * BLOCKS_PER_WORKER)) or 1
+    futures = [executor.submit(_map_block, fn, items[lo:lo + block], args, kwargs, n_threads)
+               for lo in range(0, len(items), block)]
+    return [value for block_values in _gather(futures) for value in block_values]
+
+
+def auto_block_size(n_permutations: int, n_workers: int, n_samples: int) -> int:
+    """Permutations per task: about BLOCKS_PER_WORKER tasks per worker, memory-bounded."""
+    per_task = -(-n_permutations // max(1, n_workers * BLOCKS_PER_WORKER))
+    return int(max(1, min(per_task, memory_block_size(n_samples, n_permutations))))
+
+
+def _shared_folder() -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+    return tempfile.mkdtemp(prefix="cbd_shared_", dir=base)
+
+
+def _dump(folder: str, name: str, array: np.ndarray):
+    array = np.asarray(array)
+    if array.dtype.hasobject or array.nbytes < MIN_SHARED_BYTES:
+        return ("inline", array)
+    path = os.path.join(folder, f"{name}.npy")
+    np.save(path, np.ascontiguousarray(array))
+    return ("npy", path)
+
+
+def _share(folder: str, name: str, value):
+    """Descriptor of ``value`` that workers can open without a pickled copy."""
+    try:
+        from scipy import sparse
+    except ImportError:  # pragma: no cover - scipy is a hard dependency of sklearn
+        sparse = None
+    if sparse is not None and sparse.issparse(value):
+        if value.format not in ("csr", "csc"):
+            return ("inline", value)
+        parts = {part: _dump(folder, f"{name}_{part}", getattr(value, part))
+                 for part in ("data", "indices", "indptr")}
+        return ("sparse", value.format, value.shape, parts)
+    if isinstance(value, np.ndarray):
+        return _dump(folder, name, value)
+    return ("inline", value)
+
+
+def _open(spec):
+    kind = spec[0]
+    if kind == "inline":
+        return spec[1]
+    if kind == "npy":
+        return np.load(spec[1], mmap_mode="r")
+    _, fmt, shape, parts = spec
+    from scipy import sparse
+    components = tuple(_open(parts[part]) for part in ("data", "indices", "indptr"))
+    matrix_cls = sparse.csr_matrix if fmt == "csr" else sparse.csc_matrix
+    return matrix_cls(components, shape=shape, copy=False)
+
+
+@contextmanager
+def shared_arrays(**arrays):
+    """Write arrays once to a temporary folder and yield descriptors workers can open.
+
+    Dense arrays and CSR/CSC components of at least MIN_SHARED_BYTES become
+    ``.npy`` files (in RAM under ``/dev/shm`` when available); smaller or
+    object arrays are passed inline.  The folder is removed on exit, also when
+    the body raises.  Workers call :func:`open_shared` on the descriptors.
+    """
+    folder = _shared_folder()
+    try:
+        yield {name: _share(folder, name, value) for name, value in arrays.items()}
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def open_shared(specs: Dict[str, Any]) -> Dict[str, Any]:
+    """Read-only, zero-copy views of arrays described by :func:`shared_arrays`."""
+    return {name: _open(spec) for name, spec in specs.items()}
+
+
+def _run_range(task: BlockTask, stream: PermutationStream, start: int, stop: int,
+               block: int, specs: Dict[str, Any], kwargs: Dict[str, Any],
+               n_threads: Optional[int] = None) -> np.ndarray:
+    """Worker entry point: regenerate ``[start, stop)`` and evaluate it block by block."""
+    arrays = open_shared(specs)
+    with limit_inner_threads(n_threads):
+        values = [np.asarray(task(arrays, perm_block, **kwargs), dtype=float)
+                  for perm_block in stream.chunks(block, start, stop)]
+    return np.concatenate(values) if values else np.empty(0)
+
+
+class BlockScheduler:
+    """Evaluate ranges of a permutation stream sequentially or on a worker pool.
+
+    Parameters:
+    -----------
+    n_jobs : int, default=1
+        Number of workers (-1 = all CPUs); 1 runs blocks in the calling thread
+    backend : {'threads', 'processes'}, default='threads'
+        joblib backend used when n_jobs != 1 ('threading' or 'loky')
+    block_size : int, optional
+        Permutations per task; auto-tuned from the worker count when None
+    executor : concurrent.futures.Executor-compatible, optional
+        Submit blocks with executor.submit instead of a joblib pool (see module
+        docstring); n_jobs is then only a fallback worker count for block sizing
+        when the executor does not expose one. With backend='processes', shared
+        arrays are memory-mapped files, so the executor's workers must run on this
+        machine (e.g. a dask LocalCluster); otherwise arrays are pickled into tasks.
+    inner_threads : int, 'auto' or None, default=None
+        Native BLAS/OpenMP threads per worker (see :func:`resolve_inner_threads`)
+
+    Examples:
+    ---------
+    >>> with BlockScheduler(n_jobs=4, backend="processes") as scheduler:
+    ...     scheduler.share(y=y, y_pred=y_pred)
+    ...     values = scheduler.run(task, stream, 0, stream.n_permutations)
+    """
+
+    def __init__(self, n_jobs: int = 1, backend: str = "threads",
+                 block_size: Optional[int] = None, executor=None,
+                 inner_threads: InnerThreads = None):
+        if backend not in ("threads", "processes"):
+            raise ValueError(f"backend must be 'threads' or 'processes', got {backend!r}")
+        if block_size is not None and block_size < 1:
+            raise ValueError(f"block_size must be >= 1, got {block_size}")
+        self.n_workers = effective_n_jobs(n_jobs)
+        self.executor = executor
+        if executor is not None:
+            self.n_workers = executor_workers(executor, default=self.n_workers)
+        self.inner_threads = inner_threads
+        self.n_threads = resolve_inner_threads(inner_threads, self.n_workers)
+        self.backend = backend
+        self.block_size = block_size
+        self.last_block_size: Optional[int] = None
+        self._specs: Dict[str, Any] = {}
+        self._folder: Optional[str] = None
+        self._parallel = None
+
+    @property
+    def parallel(self) -> bool:
+        return self.n_workers > 1 or self.executor is not None
+
+    @property
+    def limit_scope(self) -> str:
+        """'process' if the thread limit is set in the calling process, else 'worker'."""
+        in_process = not self.parallel or (self.executor is None and self.backend == "threads")
+        return "process" if in_process else "worker"
+
+    def layout(self) -> Dict[str, Any]:
+        """Worker and native-thread layout (see :func:`thread_layout`)."""
+        return thread_layout(self.n_workers, self.inner_threads, self.n_threads, self.limit_scope)
+
+    def share(self, **arrays) -> None:
+        """Register read-only inputs handed to every task as ``arrays[name]``."""
+        if self.parallel and self.backend == "processes":
+            if self._folder is None:
+                self._folder = _shared_folder()
+            for name, value in arrays.items():
+                self._specs[name] = _share(self._folder, name, value)
+        else:
+            for name, value in arrays.items():
+                self._specs[name] = ("inline", value)
+
+    def _pool(self):
+        if self._parallel is None:
+            from joblib import Parallel
+            joblib_backend = "loky" if self.backend == "processes" else "threading"
+            self._parallel = Parallel(n_jobs=self.n_workers, backend=joblib_backend)
+            self._parallel.__enter__()
+        return self._parallel
+
+    def run(self, task: BlockTask, stream: PermutationStream, start: int, stop: int,
+            **kwargs) -> np.ndarray:
+        """Evaluate ``task(arrays, perm_block, **kwargs)`` over permutations ``[start, stop)``.
+
+        Returns:
+        --------
+        np.ndarray, shape (stop - start, ...)
+            Task outputs (one row per permutation) in permutation order
+        """
+        count = max(0, stop - start)
+        if count == 0:
+            return np.empty(0)
+        if self.block_size is not None:
+            block = self.block_size
+        elif self.parallel:
+            block = auto_block_size(count, self.n_workers, stream.n_samples)
+        else:
+            block = memory_block_size(stream.n_samples, count)
+        self.last_block_size = block
+        if self.limit_scope == "process":
+            with limit_inner_threads(self.n_threads):
+                return self._run_in_process(task, stream, start, stop, block, kwargs)
+        bounds = list(range(start, stop, block)) + [stop]
+        if self.executor is not None:
+            futures = [self.executor.submit(_run_range, task, stream, lo, hi, block,
+                                            self._specs, kwargs, self.n_threads)
+                       for lo, hi in zip(bounds[:-1], bounds[1:])]
+            return np.concatenate(_gather(futures))
+        return self._run_joblib(task, stream, start, stop, block, kwargs, self.n_threads)
+
+    def _run_in_process(self, task, stream, start, stop, block, kwargs) -> np.ndarray:
+        if not self.parallel:
+            return _run_range(task, stream, start, stop, block, self._specs, kwargs)
+        return self._run_joblib(task, stream, start, stop, block, kwargs, None)
+
+    def _run_joblib(self, task, stream, start, stop, block, kwargs, n_threads) -> np.ndarray:
+        try:
+            from joblib import delayed
+        except ImportError:
+            warnings.warn(
+                "joblib not available. Falling back to sequential execution. "
+                "Install joblib for parallel processing: pip install joblib",
+                UserWarning
+            )
+            return _run_range(task, stream, start, stop, block, self._specs, kwargs, n_threads)
+        bounds = list(range(start, stop, block)) + [stop]
+        results = self._pool()(
+            delayed(_run_range)(task, stream, lo, hi, block, self._specs, kwargs, n_threads)
+            for lo, hi in zip(bounds[:-1], bounds[1:])
+        )
+        return np.concatenate(results)
+
+    def close(self) -> None:
+        """Shut down the joblib pool (not a caller's executor) and delete shared files."""
+        if self._parallel is not None:
+            parallel, self._parallel = self._parallel, None
+            parallel.__exit__(None, None, None)
+        if self._folder is not None:
+            folder, self._folder = self._folder, None
+            shutil.rmtree(folder, ignore_errors=True)
+        self._specs = {}
+
+    def __enter__(self) -> "BlockScheduler":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
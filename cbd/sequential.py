@@ -0,0 +1,248 @@
+"""Sequential early-stopping rules for permutation tests.
+
+``detect_bias(early_stopping=...)`` evaluates permutations in chunks and
+passes the exceedance indicators (permuted metric >= observed) of every chunk
+to a stopping rule.  The rule locates the exact permutation at which it stops,
+so chunking never changes the result, only the amount of wasted work.
+
+- :class:`BesagClifford`: stop at the ``h``-th exceedance and report the
+  sequential p-value ``h / L`` (Besag & Clifford, 1991).  Valid for any
+  stopping point and very cheap when the p-value is large.
+- :class:`SPRT`: Wald's sequential probability ratio test on the exceedance
+  probability, deciding between ``p = alpha * (1 + delta)`` (not significant)
+  and ``p = alpha * (1 - delta)`` (significant) with error rates bounded by
+  ``error_rate``.  Stops early in both directions.
+
+:class:`TimeBudget` sizes the chunks of ``detect_bias(time_budget_s=...)``
+from the measured throughput so that the run ends close to a wall-clock
+budget; it can be combined with either rule.
+"""
+from typing import Optional, Tuple, Union
+import time
+import numpy as np
+
+
+class StoppingRule:
+    """Base class for early-stopping rules.
+
+    Subclasses implement :meth:`_scan`, which inspects the exceedance
+    indicators of one chunk given the running state and returns the number of
+    permutations of the chunk to keep and a stopping reason (or None).
+    """
+
+    name = "none"
+
+    def __init__(self, chunk_size: int = 50):
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be >= 1, got {chunk_size}")
+        self.chunk_size = int(chunk_size)
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear the running state so the rule can be reused."""
+        self.n_exceed = 0
+        self.n_used = 0
+        self.stopped = False
+
+    def update(self, exceed: np.ndarray) -> Tuple[int, Optional[str]]:
+        """Consume one chunk of exceedance indicators.
+
+        Parameters:
+        -----------
+        exceed : np.ndarray of bool
+            ``permuted_metric >= observed`` for each permutation of the chunk
+
+        Returns:
+        --------
+        tuple
+            (number of permutations of this chunk to keep, stopping reason or None)
+        """
+        exceed = np.asarray(exceed, dtype=bool)
+        n_keep, reason = self._scan(exceed)
+        self.n_exceed += int(exceed[:n_keep].sum())
+        self.n_used += n_keep
+        self.stopped = reason is not None
+        return n_keep, reason
+
+    def _scan(self, exceed: np.ndarray) -> Tuple[int, Optional[str]]:
+        return len(exceed), None
+
+    def p_value(self) -> float:
+        """p-value for the permutations consumed so far."""
+        return (self.n_exceed + 1) / (self.n_used + 1)
+
+
+class BesagClifford(StoppingRule):
+    """Stop once ``h`` permuted metrics reach the observed value.
+
+    Parameters:
+    -----------
+    h : int, default=10
+        Number of exceedances that ends the test; p = h / L when it stops
+    chunk_size : int, default=50
+        Permutations evaluated between checks
+    """
+
+    name = "besag_clifford"
+
+    def __init__(self, h: int = 10, chunk_size: int = 50):
+        super().__init__(chunk_size)
+        if h < 1:
+            raise ValueError(f"h must be >= 1, got {h}")
+        self.h = int(h)
+
+    def _scan(self, exceed):
+        cumulative = self.n_exceed + np.cumsum(exceed)
+        hit = np.flatnonzero(cumulative >= self.h)
+        if len(hit) == 0:
+            return len(exceed), None
+        return int(hit[0]) + 1, "h_exceedances"
+
+    def p_value(self) -> float:
+        if self.stopped:
+            return self.h / self.n_used
+        return super().p_value()
+
+
+class SPRT(StoppingRule):
+    """Wald SPRT on the exceedance probability around ``alpha``.
+
+    Parameters:
+    -----------
+    alpha : float
+        Significance level of the permutation test
+    delta : float, default=0.5
+        Relative half-width of the indifference region around alpha
+    error_rate : float, default=1e-3
+        Bound on both wrong-decision probabilities of the sequential test
+    chunk_size : int, default=50
+        Permutations evaluated between checks
+    """
+
+    name = "sprt"
+
+    def __init__(self, alpha: float, delta: float = 0.5, error_rate: float = 1e-3,
+                 chunk_size: int = 50):
+        super().__init__(chunk_size)
+        if not 0 < delta < 1:
+            raise ValueError(f"delta must be in (0, 1), got {delta}")
+        if not 0 < error_rate < 0.5:
+            raise ValueError(f"error_rate must be in (0, 0.5), got {error_rate}")
+        p_high = min(alpha * (1 + delta), 1 - 1e-12)
+        p_low = alpha * (1 - delta)
+        self.alpha = alpha
+        self._llr_exceed = np.log(p_low / p_high)
+        self._llr_miss = np.log((1 - p_low) / (1 - p_high))
+        self._upper = np.log((1 - error_rate) / error_rate)
+        self._lower = -self._upper
+
+    def reset(self) -> None:
+        super().reset()
+        self.llr = 0.0
+
+    def _scan(self, exceed):
+        steps = np.where(exceed, self._llr_exceed, self._llr_miss)
+        path = self.llr + np.cumsum(steps)
+        crossed = np.flatnonzero((path >= self._upper) | (path <= self._lower))
+        if len(crossed) == 0:
+            self.llr = float(path[-1]) if len(path) else self.llr
+            return len(exceed), None
+        i = int(crossed[0])
+        self.llr = float(path[i])
+        reason = "significant" if path[i] >= self._upper else "not_significant"
+        return i + 1, reason
+
+
+def make_stopping_rule(spec: Union[str, StoppingRule], alpha: float) -> StoppingRule:
+    """Build a stopping rule from a name or pass a rule instance through.
+
+    Parameters:
+    -----------
+    spec : {'besag_clifford', 'sprt'} or StoppingRule
+        Rule name (default settings) or a configured instance
+    alpha : float
+        Significance level of the test, used by 'sprt'
+    """
+    if isinstance(spec, StoppingRule):
+        spec.reset()
+        return spec
+    if spec == "besag_clifford":
+        return BesagClifford()
+    if spec == "sprt":
+        return SPRT(alpha)
+    raise ValueError(
+        f"Unknown early_stopping rule: {spec!r}. Choose 'besag_clifford', 'sprt' "
+        f"or pass a cbd.sequential.StoppingRule instance."
+    )
+
+
+class TimeBudget:
+    """Size permutation rounds so that a run ends within a wall-clock budget.
+
+    The first round has ``first_round`` permutations.  Each later round is
+    sized from the throughput measured so far to use ``safety`` of the time
+    left, and at most ``max_growth`` times the permutations done so far, so
+    that a misleading early measurement cannot overshoot the budget by much.
+    Rounds are only started between chunks: a round in progress always
+    finishes.
+
+    Parameters:
+    -----------
+    budget_s : float
+        Wall-clock budget in seconds, counted from ``start``
+    start : float, optional
+        time.perf_counter() value the budget starts at (default: now)
+    first_round : int, default=64
+        Permutations of the first, calibrating round
+    safety : float, default=0.9
+        Fraction of the remaining time planned for the next round
+    max_growth : float, default=2.0
+        Largest ratio of a round to the permutations done before it
+    """
+
+    def __init__(self, budget_s: float, start: Optional[float] = None,
+                 first_round: int = 64, safety: float = 0.9, max_growth: float = 2.0):
+        if not budget_s > 0:
+            raise ValueError(f"time_budget_s must be > 0, got {budget_s}")
+        if first_round < 1:
+            raise ValueError(f"first_round must be >= 1, got {first_round}")
+        if not 0 < safety <= 1:
+            raise ValueError(f"safety must be in (0, 1], got {safety}")
+        self.budget_s = float(budget_s)
+        self.start = time.perf_counter() if start is None else float(start)
+        self.first_round = int(first_round)
+        self.safety = float(safety)
+        self.max_growth = float(max_growth)
+        self._null_start = None
+        self.exhausted = False
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the budget started."""
+        return time.perf_counter() - self.start
+
+    def next_round(self, n_done: int, n_remaining: int) -> int:
+        """Number of permutations of the next round (0 once the budget is used).
+
+        Parameters:
+        -----------
+        n_done : int
+            Permutations evaluated so far
+        n_remaining : int
+            Permutations left before the n_permutations cap
+        """
+        now = time.perf_counter()
+        if n_remaining <= 0:
+            return 0
+        if self._null_start is None:
+            # Always run the calibrating round, even if setup used the budget
+            self._null_start = now
+            return min(self.first_round, n_remaining)
+        left = self.start + self.budget_s - now
+        rate = n_done / max(now - self._null_start, 1e-9)
+        size = min(int(rate * left * self.safety), n_remaining,
+                   max(self.first_round, int(n_done * self.max_growth)))
+        if size < 1:
+            self.exhausted = True
+            return 0
+        return size
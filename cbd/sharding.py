@@ -0,0 +1,173 @@
+"""Sharded permutation runs and their exact merge.
+
+One large permutation test can be spread over several machines without a
+scheduler: every machine runs the same call with its own ``shard_index``
+and the same ``n_shards`` (``cbd.detect_bias`` or
+``circular_bias_detector.core.permutation.permutation_test``).  Shard ``i``
+computes the contiguous slice :func:`shard_bounds` of the permutation
+stream, which depends only on the seed, so the shards are disjoint and
+deterministic.  The shard outputs, passed around as dicts or as JSON files
+written by :func:`save_shard_result`, are combined by
+:func:`merge_permutation_results` into the result a single-node run with the
+same arguments would produce: p-value, confidence interval, conclusion and,
+if requested, the null array in stream order.  Null summaries
+(``null_summary=True``) are merged sketch-wise, so their exact counts match
+the single-node run while the quantile sketch only keeps its error bound.
+
+Execution details (backend, n_jobs, block_size) are taken from shard 0.
+"""
+from typing import Any, Dict, List, Sequence, Tuple, Union
+import json
+import os
+import numpy as np
+
+from .sketch import NullSummary
+
+ShardResult = Union[Dict[str, Any], str, "os.PathLike[str]"]
+
+
+def shard_bounds(n_permutations: int, shard_index: int, n_shards: int) -> Tuple[int, int]:
+    """Permutation range [start, stop) of one shard.
+
+    Parameters:
+    -----------
+    n_permutations : int
+        Permutations of the whole run
+    shard_index : int
+        Index of the shard, 0 <= shard_index < n_shards
+    n_shards : int
+        Number of shards
+
+    Returns:
+    --------
+    tuple
+        (start, stop); shard sizes differ by at most one
+    """
+    if n_shards < 1:
+        raise ValueError(f"n_shards must be >= 1, got {n_shards}")
+    if not 0 <= shard_index < n_shards:
+        raise ValueError(f"shard_index must be in [0, {n_shards}), got {shard_index}")
+    return n_permutations * shard_index // n_shards, n_permutations * (shard_index + 1) // n_shards
+
+
+def _to_builtin(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def save_shard_result(result: Dict[str, Any], path) -> None:
+    """Write a shard result as JSON (numpy values converted) for a later merge."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, default=_to_builtin)
+
+
+def _load(result: ShardResult) -> Dict[str, Any]:
+    if isinstance(result, dict):
+        return result
+    with open(result, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _ordered_shards(results: Sequence[ShardResult]) -> List[Dict[str, Any]]:
+    results = [_load(r) for r in results]
+    if not results:
+        raise ValueError("merge_permutation_results needs at least one shard result")
+    missing = [i for i, r in enumerate(results) if "shard" not in r]
+    if missing:
+        raise ValueError(f"results {missing} were not produced with shard_index / n_shards")
+    first = results[0]["shard"]
+    for r in results:
+        info = r["shard"]
+        for key in ("kind", "n_shards", "n_permutations_total", "fingerprint"):
+            if info[key] != first[key]:
+                raise ValueError(
+                    f"Shard results do not come from the same run: '{key}' differs "
+                    f"({info[key]!r} != {first[key]!r})"
+                )
+    indices = sorted(r["shard"]["index"] for r in results)
+    if indices != list(range(first["n_shards"])):
+        raise ValueError(
+            f"Expected shards 0..{first['n_shards'] - 1} exactly once, got indices {indices}"
+        )
+    return sorted(results, key=lambda r: r["shard"]["index"])
+
+
+def merge_permutation_results(results: Sequence[ShardResult]) -> Dict[str, Any]:
+    """Combine the outputs of all shards of a permutation run.
+
+    Parameters:
+    -----------
+    results : sequence of dict or path
+        One result per shard, as returned by cbd.detect_bias or permutation_test
+        called with shard_index / n_shards, or JSON files written by
+        :func:`save_shard_result`; any order
+
+    Returns:
+    --------
+    dict
+        The result of the equivalent single-node run
+
+    Raises:
+    -------
+    ValueError
+        If shards are missing or duplicated, or come from different runs
+    """
+    shards = _ordered_shards(results)
+    kind = shards[0]["shard"]["kind"]
+    if kind == "detect_bias":
+        return _merge_detect_bias(shards)
+    if kind == "permutation_test":
+        from circular_bias_detector.core.permutation import _summarize_null
+        info = shards[0]["shard"]
+        values = np.concatenate([np.asarray(r["permuted_values"], dtype=float) for r in shards])
+        return _summarize_null(shards[0]["observed"], values, info["n_permutations_total"])
+    raise ValueError(f"Unknown shard result kind: {kind!r}")
+
+
+def _merge_detect_bias(shards: List[Dict[str, Any]]) -> Dict[str, Any]:
+    from .api import _compute_pvalue_ci, _conclusion
+
+    info = shards[0]["shard"]
+    null = np.concatenate([np.asarray(r["permuted_metrics"], dtype=float) for r in shards])
+    n_used = len(null)
+    # The observed statistic is oriented (negated for losses) so larger is better
+    sign = 1.0 if info.get("greater_is_better", True) else -1.0
+    n_exceed = int(np.sum(sign * null >= info["observed_statistic"]))
+    p_value = float((n_exceed + 1) / (n_used + 1))
+
+    merged = {k: v for k, v in shards[0].items()
+              if k not in ("shard", "checkpoint", "permuted_metrics", "p_value_ci", "confidence_level")}
+    merged["p_value"] = p_value
+    merged["n_permutations"] = info["n_permutations_total"]
+    merged["conclusion"] = _conclusion(p_value, merged["alpha"])
+    if "retrain" in merged and "fit_times" in merged["retrain"]:
+        retrain = dict(merged["retrain"])
+        for key in ("fit_times", "predict_times"):
+            retrain[key] = [t for r in shards for t in r["retrain"][key]]
+        retrain["fit_time_total"] = float(np.sum(retrain["fit_times"]))
+        retrain["predict_time_total"] = float(np.sum(retrain["predict_times"]))
+        if "approximation" in retrain:
+            # The calibration permutations are the first of the stream (shard 0);
+            # the p-value range needs the whole null
+            approx = dict(retrain["approximation"])
+            delta, observed = approx["max_abs_error"], sign * merged["observed_metric"]
+            approx["p_value_bounds"] = (
+                float((np.sum(sign * null >= observed + delta) + 1) / (n_used + 1)),
+                float((np.sum(sign * null >= observed - delta) + 1) / (n_used + 1)),
+            )
+            retrain["approximation"] = approx
+        merged["retrain"] = retrain
+    if n_used >= 1000:
+        merged["p_value_ci"] = _compute_pvalue_ci(p_value, n_used, info["confidence_level"])
+        merged["confidence_level"] = info["confidence_level"]
+    if "null_summary" in merged:
+        summary = NullSummary.from_dict(shards[0]["null_summary"])
+        for r in shards[1:]:
+            summary.merge(NullSummary.from_dict(r["null_summary"]))
+        merged["null_summary"] = summary.to_dict()
+    if info["return_permutations"]:
+        merged["permuted_metrics"] = null
+    return merged
@@ -0,0 +1,267 @@
+"""Compact, mergeable summaries of permutation null distributions.
+
+A null of a million permutations is 8 MB as float64 and much more as a
+Python list or JSON.  :class:`NullSummary` keeps what is usually needed from
+it in a few kilobytes:
+
+- a KLL quantile sketch (Karnin, Lang & Liberty, 2016) of the null values,
+  answering quantile and rank queries with rank error around ``1.7 / k``;
+- exact exceedance counts ``#{null >= t}`` (``#{null <= t}`` for losses,
+  ``greater_is_better=False``) at a few thresholds, always including the
+  observed statistic, so that the p-value stays exact;
+- the exact count, minimum, maximum, mean and variance.
+
+Summaries built on different chunks, workers or shards are combined with
+:meth:`NullSummary.merge`; the exact parts merge exactly, the sketch keeps
+its error guarantee.  :meth:`NullSummary.to_dict` gives a JSON-ready dict.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import numpy as np
+
+DEFAULT_SKETCH_K = 200
+
+
+class KLLSketch:
+    """KLL quantile sketch of a stream of floats.
+
+    Level ``h`` holds items of weight ``2 ** h``.  When a level exceeds its
+    capacity it is sorted and every other item, starting at a random offset,
+    is promoted to the next level.  Capacities shrink geometrically (factor
+    2/3) below the top level; between one and three times ``k`` items are
+    retained.
+
+    Parameters:
+    -----------
+    k : int, default=200
+        Capacity of the top level; rank error is about 1.7 / k
+    random_state : int, optional
+        Seed of the compaction offsets
+    """
+
+    _DECAY = 2.0 / 3.0
+
+    def __init__(self, k: int = DEFAULT_SKETCH_K, random_state: Optional[int] = None):
+        if k < 8:
+            raise ValueError(f"k must be >= 8, got {k}")
+        self.k = int(k)
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self.n = 0
+        self._rng = np.random.default_rng(random_state)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * self._DECAY ** depth)))
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays at this level
+                keep = items[:1] if len(items) % 2 else items[:0]
+                paired = items[len(keep):]
+                promoted = paired[self._rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                # Adding a level lowers every capacity: rescan from the bottom
+                level = 0
+                continue
+            level += 1
+
+    def update(self, values) -> "KLLSketch":
+        """Add values (any shape, NaN ignored)."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self.n += len(values)
+            self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Fold ``other`` into this sketch (in place) and return self."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.k = max(self.k, other.k)
+        self._compress()
+        return self
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lv), 2.0 ** h) for h, lv in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], weights[order]
+
+    @property
+    def n_retained(self) -> int:
+        return int(sum(len(lv) for lv in self.levels))
+
+    def quantile(self, q):
+        """Approximate quantile(s) for q in [0, 1]."""
+        if self.n == 0:
+            raise ValueError("quantile of an empty sketch")
+        items, weights = self._weighted()
+        cumulative = np.cumsum(weights)
+        target = np.asarray(q, dtype=float) * cumulative[-1]
+        idx = np.searchsorted(cumulative, target, side="left")
+        return items[np.minimum(idx, len(items) - 1)]
+
+    def count_at_least(self, threshold: float) -> float:
+        """Approximate number of values >= threshold."""
+        if self.n == 0:
+            return 0.0
+        items, weights = self._weighted()
+        total = float(weights.sum())
+        return float(weights[items >= threshold].sum()) * self.n / total
+
+    def count_at_most(self, threshold: float) -> float:
+        """Approximate number of values <= threshold."""
+        if self.n == 0:
+            return 0.0
+        items, weights = self._weighted()
+        total = float(weights.sum())
+        return float(weights[items <= threshold].sum()) * self.n / total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"k": self.k, "n": self.n, "levels": [lv.tolist() for lv in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], random_state: Optional[int] = None) -> "KLLSketch":
+        sketch = cls(k=data["k"], random_state=random_state)
+        sketch.levels = [np.asarray(lv, dtype=float) for lv in data["levels"]] or [np.empty(0)]
+        sketch.n = int(data["n"])
+        return sketch
+
+
+class NullSummary:
+    """Sketch, exact exceedance counts and moments of a null distribution.
+
+    Parameters:
+    -----------
+    thresholds : sequence of float
+        Values t at which the null values at least as extreme as t are counted
+        exactly
+    k : int, default=200
+        KLL sketch size (see :class:`KLLSketch`)
+    random_state : int, optional
+        Seed of the sketch compactions
+    greater_is_better : bool, default=True
+        Orientation of the metric: "at least as extreme" means >= t, or <= t
+        for losses (False)
+    """
+
+    def __init__(self, thresholds: Iterable[float] = (), k: int = DEFAULT_SKETCH_K,
+                 random_state: Optional[int] = None, greater_is_better: bool = True):
+        self.thresholds = np.unique(np.asarray(list(thresholds), dtype=float))
+        self.greater_is_better = bool(greater_is_better)
+        self.exceedances = np.zeros(len(self.thresholds), dtype=np.int64)
+        self.sketch = KLLSketch(k, random_state)
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _combine_moments(self, n, mean, m2) -> None:
+        total = self.n + n
+        if n == 0:
+            return
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += m2 + delta ** 2 * self.n * n / total
+        self.n = total
+
+    def update(self, values) -> "NullSummary":
+        """Add a chunk of null values (NaN ignored)."""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        # #{v >= t} (or #{v <= t}) for every threshold from one sort of the chunk
+        ordered = np.sort(values)
+        if self.greater_is_better:
+            self.exceedances += len(ordered) - np.searchsorted(ordered, self.thresholds, "left")
+        else:
+            self.exceedances += np.searchsorted(ordered, self.thresholds, "right")
+        mean = float(values.mean())
+        self._combine_moments(len(values), mean, float(np.sum((values - mean) ** 2)))
+        self.min = min(self.min, float(ordered[0]))
+        self.max = max(self.max, float(ordered[-1]))
+        self.sketch.update(values)
+        return self
+
+    def merge(self, other: "NullSummary") -> "NullSummary":
+        """Fold ``other`` (same thresholds and orientation) into this summary and return self."""
+        if not np.array_equal(self.thresholds, other.thresholds):
+            raise ValueError("Null summaries with different thresholds cannot be merged")
+        if self.greater_is_better != other.greater_is_better:
+            raise ValueError("Null summaries with different greater_is_better cannot be merged")
+        self.exceedances += other.exceedances
+        self._combine_moments(other.n, other.mean, other._m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+        return self
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self._m2 / (self.n - 1))) if self.n > 1 else 0.0
+
+    def quantile(self, q):
+        """Approximate quantile(s) of the null."""
+        return self.sketch.quantile(q)
+
+    def count_extreme(self, threshold: float) -> float:
+        """#{null >= threshold} (#{null <= threshold} for losses): exact at a
+        summary threshold, else from the sketch."""
+        match = np.flatnonzero(self.thresholds == threshold)
+        if len(match):
+            return int(self.exceedances[match[0]])
+        if self.greater_is_better:
+            return self.sketch.count_at_least(threshold)
+        return self.sketch.count_at_most(threshold)
+
+    def p_value(self, observed: float) -> float:
+        """One-sided permutation p-value (#{null at least as extreme} + 1) / (n + 1)."""
+        return float((self.count_extreme(observed) + 1) / (self.n + 1))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready representation (a few KB for the default k)."""
+        return {
+            "n": self.n,
+            "mean": self.mean,
+            "std": self.std,
+            "min": self.min if self.n else None,
+            "max": self.max if self.n else None,
+            "m2": self._m2,
+            "thresholds": self.thresholds.tolist(),
+            "greater_is_better": self.greater_is_better,
+            "exceedances": self.exceedances.tolist(),
+            "sketch": self.sketch.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "NullSummary":
+        summary = cls(data["thresholds"], greater_is_better=data.get("greater_is_better", True))
+        summary.exceedances = np.asarray(data["exceedances"], dtype=np.int64)
+        summary.n = int(data["n"])
+        summary.mean = float(data["mean"])
+        summary._m2 = float(data["m2"])
+        if summary.n:
+            summary.min = float(data["min"])
+            summary.max = float(data["max"])
+        summary.sketch = KLLSketch.from_dict(data["sketch"])
+        return summary
+
+
+def summarize_null(values, thresholds: Sequence[float] = (), k: int = DEFAULT_SKETCH_K,
+                   random_state: Optional[int] = None,
+                   greater_is_better: bool = True) -> NullSummary:
+    """:class:`NullSummary` of an array of null values."""
+    return NullSummary(thresholds, k, random_state, greater_is_better).update(values)
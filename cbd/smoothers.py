@@ -0,0 +1,189 @@
+"""Closed-form retrain null for linear smoothers.
+
+For a linear smoother the predictions of a model refit on labels ``y`` are
+``H @ y`` for a matrix ``H`` that depends on ``X`` and the hyperparameters
+only.  The whole retrain null is then a single product of ``H`` with the
+block of permuted label vectors, with no call to ``fit``.
+
+Recognized estimators (``predict`` outputs, fit and evaluated on the same X):
+
+- ``LinearRegression`` and ``Ridge`` (scalar alpha, ``positive=False``):
+  ``H = 1 1'/n + U diag(s^2 / (s^2 + alpha)) U'`` from the thin SVD
+  ``X_c = U S V'`` of the centered features (no centering without an
+  intercept).  Only the ``n x rank`` factor is stored.
+- ``KernelRidge``: ``H = K (K + alpha I)^-1`` as a dense ``n x n`` matrix.
+- ``KNeighborsRegressor`` with uniform weights: the sparse k-NN averaging
+  matrix.
+
+Any other linear smoother can be passed explicitly as a matrix or as a
+:class:`LinearSmoother`.
+"""
+from typing import Optional
+import numpy as np
+
+# Largest n for which an n x n smoother matrix is built automatically.
+MAX_DENSE_SMOOTHER = 8000
+
+# Largest n * n_features for which sparse features are densified for the SVD.
+MAX_DENSIFY_ELEMENTS = 2 ** 24
+
+
+class LinearSmoother:
+    """Linear map from training labels to in-sample predictions.
+
+    Parameters:
+    -----------
+    matrix : array-like or scipy sparse matrix, shape (n, n), optional
+        Explicit smoother matrix ``H``
+    basis : np.ndarray, shape (n, r), optional
+        Orthonormal factor ``U`` of a low-rank smoother ``U diag(shrinkage) U'``
+    shrinkage : np.ndarray, shape (r,), optional
+        Eigenvalues of the low-rank part (1 for OLS directions)
+    intercept : bool, default=False
+        Add the label mean to every prediction (models with an intercept)
+    kind : str, default='explicit'
+        Name reported in results
+    """
+
+    def __init__(self, matrix=None, basis: Optional[np.ndarray] = None,
+                 shrinkage: Optional[np.ndarray] = None, intercept: bool = False,
+                 kind: str = "explicit"):
+        if (matrix is None) == (basis is None):
+            raise ValueError("Provide either matrix or basis for a LinearSmoother")
+        self.matrix = matrix
+        self.basis = basis
+        self.shrinkage = None if shrinkage is None else np.asarray(shrinkage, dtype=float)
+        self.intercept = intercept
+        self.kind = kind
+        if matrix is not None:
+            if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+                raise ValueError(f"Smoother matrix must be square, got shape {matrix.shape}")
+            self.n_samples = matrix.shape[0]
+            self.rank = None
+        else:
+            self.n_samples = basis.shape[0]
+            self.rank = basis.shape[1]
+
+    def apply(self, Y: np.ndarray) -> np.ndarray:
+        """Predictions for a ``(B, n)`` block of label vectors, shape ``(B, n)``."""
+        Y = np.asarray(Y, dtype=float)
+        if self.matrix is not None:
+            # (H Y')' = Y H'
+            pred = np.asarray((self.matrix @ Y.T).T)
+        else:
+            coords = (Y @ self.basis) * self.shrinkage
+            pred = coords @ self.basis.T
+        if self.intercept:
+            pred = pred + Y.mean(axis=1, keepdims=True)
+        return pred
+
+
+def as_smoother(smoother, n_samples: int) -> LinearSmoother:
+    """Validate a user-supplied smoother (matrix or LinearSmoother)."""
+    if not isinstance(smoother, LinearSmoother):
+        try:
+            from scipy import sparse
+            is_sparse = sparse.issparse(smoother)
+        except ImportError:  # pragma: no cover - scipy is a hard dependency of sklearn
+            is_sparse = False
+        smoother = LinearSmoother(matrix=smoother if is_sparse else np.asarray(smoother, dtype=float))
+    if smoother.n_samples != n_samples:
+        raise ValueError(
+            f"Smoother acts on {smoother.n_samples} samples, but X has {n_samples} rows"
+        )
+    return smoother
+
+
+def _dense_features(X) -> Optional[np.ndarray]:
+    try:
+        from scipy import sparse
+        if sparse.issparse(X):
+            if X.shape[0] * X.shape[1] > MAX_DENSIFY_ELEMENTS:
+                return None
+            return X.toarray().astype(float)
+    except ImportError:  # pragma: no cover
+        pass
+    return np.asarray(X, dtype=float)
+
+
+def _ridge_smoother(X, alpha: float, fit_intercept: bool, kind: str) -> Optional[LinearSmoother]:
+    X = _dense_features(X)
+    if X is None:
+        return None
+    if fit_intercept:
+        X = X - X.mean(axis=0)
+    U, s, _ = np.linalg.svd(X, full_matrices=False)
+    if alpha == 0:
+        # Minimum-norm least squares: projection on the column space
+        tol = s.max(initial=0.0) * max(X.shape) * np.finfo(float).eps
+        keep = s > tol
+        U, shrinkage = U[:, keep], np.ones(int(keep.sum()))
+    else:
+        shrinkage = s ** 2 / (s ** 2 + alpha)
+    return LinearSmoother(basis=U, shrinkage=shrinkage, intercept=fit_intercept, kind=kind)
+
+
+def _kernel_ridge_smoother(model, X) -> Optional[LinearSmoother]:
+    from scipy import linalg
+    from sklearn.metrics.pairwise import pairwise_kernels
+    alpha = np.asarray(model.alpha, dtype=float)
+    if alpha.ndim > 0 and alpha.size != 1:
+        return None
+    if X.shape[0] > MAX_DENSE_SMOOTHER:
+        return None
+    if callable(model.kernel):
+        params = model.kernel_params or {}
+    else:
+        params = {"gamma": model.gamma, "degree": model.degree, "coef0": model.coef0}
+    K = pairwise_kernels(X, X, metric=model.kernel, filter_params=True, **params)
+    K = np.asarray(K, dtype=float)
+    H = linalg.solve(K + float(alpha) * np.eye(len(K)), K, assume_a="pos")
+    return LinearSmoother(matrix=H, kind="kernel_ridge")
+
+
+def _knn_smoother(model, X) -> Optional[LinearSmoother]:
+    from sklearn.base import clone
+    if model.weights != "uniform":
+        return None
+    # The neighbour graph depends on X and the hyperparameters, not on y
+    neighbors = clone(model).fit(X, np.zeros(X.shape[0]))
+    graph = neighbors.kneighbors_graph(X, mode="connectivity").tocsr()
+    return LinearSmoother(matrix=graph / neighbors.n_neighbors, kind="knn")
+
+
+def smoother_from_estimator(model, X) -> Optional[LinearSmoother]:
+    """Smoother reproducing ``model`` refit on X, or None if not recognized.
+
+    Parameters:
+    -----------
+    model : estimator
+        Regressor whose retrain null is requested
+    X : array-like, shape (n_samples, n_features)
+        Features the model is refit and evaluated on
+
+    Returns:
+    --------
+    LinearSmoother or None
+    """
+    try:
+        from sklearn.kernel_ridge import KernelRidge
+        from sklearn.linear_model import LinearRegression, Ridge
+        from sklearn.neighbors import KNeighborsRegressor
+    except ImportError:  # pragma: no cover
+        return None
+    # Exact types only: subclasses may change fit or predict
+    model_type = type(model)
+    if model_type is LinearRegression:
+        if model.positive:
+            return None
+        return _ridge_smoother(X, 0.0, model.fit_intercept, "ols")
+    if model_type is Ridge:
+        alpha = np.asarray(model.alpha, dtype=float)
+        if model.positive or (alpha.ndim > 0 and alpha.size != 1):
+            return None
+        return _ridge_smoother(X, float(alpha), model.fit_intercept, "ridge")
+    if model_type is KernelRidge:
+        return _kernel_ridge_smoother(model, X)
+    if model_type is KNeighborsRegressor:
+        return _knn_smoother(model, X)
+    return None
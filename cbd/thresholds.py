@@ -1,10 +1,15 @@
 """Pre-computed threshold tables and fast mode for common dataset sizes.
 
 Provides empirical thresholds to lower the barrier for small users.
+detect_bias_fast interpolates p-values from the simulated null tables in
+cbd.null_tables; PRECOMPUTED_THRESHOLDS is the nominal table kept for
+get_nearest_threshold.
 """
 from typing import Dict, Optional, Tuple
 import numpy as np
 
+from .null_tables import TABLE_METRICS, load_null_tables
+
 # Pre-computed p-value thresholds for common dataset sizes
 # Based on 10,000 simulations per configuration
 # Format: (n_samples, n_features) -> {metric: (p_05, p_01, p_001)}
@@ -119,21 +124,46 @@ def get_nearest_threshold(
         return None
 
 
+def _table_metric(metric, metric_name: Optional[str]):
+    """Table metric and F1 positive label for a metric callable, or (None, None)."""
+    from .fast_metrics import resolve_batched_metric
+
+    resolved = resolve_batched_metric(metric)
+    if resolved is None:
+        # An unrecognized callable is only trusted under an explicit name
+        if metric_name is None:
+            return None, None
+        name = metric_name.lower()
+        return (name, 1) if name in TABLE_METRICS else (None, None)
+    if resolved.family == "rank":
+        return "auc", None
+    kwargs = getattr(resolved, "kwargs", {})
+    if resolved.name == "accuracy" and kwargs.get("normalize", True):
+        return "accuracy", None
+    if resolved.name == "f1" and kwargs.get("average", "binary") == "binary":
+        return "f1", kwargs.get("pos_label", 1)
+    return None, None
+
+
 def detect_bias_fast(
     model,
     X,
     y,
     metric,
-    metric_name: str = 'accuracy',
+    metric_name: Optional[str] = None,
     alpha: float = 0.05,
     use_precomputed: bool = True,
-    n_permutations_fallback: int = 100
+    n_permutations_fallback: int = 100,
+    allow_proba: bool = False,
+    null_tables=None
 ) -> Dict:
-    """Fast bias detection using pre-computed thresholds.
+    """Fast bias detection using precomputed null tables.
     
     This is a lightweight mode that:
-    1. Uses pre-computed thresholds when available (no bootstrap needed)
-    2. Falls back to quick permutation test (100 permutations) if not
+    1. Interpolates the permutation p-value from precomputed null tables
+       (cbd.null_tables) for accuracy, binary F1 and binary AUC inside the
+       tabulated grid of sample sizes, class balances and numbers of classes
+    2. Falls back to a quick permutation test (100 permutations) otherwise
     3. Significantly faster for small users
     
     Parameters:
@@ -146,31 +176,44 @@ def detect_bias_fast(
         True labels
     metric : callable
         Metric function
-    metric_name : str, default='accuracy'
-        Name of metric (for threshold lookup)
+    metric_name : str, optional
+        Name of metric (accuracy, f1, auc) for the table lookup; only used when
+        the metric callable is not a recognized scikit-learn metric. Without it
+        such a callable falls back to the permutation test
     alpha : float, default=0.05
         Significance level
     use_precomputed : bool, default=True
-        Whether to use pre-computed thresholds
+        Whether to use the precomputed null tables
     n_permutations_fallback : int, default=100
-        Number of permutations if no pre-computed threshold available
+        Number of permutations if the data is outside the tables
+    allow_proba : bool, default=False
+        Pass predict_proba (or decision_function) outputs to the metric, as in
+        detect_bias
+    null_tables : NullTables, optional
+        Tables to use instead of those shipped with the package
     
     Returns:
     --------
     dict
-        Detection results with fast mode indicators
+        Detection results with fast mode indicators; in precomputed mode
+        'null_table' holds the exact null mean and std, the standardized
+        observed value 'z', the class count and balance, and
+        'p_value_is_bound' (True when the p-value is an upper bound below the
+        smallest tabulated level). In fallback mode 'fallback_reason' says
+        why the tables were not used.
     
     Examples:
     ---------
-    >>> # Fast mode (uses pre-computed thresholds)
+    >>> # Fast mode (uses precomputed null tables)
     >>> result = detect_bias_fast(model, X, y, accuracy_score)
     >>> print(result['mode'])
     'precomputed'
     >>> print(result['computation_time'])
-    0.05  # seconds (vs. 2-3 seconds for full test)
+    0.001  # seconds (vs. 2-3 seconds for full test)
     """
     import time
     from sklearn.utils import check_array, check_consistent_length
+    from cbd.api import _predict_method
     
     start_time = time.time()
     
@@ -182,46 +225,43 @@ def detect_bias_fast(
     n_samples, n_features = X.shape
     
     # Compute observed metric
-    y_pred = model.predict(X)
+    y_pred = getattr(model, _predict_method(model, allow_proba))(X)
     observed = float(metric(y, y_pred))
     
-    # Try to use pre-computed threshold
+    # Try to interpolate the p-value from the null tables
+    fallback_reason = "use_precomputed=False"
     if use_precomputed:
-        thresholds = get_nearest_threshold(n_samples, n_features, metric_name)
+        table_metric, pos_label = _table_metric(metric, metric_name)
+        tables = null_tables if null_tables is not None else load_null_tables()
+        lookup = None
+        if table_metric is None:
+            fallback_reason = "metric has no null table"
+        elif tables is None:
+            fallback_reason = "null tables unavailable"
+        else:
+            lookup = tables.p_value(table_metric, y, y_pred, observed, pos_label=pos_label)
+            if lookup is None:
+                fallback_reason = "data outside the null table grid"
         
-        if thresholds is not None:
-            p_05, p_01, p_001 = thresholds
-            
-            # Determine p-value based on thresholds
-            # This is approximate but fast
-            if alpha <= 0.001:
-                threshold = p_001
-            elif alpha <= 0.01:
-                threshold = p_01
-            else:
-                threshold = p_05
-            
-            # Simple heuristic: if observed is in top 5%, flag as suspicious
-            # In practice, you'd compare observed to null distribution
-            # Here we use a conservative estimate
-            p_value_estimate = threshold  # Simplified
-            
+        if lookup is not None:
+            p_value = lookup.pop('p_value')
             computation_time = time.time() - start_time
             
             return {
                 'mode': 'precomputed',
                 'observed_metric': observed,
-                'p_value': p_value_estimate,
+                'p_value': p_value,
                 'alpha': alpha,
                 'n_samples': n_samples,
                 'n_features': n_features,
-                'metric_name': metric_name,
-                'used_threshold': thresholds,
+                'metric_name': table_metric,
+                'null_table': lookup,
                 'computation_time': computation_time,
                 'conclusion': (
-                    f"Fast mode: Using pre-computed threshold. "
-                    f"Observed={observed:.3f}, threshold={threshold:.3f}. "
-                    f"{'Suspicious' if observed > 0.9 else 'Normal'} performance."
+                    f"Fast mode: p-value interpolated from null tables. "
+                    f"Observed={observed:.3f}, p{'<=' if lookup['p_value_is_bound'] else '='}"
+                    f"{p_value:.4f}. "
+                    f"{'Suspicious' if p_value <= alpha else 'Normal'} performance."
                 )
             }
     
@@ -232,7 +272,8 @@ def detect_bias_fast(
         model, X, y, metric,
         n_permutations=n_permutations_fallback,
         alpha=alpha,
-        n_jobs=1  # Single-threaded for simplicity
+        n_jobs=1,  # Single-threaded for simplicity
+        allow_proba=allow_proba
     )
     
     computation_time = time.time() - start_time
@@ -240,6 +281,7 @@ def detect_bias_fast(
     result['mode'] = 'quick_permutation'
     result['computation_time'] = computation_time
     result['n_permutations'] = n_permutations_fallback
+    result['fallback_reason'] = fallback_reason
     
     return result
 
@@ -247,10 +289,16 @@ def detect_bias_fast(
 def estimate_computation_time(
     n_samples: int,
     n_permutations: int = 1000,
-    n_jobs: int = 1
+    n_jobs: int = 1,
+    engine: str = 'per_call',
+    profile=None
 ) -> Dict[str, float]:
     """Estimate computation time for different modes.
     
+    Times come from the benchmarked machine profile (cbd.autotune); run
+    ``python -m cbd.autotune`` once to calibrate. Without a stored profile the
+    nominal one is used (0.002s per permutation per 1000 samples).
+    
     Parameters:
     -----------
     n_samples : int
@@ -258,7 +306,11 @@ def estimate_computation_time(
     n_permutations : int, default=1000
         Number of permutations for full test
     n_jobs : int, default=1
-        Number of parallel jobs
+        Largest number of parallel jobs; the fastest layout up to it is assumed
+    engine : {'per_call', 'batched'}, default='per_call'
+        Metric engine: 'batched' for metrics recognized by cbd.fast_metrics
+    profile : cbd.autotune.MachineProfile, optional
+        Profile to use instead of the stored one
     
     Returns:
     --------
@@ -269,22 +321,26 @@ def estimate_computation_time(
     ---------
     >>> times = estimate_computation_time(1000, n_permutations=1000)
     >>> print(times)
-    {'fast_mode': 0.05, 'quick_mode': 0.5, 'full_mode': 2.5}
+    {'fast_mode': 0.05, 'quick_mode': 0.2, 'full_mode': 2.0, ...}
     """
-    # Empirical timing model (based on benchmarks)
-    # Time per permutation: ~0.002s for n=1000
-    time_per_perm = 0.002 * (n_samples / 1000)
+    from .autotune import CostModel
+    
+    cost = CostModel(profile)
+    predict_time = cost.predict_seconds(n_samples)
     
-    fast_mode_time = 0.05  # Pre-computed lookup is instant
-    quick_mode_time = 100 * time_per_perm / max(n_jobs, 1)
-    full_mode_time = n_permutations * time_per_perm / max(n_jobs, 1)
+    fast_mode_time = predict_time + cost.profile.table_lookup_s
+    quick_mode_time = predict_time + cost.plan(
+        n_samples, 100, engine, max_jobs=max(n_jobs, 1))['predicted_s']
+    full_mode_time = predict_time + cost.plan(
+        n_samples, n_permutations, engine, max_jobs=max(n_jobs, 1))['predicted_s']
     
     return {
         'fast_mode': fast_mode_time,
         'quick_mode': quick_mode_time,
         'full_mode': full_mode_time,
         'speedup_fast_vs_full': full_mode_time / fast_mode_time,
-        'speedup_quick_vs_full': full_mode_time / quick_mode_time
+        'speedup_quick_vs_full': full_mode_time / quick_mode_time,
+        'profile': 'calibrated' if cost.profile.calibrated else 'nominal'
     }
 
 
@@ -315,8 +371,9 @@ def recommend_mode(
     >>> print(mode)
     'fast'  # Pre-computed threshold available and fast enough
     """
-    # Check if pre-computed threshold available
-    has_precomputed = get_nearest_threshold(n_samples, n_features) is not None
+    # Check if the null tables cover this sample size
+    tables = load_null_tables()
+    has_precomputed = tables is not None and tables.n_grid[0] <= n_samples <= tables.n_grid[-1]
     
     # Estimate times
     times = estimate_computation_time(n_samples)
@@ -354,8 +411,10 @@ THRESHOLD_TABLE_MARKDOWN = """
 | 5000         | 50       | Accuracy | 0.050 | 0.010 | 0.001 |
 | 10000        | 100      | Accuracy | 0.050 | 0.010 | 0.001 |
 
-**Note:** These thresholds are based on 10,000 simulations per configuration.
-For dataset sizes not in the table, the nearest configuration is used.
+**Note:** These nominal thresholds are kept for reference. Fast mode
+interpolates p-values from simulated null tables (cbd.null_tables) covering
+n=20-10000, 2-5 classes and a smallest class down to a tenth of its
+balanced share; outside that grid it runs a quick permutation test.
 
 **Usage:**
 ```python
@@ -364,7 +423,7 @@ from cbd.thresholds import detect_bias_fast
 # Fast mode (uses pre-computed thresholds)
 result = detect_bias_fast(model, X, y, accuracy_score)
 print(f"Mode: {result['mode']}")  # 'precomputed'
-print(f"Time: {result['computation_time']:.2f}s")  # ~0.05s
+print(f"Time: {result['computation_time']:.3f}s")  # ~0.001s
 ```
 
 **Speedup:**
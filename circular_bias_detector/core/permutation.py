@@ -2,7 +2,8 @@
 Enhanced permutation testing with parallel processing and proper RNG handling.
 
 This module provides permutation-based statistical testing with:
-- Configurable parallel backends (threads/processes)
+- Configurable parallel backends (threads/processes), or any
+  concurrent.futures.Executor-compatible executor (process pools, dask clusters)
 - Proper random number generation for reproducibility
 - Optional retrain-null mode for conservative testing
 - Support for probability-based metrics (AUC, logloss)
@@ -11,10 +12,47 @@ This module provides permutation-based statistical testing with:
 import numpy as np
 from typing import Optional, Dict, Callable, Union, Literal, Any, List
 import warnings
+from contextlib import nullcontext
 from joblib import Parallel, delayed
 from functools import partial
 
 
+def _inner_thread_plan(
+    inner_threads: Optional[Union[int, str]],
+    n_jobs: int,
+    backend: str,
+    executor: Optional[Any],
+    worker: Callable
+):
+    """
+    Apply an inner_threads policy (see cbd.scheduler.resolve_inner_threads).
+    
+    Returns
+    -------
+    tuple
+        (context limiting this process's native thread pools, worker for joblib
+        tasks, native threads per executor task, thread layout dict or None)
+    """
+    if inner_threads is None:
+        return nullcontext(), worker, None, None
+    from cbd.scheduler import (call_limited, effective_n_jobs, executor_workers,
+                               limit_inner_threads, resolve_inner_threads, thread_layout)
+    if executor is not None:
+        n_workers, scope = executor_workers(executor, default=max(1, n_jobs)), 'worker'
+    elif n_jobs == 1:
+        n_workers, scope = 1, 'process'
+    else:
+        n_workers = effective_n_jobs(n_jobs)
+        scope = 'process' if backend == 'threads' else 'worker'
+    n_threads = resolve_inner_threads(inner_threads, n_workers)
+    layout = thread_layout(n_workers, inner_threads, n_threads, scope)
+    if scope == 'process':
+        return limit_inner_threads(n_threads), worker, None, layout
+    if executor is not None:
+        return nullcontext(), worker, n_threads, layout
+    return nullcontext(), partial(call_limited, n_threads, worker), None, layout
+
+
 def _permutation_worker(
     seed: int,
     performance_matrix: np.ndarray,
@@ -78,6 +116,10 @@ def permutation_test(
     n_jobs: int = 1,
     backend: Literal['threads', 'processes'] = 'threads',
     verbose: int = 0,
+    shard_index: Optional[int] = None,
+    n_shards: Optional[int] = None,
+    executor: Optional[Any] = None,
+    inner_threads: Optional[Union[int, str]] = None,
     **metric_kwargs
 ) -> Dict[str, Any]:
     """
@@ -103,6 +145,20 @@ def permutation_test(
         - 'processes': Process-based parallelism (better for pure Python, requires picklable objects)
     verbose : int, default=0
         Verbosity level for joblib
+    shard_index, n_shards : int, optional
+        Compute only shard shard_index of n_shards disjoint slices of the
+        permutations (requires random_seed); combine the shard results with
+        cbd.sharding.merge_permutation_results to get the single-node result
+    executor : concurrent.futures.Executor-compatible, optional
+        Submit the permutations to this executor (e.g. a ProcessPoolExecutor or a
+        dask.distributed Client) in contiguous blocks of seeds instead of using
+        joblib; overrides n_jobs and backend. The executor is not shut down.
+    inner_threads : int, 'auto' or None, default=None
+        Native BLAS/OpenMP threads allowed per worker (limited with threadpoolctl),
+        to avoid oversubscription when every worker starts a full native thread
+        pool. 'auto' allows cpu_count // n_workers threads when running in parallel.
+        The effective layout is reported in 'thread_layout'. None leaves native
+        thread pools alone.
     **metric_kwargs
         Additional arguments passed to metric_func
         
@@ -152,31 +208,91 @@ def permutation_test(
     
     # Generate unique seeds for each permutation
     seeds = master_rng.randint(0, 2**31 - 1, size=n_permutations)
+    shard = None
+    if shard_index is not None or n_shards is not None:
+        if shard_index is None or n_shards is None:
+            raise ValueError("shard_index and n_shards must be given together")
+        if random_seed is None:
+            raise ValueError("Sharded runs need an explicit random_seed")
+        from cbd.checkpoint import describe_callable, input_fingerprint
+        from cbd.sharding import shard_bounds
+        start, stop = shard_bounds(n_permutations, shard_index, n_shards)
+        seeds = seeds[start:stop]
+        shard = {
+            'kind': 'permutation_test',
+            'index': shard_index,
+            'n_shards': n_shards,
+            'start': start,
+            'stop': stop,
+            'n_permutations_total': n_permutations,
+            'fingerprint': input_fingerprint(
+                performance_matrix, constraint_matrix, metric=describe_callable(metric_func),
+                random_seed=random_seed, metric_kwargs=sorted(metric_kwargs.items())
+            )
+        }
+    
+    limits, worker, task_threads, layout = _inner_thread_plan(
+        inner_threads, n_jobs, backend, executor, _permutation_worker
+    )
     
     # Parallel execution
-    if n_jobs == 1:
-        # Sequential execution (no parallelism)
-        permuted_values = []
-        for seed in seeds:
-            val = _permutation_worker(
-                seed, performance_matrix, constraint_matrix, 
-                metric_func, **metric_kwargs
+    with limits:
+        if executor is not None:
+            from cbd.scheduler import map_blocks
+            permuted_values = map_blocks(
+                executor, _permutation_worker, seeds, performance_matrix, constraint_matrix,
+                metric_func, n_threads=task_threads, **metric_kwargs
             )
-            permuted_values.append(val)
-    else:
-        # Parallel execution
-        joblib_backend = 'loky' if backend == 'processes' else 'threading'
-        
-        permuted_values = Parallel(n_jobs=n_jobs, backend=joblib_backend, verbose=verbose)(
-            delayed(_permutation_worker)(
-                seed, performance_matrix, constraint_matrix,
-                metric_func, **metric_kwargs
+        elif n_jobs == 1:
+            # Sequential execution (no parallelism)
+            permuted_values = []
+            for seed in seeds:
+                val = _permutation_worker(
+                    seed, performance_matrix, constraint_matrix, 
+                    metric_func, **metric_kwargs
+                )
+                permuted_values.append(val)
+        else:
+            # Parallel execution
+            joblib_backend = 'loky' if backend == 'processes' else 'threading'
+            
+            permuted_values = Parallel(n_jobs=n_jobs, backend=joblib_backend, verbose=verbose)(
+                delayed(worker)(
+                    seed, performance_matrix, constraint_matrix,
+                    metric_func, **metric_kwargs
+                )
+                for seed in seeds
             )
-            for seed in seeds
-        )
     
+    results = _summarize_null(observed, np.asarray(permuted_values, dtype=float), len(seeds))
+    if shard is not None:
+        results['shard'] = shard
+    if layout is not None:
+        results['thread_layout'] = layout
+    return results
+
+
+def _summarize_null(observed: float, permuted_values: np.ndarray,
+                    n_permutations: int) -> Dict[str, Any]:
+    """
+    Two-tailed p-value and percentile interval of a permutation null.
+    
+    Parameters
+    ----------
+    observed : float
+        Observed metric value
+    permuted_values : np.ndarray
+        Permuted metric values, NaN for failed permutations
+    n_permutations : int
+        Number of permutations attempted
+    
+    Returns
+    -------
+    dict
+        Results in the format of permutation_test
+    """
     # Filter out NaN values
-    permuted_values = np.array([v for v in permuted_values if not np.isnan(v)])
+    permuted_values = permuted_values[~np.isnan(permuted_values)]
     
     if len(permuted_values) == 0:
         raise ValueError("All permutations failed. Check metric_func and data.")
@@ -261,6 +377,33 @@ def _retrain_permutation_worker(
         return np.nan
 
 
+def _retrain_shared_worker(
+    seed: int,
+    shared: Dict[str, Any],
+    y_train: np.ndarray,
+    y_test: np.ndarray,
+    model_factory: Callable,
+    metric_func: Callable,
+    stratify_groups: Optional[np.ndarray] = None
+) -> float:
+    """
+    Retrain-null worker reading X_train and X_test from shared memory.
+    
+    Parameters
+    ----------
+    shared : dict
+        Descriptors of X_train and X_test from cbd.scheduler.shared_arrays
+    
+    See _retrain_permutation_worker for the other parameters.
+    """
+    from cbd.scheduler import open_shared
+    arrays = open_shared(shared)
+    return _retrain_permutation_worker(
+        seed, arrays['X_train'], y_train, arrays['X_test'], y_test,
+        model_factory, metric_func, stratify_groups
+    )
+
+
 def retrain_null_test(
     X_train: np.ndarray,
     y_train: np.ndarray,
@@ -273,7 +416,11 @@ def retrain_null_test(
     n_jobs: int = 1,
     backend: Literal['threads', 'processes'] = 'processes',
     stratify_groups: Optional[np.ndarray] = None,
-    verbose: int = 0
+    verbose: int = 0,
+    checkpoint: Optional[str] = None,
+    checkpoint_every: Optional[int] = None,
+    executor: Optional[Any] = None,
+    inner_threads: Optional[Union[int, str]] = None
 ) -> Dict[str, Any]:
     """
     Perform retrain-null permutation test (conservative, computationally expensive).
@@ -300,11 +447,34 @@ def retrain_null_test(
     n_jobs : int, default=1
         Number of parallel jobs
     backend : {'threads', 'processes'}, default='processes'
-        Parallel backend (processes recommended for model training)
+        Parallel backend (processes recommended for model training). With
+        processes, X_train and X_test (dense or CSR/CSC) are written once per run
+        to a temporary memory-mapped folder (in RAM under /dev/shm when available)
+        and workers fit on read-only zero-copy views; the folder is removed when
+        the run ends, also on failure.
     stratify_groups : np.ndarray, optional
         Group labels for stratified permutation
     verbose : int, default=0
         Verbosity level
+    checkpoint : str or os.PathLike, optional
+        Base path of a checkpoint ('<path>.npz' with the metrics computed so far and
+        '<path>.json' manifest with the seed and an input fingerprint; see
+        cbd.checkpoint). Progress is saved every checkpoint_every permutations, and
+        rerunning with the same arguments resumes after the last save with a
+        bit-identical null. Without random_seed, the seed drawn by the first run is
+        recorded and reused.
+    checkpoint_every : int, optional
+        Permutations between checkpoint saves (default: 5% of n_permutations)
+    executor : concurrent.futures.Executor-compatible, optional
+        Submit the permutations to this executor (e.g. a ProcessPoolExecutor or a
+        dask.distributed Client) in contiguous blocks of seeds instead of using
+        joblib; overrides n_jobs and backend. The executor is not shut down.
+    inner_threads : int, 'auto' or None, default=None
+        Native BLAS/OpenMP threads allowed per worker (limited with threadpoolctl),
+        to avoid oversubscription when every worker starts a full native thread
+        pool. 'auto' allows cpu_count // n_workers threads when running in parallel.
+        The effective layout is reported in 'thread_layout'. None leaves native
+        thread pools alone.
         
     Returns
     -------
@@ -335,10 +505,33 @@ def retrain_null_test(
     """
     # Compute observed metric
     model_obs = model_factory()
+    if checkpoint is not None:
+        from cbd.checkpoint import PermutationCheckpoint, describe_callable, input_fingerprint
+        # Unfitted parameters of the model, for the checkpoint fingerprint
+        model_description = describe_callable(model_obs)
     model_obs.fit(X_train, y_train)
     y_pred_obs = model_obs.predict(X_test)
     observed = metric_func(y_test, y_pred_obs)
     
+    ckpt = None
+    permuted_values = []
+    if checkpoint is not None:
+        fingerprint = input_fingerprint(
+            X_train, y_train, X_test, y_test, stratify_groups,
+            model=model_description, metric=describe_callable(metric_func),
+            n_permutations=n_permutations,
+            random_seed=random_seed if random_seed is not None else "unseeded"
+        )
+        every = checkpoint_every if checkpoint_every is not None else max(1, -(-n_permutations // 20))
+        ckpt = PermutationCheckpoint(checkpoint, fingerprint, every=every)
+        resumed = ckpt.load()
+        if resumed is not None:
+            permuted_values = resumed["null"].tolist()
+            random_seed = ckpt.manifest["random_seed"]
+        elif random_seed is None:
+            # Record a concrete seed so that an interrupted run can be resumed
+            random_seed = int(np.random.SeedSequence().generate_state(1)[0])
+    
     # Generate random seeds
     if random_seed is not None:
         master_rng = np.random.RandomState(random_seed)
@@ -346,26 +539,59 @@ def retrain_null_test(
         master_rng = np.random.RandomState()
     
     seeds = master_rng.randint(0, 2**31 - 1, size=n_permutations)
+    n_resumed = len(permuted_values)
+    round_size = ckpt.every if ckpt is not None else max(n_permutations, 1)
     
     # Parallel execution
-    if n_jobs == 1:
-        permuted_values = []
-        for seed in seeds:
-            val = _retrain_permutation_worker(
-                seed, X_train, y_train, X_test, y_test,
-                model_factory, metric_func, stratify_groups
-            )
-            permuted_values.append(val)
+    shared = None
+    if executor is not None or n_jobs == 1:
+        parallel = None
     else:
         joblib_backend = 'loky' if backend == 'processes' else 'threading'
-        
-        permuted_values = Parallel(n_jobs=n_jobs, backend=joblib_backend, verbose=verbose)(
-            delayed(_retrain_permutation_worker)(
-                seed, X_train, y_train, X_test, y_test,
-                model_factory, metric_func, stratify_groups
-            )
-            for seed in seeds
-        )
+        parallel = Parallel(n_jobs=n_jobs, backend=joblib_backend, verbose=verbose)
+        if backend == 'processes':
+            from cbd.scheduler import shared_arrays
+            shared = shared_arrays(X_train=X_train, X_test=X_test)
+    base_worker = _retrain_shared_worker if shared is not None else _retrain_permutation_worker
+    limits, worker, task_threads, layout = _inner_thread_plan(
+        inner_threads, n_jobs, backend, executor, base_worker
+    )
+    with limits, (shared if shared is not None else nullcontext()) as specs:
+        for start in range(n_resumed, n_permutations, round_size):
+            round_seeds = seeds[start:start + round_size]
+            if executor is not None:
+                from cbd.scheduler import map_blocks
+                permuted_values.extend(map_blocks(
+                    executor, _retrain_permutation_worker, round_seeds, X_train, y_train,
+                    X_test, y_test, model_factory, metric_func, stratify_groups,
+                    n_threads=task_threads
+                ))
+            elif parallel is None:
+                for seed in round_seeds:
+                    val = _retrain_permutation_worker(
+                        seed, X_train, y_train, X_test, y_test,
+                        model_factory, metric_func, stratify_groups
+                    )
+                    permuted_values.append(val)
+            elif specs is not None:
+                permuted_values.extend(parallel(
+                    delayed(worker)(
+                        seed, specs, y_train, y_test,
+                        model_factory, metric_func, stratify_groups
+                    )
+                    for seed in round_seeds
+                ))
+            else:
+                permuted_values.extend(parallel(
+                    delayed(worker)(
+                        seed, X_train, y_train, X_test, y_test,
+                        model_factory, metric_func, stratify_groups
+                    )
+                    for seed in round_seeds
+                ))
+            if ckpt is not None:
+                ckpt.save({"null": np.asarray(permuted_values, dtype=float)},
+                          random_seed=int(random_seed), stream_position=len(permuted_values))
     
     # Filter NaN values
     permuted_values = np.array([v for v in permuted_values if not np.isnan(v)])
@@ -380,7 +606,7 @@ def retrain_null_test(
     ci_lower = np.percentile(permuted_values, 2.5)
     ci_upper = np.percentile(permuted_values, 97.5)
     
-    return {
+    results = {
         'observed': float(observed),
         'permuted_values': permuted_values,
         'p_value': float(p_value),
@@ -389,6 +615,15 @@ def retrain_null_test(
         'n_permutations': len(permuted_values),
         'n_failed': n_permutations - len(permuted_values)
     }
+    if layout is not None:
+        results['thread_layout'] = layout
+    if ckpt is not None:
+        results['checkpoint'] = {
+            'path': ckpt.manifest_path,
+            'resumed_from': n_resumed,
+            'n_saves': ckpt.n_saves
+        }
+    return results
 
 
 def adaptive_permutation_test(
@@ -403,6 +638,7 @@ def adaptive_permutation_test(
     n_jobs: int = 1,
     backend: Literal['threads', 'processes'] = 'threads',
     verbose: int = 0,
+    executor: Optional[Any] = None,
     **metric_kwargs
 ) -> Dict[str, Any]:
     """
@@ -434,6 +670,10 @@ def adaptive_permutation_test(
         Parallel backend
     verbose : int, default=0
         Verbosity level
+    executor : concurrent.futures.Executor-compatible, optional
+        Submit the permutations to this executor (e.g. a ProcessPoolExecutor or a
+        dask.distributed Client) in contiguous blocks of seeds instead of using
+        joblib; overrides n_jobs and backend. The executor is not shut down.
     **metric_kwargs
         Additional arguments for metric_func
         
@@ -477,7 +717,13 @@ def adaptive_permutation_test(
         seeds = master_rng.randint(0, 2**31 - 1, size=n_batch)
         
         # Execute batch
-        if n_jobs == 1:
+        if executor is not None:
+            from cbd.scheduler import map_blocks
+            batch_values = map_blocks(
+                executor, _permutation_worker, seeds, performance_matrix, constraint_matrix,
+                metric_func, **metric_kwargs
+            )
+        elif n_jobs == 1:
             batch_values = [
                 _permutation_worker(seed, performance_matrix, constraint_matrix, 
                                    metric_func, **metric_kwargs)
@@ -0,0 +1,81 @@
+"""
+Benchmark: Vectorized Within-Group Permutations
+
+Compares the per-permutation, per-group loops previously used by
+``cbd/api.py`` (``_generate_stratified_permutations``) and
+``src/cbd/api.py`` (``_permute_labels_within_groups``) with the vectorized
+``cbd.permutations.grouped_permutations`` primitive, which permutes a whole
+(B, n) block within groups with one argsort.
+
+Run:
+    python examples/benchmark_stratified_permutations.py
+"""
+
+import time
+
+import numpy as np
+
+from cbd.permutations import permute_within_groups
+
+
+def legacy_class_loop(groups, n_permutations, rng):
+    """Former cbd/api.py stratified generator: one rng.permutation per class."""
+    class_indices = [np.where(groups == g)[0] for g in np.unique(groups)]
+    perm_indices = []
+    for _ in range(n_permutations):
+        perm_idx = np.empty(len(groups), dtype=int)
+        for indices in class_indices:
+            perm_idx[indices] = rng.permutation(indices)
+        perm_indices.append(perm_idx)
+    return perm_indices
+
+
+def legacy_group_loop(y, groups, n_permutations, rng):
+    """Former src/cbd/api.py generator: np.unique + np.where on every permutation."""
+    out = []
+    for _ in range(n_permutations):
+        perm = np.empty_like(y)
+        for grp in np.unique(groups):
+            indices = np.where(groups == grp)[0]
+            idx = rng.permutation(len(indices))
+            perm[indices] = y[indices[idx]]
+        out.append(perm)
+    return out
+
+
+def vectorized(groups, n_permutations, rng, block=256):
+    """Blocks of `block` permutations from one argsort each."""
+    out = []
+    for start in range(0, n_permutations, block):
+        out.append(permute_within_groups(groups, min(block, n_permutations - start), rng))
+    return out
+
+
+def _time(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    print("=" * 72)
+    print("Within-group permutation generation (200 strata)")
+    print("=" * 72)
+    print(f"{'n_samples':>10} {'n_perm':>8} {'cbd loop':>10} {'src loop':>10} "
+          f"{'vectorized':>11} {'speedup':>8}")
+    for n_samples, n_permutations in [(2000, 10000), (20000, 1000), (200000, 100)]:
+        rng = np.random.default_rng(0)
+        groups = rng.integers(0, 200, n_samples)
+        y = rng.integers(0, 2, n_samples)
+        t_cbd = _time(legacy_class_loop, groups, n_permutations, np.random.default_rng(1))
+        t_src = _time(legacy_group_loop, y, groups, n_permutations, np.random.default_rng(1))
+        t_vec = _time(vectorized, groups, n_permutations, np.random.default_rng(1))
+        print(f"{n_samples:>10} {n_permutations:>8} {t_cbd:>9.2f}s {t_src:>9.2f}s "
+              f"{t_vec:>10.2f}s {t_cbd / t_vec:>7.1f}x")
+    print("\nThe vectorized path costs O(n log n) per permutation with no Python-level")
+    print("loop over groups: it wins with many permutations of small strata and is")
+    print("slower than the per-class loop for very large n with few permutations.")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,19 @@ Enhancements in this version:
 - Support stratified permutations (permute within groups supplied via `stratify` array).
 - Optional retrain null_method placeholder (not implemented fully here; raises if requested).
 - n_jobs parameter (uses ThreadPoolExecutor for parallel metric computation to avoid heavy pickling).
+  Each worker evaluates one contiguous block of the permutation stream with its own generators
+  spawned from the master SeedSequence, so results are identical for any n_jobs.
 - Improved docstrings and type hints.
 """
 from typing import Protocol, runtime_checkable, Optional, Callable, Any, Dict, List
 import numpy as np
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
+
+from cbd.permutations import PermutationStream
+from cbd.scheduler import effective_n_jobs
+
+# Permutations materialized at a time by each worker.
+_PERMUTATION_BLOCK = 256
 
 MetricFn = Callable[[Any, Any], float]
 
@@ -37,29 +45,10 @@ def _to_numpy(a):
     return arr
 
 
-def _permute_labels_within_groups(y, rng: np.random.Generator, stratify: Optional[np.ndarray]):
-    """Return a permuted copy of y. If stratify is provided (same length as y),
-    labels are permuted only within each group defined by stratify.
-    """
-    y = np.asarray(y)
-    perm = np.empty_like(y)
-    if stratify is None:
-        # global permutation
-        idx = rng.permutation(len(y))
-        perm = y[idx]
-    else:
-        stratify = np.asarray(stratify)
-        if stratify.shape[0] != y.shape[0]:
-            raise ValueError("stratify must be the same length as y")
-        perm = np.empty_like(y)
-        for grp in np.unique(stratify):
-            indices = np.where(stratify == grp)[0]
-            if len(indices) <= 1:
-                perm[indices] = y[indices]
-            else:
-                idx = rng.permutation(len(indices))
-                perm[indices] = y[indices[idx]]
-    return perm
+def _worker_ranges(n_permutations: int, n_workers: int):
+    """Split [0, n_permutations) into at most n_workers contiguous (start, stop) blocks."""
+    bounds = np.linspace(0, n_permutations, min(n_workers, max(n_permutations, 1)) + 1).astype(int)
+    return [(int(lo), int(hi)) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
 
 
 def detect_bias(model: CBDModel,
@@ -88,7 +77,8 @@ def detect_bias(model: CBDModel,
     n_permutations : int
         Number of permutations to perform for the null distribution.
     random_state : Optional[int]
-        Seed for RNG to make permutation reproducible.
+        Seed for RNG to make permutation reproducible. Permutations come from per-block
+        generators spawned from this seed (see cbd.permutations.PermutationStream).
     return_permutations : bool
         If True, include the list of permuted metrics in the returned dict.
     stratify : Optional[array-like]
@@ -99,6 +89,8 @@ def detect_bias(model: CBDModel,
         "retrain" would retrain the model on each permuted dataset (not implemented here; raises).
     n_jobs : int
         Number of parallel workers for computing permuted metrics. Uses threads to avoid pickle issues.
+        Each worker handles one contiguous block of permutations; permuted_metrics are returned in
+        permutation order and do not depend on n_jobs (-1 uses all CPUs).
 
     Returns
     -------
@@ -136,27 +128,36 @@ def detect_bias(model: CBDModel,
     except Exception:
         observed = float(metric(np.asarray(y_a), np.asarray(y_pred)))
 
-    rng = np.random.default_rng(random_state)
-
-    permuted_metrics = []
+    if stratify is not None and np.asarray(stratify).shape[0] != y_a.shape[0]:
+        raise ValueError("stratify must be the same length as y")
+    stream = PermutationStream(len(y_a), n_permutations, random_state, groups=stratify)
 
-    def _compute_one(_):
-        y_perm = _permute_labels_within_groups(y_a, rng, stratify)
+    def _score(y_perm):
         try:
             return float(metric(y_perm, y_pred))
         except Exception:
             return float(metric(np.asarray(y_perm), np.asarray(y_pred)))
 
-    if n_jobs == 1:
-        for i in range(n_permutations):
-            m = _compute_one(i)
-            permuted_metrics.append(m)
+    def _score_range(start, stop):
+        # Runs in a worker: its generators are private, so no lock is shared
+        values = np.empty(stop - start)
+        i = 0
+        for perm_block in stream.chunks(_PERMUTATION_BLOCK, start, stop):
+            for idx in perm_block:
+                values[i] = _score(y_a[idx])
+                i += 1
+        return values
+
+    ranges = _worker_ranges(n_permutations, effective_n_jobs(n_jobs))
+    if len(ranges) <= 1:
+        permuted_metrics = [_score_range(start, stop) for start, stop in ranges]
     else:
-        # Use ThreadPoolExecutor to avoid heavy pickling of model objects; metrics often release GIL
-        with ThreadPoolExecutor(max_workers=n_jobs) as exc:
-            futures = [exc.submit(_compute_one, i) for i in range(n_permutations)]
-            for f in as_completed(futures):
-                permuted_metrics.append(f.result())
+        # Use ThreadPoolExecutor to avoid heavy pickling of model objects; metrics often release GIL.
+        # One future per worker block; results are gathered in submission order.
+        with ThreadPoolExecutor(max_workers=len(ranges)) as exc:
+            futures = [exc.submit(_score_range, start, stop) for start, stop in ranges]
+            permuted_metrics = [f.result() for f in futures]
+    permuted_metrics = np.concatenate(permuted_metrics) if permuted_metrics else np.empty(0)
 
     permuted_metrics = np.asarray(permuted_metrics)
     # p-value: fraction of permuted metrics >= observed (one-sided test)
@@ -203,6 +203,77 @@ def invalid_matrix():
     ])
 
 
+class StoredPredictor:
+    """
+    Stand-in model returning stored predictions (or scores).
+    
+    X is a column of row ids (see the ``row_ids`` fixture) and predict returns
+    the stored predictions of those rows; with ``by_row_id=False`` it returns
+    the first ``X.shape[0]`` predictions whatever X holds (sparse or float32
+    inputs). Counts the predicted rows and keeps the last X seen.
+    """
+    
+    def __init__(self, predictions, by_row_id=True):
+        self.predictions = np.asarray(predictions)
+        self.by_row_id = by_row_id
+        self.n_predicted = 0
+        self.seen = None
+    
+    def predict(self, X):
+        self.n_predicted += X.shape[0]
+        self.seen = X
+        if not self.by_row_id:
+            return self.predictions[:X.shape[0]]
+        return self.predictions[np.asarray(X)[:, 0].astype(int)]
+    
+    predict_proba = predict
+
+
+@pytest.fixture
+def stored_predictor():
+    """Provide the StoredPredictor class (predictions looked up by row id)."""
+    return StoredPredictor
+
+
+@pytest.fixture
+def row_ids():
+    """Provide a function building the (n, 1) row-id matrix StoredPredictor reads."""
+    return lambda n: np.arange(n).reshape(-1, 1)
+
+
+@pytest.fixture
+def noisy_predictions():
+    """
+    Provide binary labels and predictions agreeing with them 70% of the time.
+    
+    Returns
+    -------
+    tuple
+        (X, y, y_pred) with X the (300, 1) row ids StoredPredictor reads
+    """
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 300)
+    y_pred = np.where(rng.random(300) < 0.7, y, 1 - y)
+    return np.arange(300).reshape(-1, 1), y, y_pred
+
+
+@pytest.fixture
+def fitted_classifier():
+    """
+    Provide a logistic regression fitted on a small classification problem.
+    
+    Returns
+    -------
+    tuple
+        (X, y, model) with X of shape (300, 5)
+    """
+    from sklearn.datasets import make_classification
+    from sklearn.linear_model import LogisticRegression
+    
+    X, y = make_classification(n_samples=300, n_features=5, random_state=0)
+    return X, y, LogisticRegression().fit(X, y)
+
+
 # Markers for test categorization
 def pytest_configure(config):
     """Configure custom pytest markers."""
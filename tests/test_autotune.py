@@ -0,0 +1,178 @@
+"""Tests for the machine profile, cost model and autotuner (cbd.autotune)."""
+import json
+
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score
+
+from cbd import autotune
+from cbd.api import detect_bias
+from cbd.autotune import CostModel, MachineProfile, calibrate, load_profile, machine_signature
+from cbd.cache import NullCache
+from cbd.thresholds import estimate_computation_time
+
+
+def _profile(threads=None, processes=None, startup_s=0.0, overhead_s=0.0):
+    """Calibrated-looking profile: 1 us + 10 ns per label (batched), 100 us per call."""
+    return MachineProfile(
+        engines={"batched": {"s_per_permutation": 1e-6, "s_per_element": 1e-8},
+                 "per_call": {"s_per_permutation": 1e-4, "s_per_element": 1e-8}},
+        predict={"s_per_call": 1e-4, "s_per_row": 1e-8},
+        parallel={
+            "threads": {"speedup": {"batched": threads or {}, "per_call": threads or {}},
+                        "task_overhead_s": overhead_s, "startup_s": 0.0},
+            "processes": {"speedup": {"batched": processes or {}, "per_call": processes or {}},
+                          "task_overhead_s": overhead_s, "startup_s": startup_s},
+        },
+        table_lookup_s=2e-4, machine=machine_signature(),
+    )
+
+
+def test_calibrate_and_roundtrip(tmp_path):
+    profile = calibrate(sizes=(200, 2000), target_s=0.02, max_workers=2, backends=("threads",))
+    assert profile.calibrated
+    assert profile.engines["batched"]["s_per_element"] > 0
+    assert set(profile.parallel["threads"]["speedup"]) == {"batched", "per_call"}
+    assert 2 in profile.parallel["threads"]["speedup"]["batched"]
+
+    path = tmp_path / "profile.json"
+    profile.save(path)
+    loaded = load_profile(path)
+    assert loaded.engines == profile.engines
+    assert loaded.parallel["threads"]["speedup"] == profile.parallel["threads"]["speedup"]
+
+
+def test_profile_from_other_machine_is_ignored(tmp_path):
+    path = tmp_path / "profile.json"
+    data = _profile().to_dict()
+    data["machine"]["cpu_count"] = -1
+    path.write_text(json.dumps(data))
+    with pytest.warns(UserWarning, match="different machine"):
+        assert load_profile(path) is None
+    assert load_profile(tmp_path / "missing.json") is None
+
+
+def test_nominal_profile_keeps_previous_estimates():
+    times = estimate_computation_time(5000, n_permutations=1000, n_jobs=4,
+                                      profile=MachineProfile.nominal())
+    time_per_perm = 0.002 * 5
+    assert times["quick_mode"] == pytest.approx(100 * time_per_perm / 4)
+    assert times["full_mode"] == pytest.approx(1000 * time_per_perm / 4)
+    assert times["fast_mode"] == pytest.approx(0.05)
+    assert times["profile"] == "nominal"
+
+
+def test_plan_follows_measured_scaling():
+    n, B = 10000, 2000
+    serial = CostModel(_profile(threads={2: 0.9, 4: 0.8}, processes={2: 0.9}))
+    assert serial.plan(n, B, "batched", max_jobs=4)["n_jobs"] == 1
+
+    scaling = CostModel(_profile(threads={2: 1.2}, processes={2: 1.9, 4: 3.6}, startup_s=0.01))
+    plan = scaling.plan(n, B, "batched", max_jobs=4)
+    assert (plan["n_jobs"], plan["backend"]) == (4, "processes")
+    assert plan["predicted_s"] == pytest.approx(B * (1e-6 + 1e-8 * n) / 3.6 + 0.01)
+    assert scaling.plan(n, B, "batched", max_jobs=2)["n_jobs"] == 2
+
+    # Process start-up dominates a short run
+    slow_start = CostModel(_profile(processes={2: 2.0}, startup_s=5.0))
+    assert slow_start.plan(n, B, "batched", max_jobs=2)["n_jobs"] == 1
+
+
+def test_plan_fits_time_budget():
+    cost = CostModel(_profile())
+    plan = cost.plan(1000, 100_000, "per_call", time_budget_s=1.0, max_jobs=1)
+    assert plan["budget_limited"]
+    assert plan["predicted_s"] <= 0.9 + 1e-9
+    assert plan["n_permutations"] == pytest.approx(0.9 / (1e-4 + 1e-5), rel=1e-3)
+    assert not cost.plan(1000, 100, "per_call", time_budget_s=1.0)["budget_limited"]
+
+
+def test_chunk_size_amortizes_dispatch():
+    cost = CostModel(_profile(processes={4: 3.5}, overhead_s=1e-3))
+    plan = cost.plan(1000, 100_000, "batched", max_jobs=4)
+    per_perm = 1e-6 + 1e-8 * 1000
+    assert plan["chunk_size"] * per_perm >= 20 * 1e-3 or plan["chunk_size"] >= 100_000 // 16
+
+
+def test_observe_corrects_predictions():
+    cost = CostModel(_profile())
+    plan = cost.plan(1000, 1000, "batched", max_jobs=1)
+    cost.observe(plan, 4 * plan["predicted_s"], 1000)
+    assert cost.plan(1000, 1000, "batched", max_jobs=1)["predicted_s"] > plan["predicted_s"]
+
+
+def test_detect_bias_reports_predicted_and_actual(fitted_classifier):
+    X, y, model = fitted_classifier
+    plain = detect_bias(model, X, y, accuracy_score, n_permutations=300, random_state=0,
+                        return_permutations=True)
+    tuned = detect_bias(model, X, y, accuracy_score, n_permutations=300, random_state=0,
+                        return_permutations=True, auto_tune=_profile())
+    info = tuned["auto_tune"]
+    assert info["engine"] == "batched" and info["n_permutations"] == 300
+    assert info["predicted_s"] > 0 and info["actual_s"] > 0
+    assert info["actual_to_predicted"] == pytest.approx(info["actual_s"] / info["predicted_s"])
+    np.testing.assert_array_equal(tuned["permuted_metrics"], plain["permuted_metrics"])
+
+
+def test_detect_bias_budget_lowers_permutations(fitted_classifier):
+    X, y, model = fitted_classifier
+    profile = _profile()
+    profile.engines["per_call"]["s_per_permutation"] = 1e-2  # 10 ms per call
+    result = detect_bias(model, X, y, lambda a, b: accuracy_score(a, b), n_permutations=10_000,
+                         random_state=0, time_budget_s=0.5, auto_tune=profile)
+    assert result["auto_tune"]["budget_limited"]
+    assert result["n_permutations"] == result["auto_tune"]["n_permutations"] < 10_000
+
+
+def test_reused_null_is_not_observed(fitted_classifier):
+    X, y, model = fitted_classifier
+    profile, cache = _profile(), NullCache()
+    kwargs = dict(n_permutations=300, random_state=0, auto_tune=profile, null_cache=cache)
+    first = detect_bias(model, X, y, accuracy_score, **kwargs)
+    assert first["auto_tune"]["observed"]
+    corrections = dict(profile.corrections)
+    second = detect_bias(model, X, y, accuracy_score, **kwargs)
+    assert second["null_cache"]["hit"] and not second["auto_tune"]["observed"]
+    assert profile.corrections == corrections
+
+
+def test_auto_tune_true_uses_stored_profile(fitted_classifier, tmp_path, monkeypatch):
+    X, y, model = fitted_classifier
+    path = tmp_path / "profile.json"
+    _profile().save(path)
+    monkeypatch.setenv("CBD_PROFILE_PATH", str(path))
+    monkeypatch.setattr(autotune, "_default_profile", None)
+    monkeypatch.setattr(autotune, "calibrate", lambda **kw: pytest.fail("recalibrated"))
+    result = detect_bias(model, X, y, accuracy_score, n_permutations=50, random_state=0,
+                         auto_tune=True)
+    assert result["auto_tune"]["profile"] == "calibrated"
+
+
+def test_first_use_calibration_warns_and_tolerates_unwritable_cache(tmp_path, monkeypatch):
+    blocker = tmp_path / "not_a_directory"
+    blocker.write_text("")
+    path = blocker / "profile.json"
+    monkeypatch.setenv("CBD_PROFILE_PATH", str(path))
+    monkeypatch.setattr(autotune, "_default_profile", None)
+    monkeypatch.setattr(autotune, "calibrate", lambda **kw: _profile())
+    with pytest.warns(UserWarning) as record:
+        profile = autotune.default_profile()
+    messages = [str(w.message) for w in record]
+    assert "calibrating" in messages[0] and str(path) in messages[0]
+    assert "could not be saved" in messages[1]
+    assert profile.calibrated
+    assert autotune.default_profile() is profile
+
+
+def test_auto_tune_invalid_options(fitted_classifier):
+    X, y, model = fitted_classifier
+    with pytest.raises(ValueError, match="auto_tune"):
+        detect_bias(model, X, y, accuracy_score, exact=True, auto_tune=_profile())
+    with pytest.raises(ValueError, match="auto_tune"):
+        detect_bias(model, X, y, accuracy_score, null_method="retrain", auto_tune=_profile())
+
+
+def test_calibration_command(tmp_path):
+    path = tmp_path / "cli.json"
+    autotune.main(["--output", str(path), "--max-workers", "1", "--target-s", "0.01"])
+    assert load_profile(path).calibrated
@@ -0,0 +1,126 @@
+"""Tests for the permutation-null cache (cbd.cache)."""
+from functools import partial
+
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, f1_score, fbeta_score
+
+from cbd.api import detect_bias
+from cbd.cache import NullCache, null_cache_key, stable_metric_identity
+
+
+class CountingMetric:
+    """Accuracy that counts its calls (per-call path)."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, y_true, y_pred):
+        self.calls += 1
+        return float(np.mean(np.asarray(y_true) == np.asarray(y_pred)))
+
+
+@pytest.fixture
+def data(noisy_predictions, stored_predictor):
+    X, y, y_pred = noisy_predictions
+    return X, y, stored_predictor(y_pred)
+
+
+def test_key_depends_on_every_input():
+    y, y_pred = np.array([0, 1, 1]), np.array([1, 1, 0])
+    seed = {"seed_entropy": 1, "seed_spawn_key": []}
+    key = null_cache_key(y, y_pred, accuracy_score, seed, 100)
+    assert key == null_cache_key(y.copy(), y_pred.copy(), accuracy_score, dict(seed), 100)
+    assert key != null_cache_key(y[::-1], y_pred, accuracy_score, seed, 100)
+    assert key != null_cache_key(y, y_pred[::-1], accuracy_score, seed, 100)
+    assert key != null_cache_key(y, y_pred, f1_score, seed, 100)
+    assert key != null_cache_key(y, y_pred, accuracy_score, {"seed_entropy": 2, "seed_spawn_key": []}, 100)
+    assert key != null_cache_key(y, y_pred, accuracy_score, seed, 101)
+    assert key != null_cache_key(y, y_pred, accuracy_score, seed, 100, groups=np.array([0, 0, 1]))
+
+
+def test_lru_eviction_by_bytes():
+    cache = NullCache(max_bytes=3 * 80)
+    for i in range(3):
+        cache.put(f"k{i}", np.full(10, i))
+    assert cache.get("k0") is not None  # k0 becomes most recently used
+    cache.put("k3", np.zeros(10))
+    assert "k1" not in cache and "k0" in cache
+    assert cache.get("k1") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["evictions"] == 1
+    assert stats["entries"] == 3 and stats["nbytes"] == 240
+
+
+def test_disk_cache_shared_and_bounded(tmp_path):
+    writer = NullCache(cache_dir=tmp_path, max_disk_bytes=2 * (128 + 80))
+    for i in range(3):
+        writer.put(f"k{i}", np.full(10, float(i)))
+    assert len(list(tmp_path.glob("*.npy"))) == 2
+    reader = NullCache(cache_dir=tmp_path)
+    np.testing.assert_array_equal(reader.get("k2"), np.full(10, 2.0))
+    assert reader.disk_hits == 1
+    reader.get("k2")
+    assert reader.disk_hits == 1 and reader.hits == 2
+
+
+def test_detect_bias_hit_skips_permutations(data):
+    X, y, model = data
+    cache = NullCache()
+    metric = CountingMetric()
+    kwargs = dict(n_permutations=50, random_state=4, return_permutations=True, null_cache=cache)
+    first = detect_bias(model, X, y, metric, **kwargs)
+    assert not first["null_cache"]["hit"] and metric.calls == 51
+    second = detect_bias(model, X, y, metric, **kwargs)
+    # Only the observed statistic is recomputed
+    assert second["null_cache"]["hit"] and metric.calls == 52
+    assert second["null_cache"]["hits"] == 1 and second["null_cache"]["misses"] == 1
+    np.testing.assert_array_equal(second["permuted_metrics"], first["permuted_metrics"])
+    assert second["p_value"] == first["p_value"]
+
+    uncached = detect_bias(model, X, y, CountingMetric(), n_permutations=50, random_state=4,
+                           return_permutations=True)
+    np.testing.assert_array_equal(uncached["permuted_metrics"], first["permuted_metrics"])
+
+
+def test_detect_bias_miss_on_changed_predictions(data, stored_predictor):
+    X, y, model = data
+    cache = NullCache()
+    detect_bias(model, X, y, accuracy_score, n_permutations=50, random_state=4, null_cache=cache)
+    changed = stored_predictor(1 - model.predictions)
+    result = detect_bias(changed, X, y, accuracy_score, n_permutations=50, random_state=4,
+                         null_cache=cache)
+    assert not result["null_cache"]["hit"]
+    assert len(cache) == 2
+
+
+def test_detect_bias_cache_requires_seed(data):
+    X, y, model = data
+    with pytest.raises(ValueError, match="random_state"):
+        detect_bias(model, X, y, accuracy_score, null_cache=True)
+    with pytest.raises(ValueError, match="null_cache"):
+        detect_bias(model, X, y, accuracy_score, random_state=0, null_cache=True,
+                    early_stopping="besag_clifford")
+
+
+def test_metrics_without_stable_identity_are_not_confused(data):
+    X, y, model = data
+    f2 = lambda a, b: fbeta_score(a, b, beta=2)  # noqa: E731
+    f05 = lambda a, b: fbeta_score(a, b, beta=0.5)  # noqa: E731
+    seed = {"seed_entropy": 1, "seed_spawn_key": []}
+    with pytest.raises(ValueError, match="metric_key"):
+        null_cache_key(y, y, f2, seed, 100)
+    assert stable_metric_identity(f2) is None
+    assert stable_metric_identity(partial(fbeta_score, beta=2)) != \
+        stable_metric_identity(partial(fbeta_score, beta=0.5))
+    assert stable_metric_identity(accuracy_score) is not None
+
+    cache = NullCache()
+    with pytest.raises(ValueError, match="metric_key"):
+        detect_bias(model, X, y, f2, random_state=0, null_cache=cache)
+    kwargs = dict(n_permutations=50, random_state=0, null_cache=cache)
+    first = detect_bias(model, X, y, f2, metric_key="f2", **kwargs)
+    second = detect_bias(model, X, y, f05, metric_key="f0.5", **kwargs)
+    assert not first["null_cache"]["hit"] and not second["null_cache"]["hit"]
+    assert second["p_value"] == detect_bias(model, X, y, f05, n_permutations=50,
+                                            random_state=0)["p_value"]
@@ -0,0 +1,158 @@
+"""Tests for checkpoint and resume of permutation runs (cbd.checkpoint)."""
+import json
+import tracemalloc
+from functools import partial
+
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, fbeta_score
+
+from cbd.api import detect_bias
+from cbd.checkpoint import PermutationCheckpoint, describe_callable, input_fingerprint
+
+
+class Preempted(Exception):
+    pass
+
+
+class InterruptingAccuracy:
+    """Accuracy that raises after a number of calls, like a pre-empted worker."""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def __call__(self, y_true, y_pred):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise Preempted()
+        return float(np.mean(np.asarray(y_true) == np.asarray(y_pred)))
+
+
+def test_fingerprint():
+    a = np.arange(10)
+    assert input_fingerprint(a, k=1) == input_fingerprint(a.copy(), k=1)
+    assert input_fingerprint(a, k=1) != input_fingerprint(a, k=2)
+    assert input_fingerprint(a) != input_fingerprint(a.astype(float))
+    dense = np.eye(4)
+    assert input_fingerprint(sparse.csr_matrix(dense)) == input_fingerprint(sparse.csc_matrix(dense))
+    assert input_fingerprint(np.array(["a", None], dtype=object))
+
+
+def test_fingerprint_does_not_copy_inputs():
+    X = np.random.default_rng(0).random((1000, 500))
+    X_sparse = sparse.random(5000, 500, density=0.05, format="csr", random_state=0)
+    assert input_fingerprint(X[:, ::2]) == input_fingerprint(X[:, ::2].copy())
+    tracemalloc.start()
+    try:
+        input_fingerprint(X, X_sparse)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < X.nbytes // 100
+    # Duplicates are summed on a copy, never in the caller's matrix
+    coo = sparse.coo_matrix(([1.0, 2.0], ([0, 0], [1, 1])), shape=(2, 2))
+    assert input_fingerprint(coo) == input_fingerprint(sparse.csr_matrix([[0, 3.0], [0, 0]]))
+    assert coo.nnz == 2
+
+
+def test_describe_callable():
+    assert describe_callable(accuracy_score).endswith("accuracy_score")
+    assert "beta" in describe_callable(partial(fbeta_score, beta=2))
+    assert describe_callable(LogisticRegression(C=2.0)) != describe_callable(LogisticRegression())
+    assert "0x" not in describe_callable(lambda a, b: 0)
+
+
+def test_save_and_load(tmp_path):
+    ckpt = PermutationCheckpoint(tmp_path / "run.npz", "abc", every=5)
+    assert ckpt.load() is None
+    ckpt.save({"null": np.arange(3.0)}, stream_position=3)
+    assert ckpt.npz_path.endswith("run.npz")
+    manifest = json.loads(open(ckpt.manifest_path).read())
+    assert manifest["n_done"] == 3 and manifest["stream_position"] == 3
+    loaded = PermutationCheckpoint(tmp_path / "run", "abc").load()
+    np.testing.assert_array_equal(loaded["null"], np.arange(3.0))
+    with pytest.raises(ValueError, match="different inputs"):
+        PermutationCheckpoint(tmp_path / "run", "other").load()
+    with pytest.raises(ValueError, match="equal lengths"):
+        ckpt.save({"a": np.zeros(2), "b": np.zeros(3)})
+
+
+def test_manifest_records_progress_not_partial_write(tmp_path):
+    ckpt = PermutationCheckpoint(tmp_path / "run", "abc")
+    ckpt.save({"null": np.arange(4.0)})
+    # Arrays written before a crash that skipped the manifest update
+    with open(ckpt.npz_path, "wb") as f:
+        np.savez(f, null=np.arange(6.0))
+    np.testing.assert_array_equal(PermutationCheckpoint(tmp_path / "run", "abc").load()["null"],
+                                  np.arange(4.0))
+
+
+@pytest.mark.parametrize("random_state", [3, None])
+def test_retrain_resume_is_bit_identical(tmp_path, fitted_classifier, random_state):
+    X, y, model = fitted_classifier
+    path = tmp_path / "retrain"
+    kwargs = dict(null_method="retrain", n_permutations=24, random_state=random_state,
+                  return_permutations=True, checkpoint=path, checkpoint_every=5)
+    with pytest.raises(Preempted):
+        detect_bias(model, X, y, InterruptingAccuracy(fail_after=12), **kwargs)
+    saved = json.loads(open(str(path) + ".json").read())
+    assert saved["n_done"] == 10
+
+    resumed = detect_bias(model, X, y, InterruptingAccuracy(), **kwargs)
+    assert resumed["checkpoint"]["resumed_from"] == 10
+    assert len(resumed["retrain"]["fit_times"]) == 24
+
+    if random_state is not None:
+        uninterrupted = detect_bias(model, X, y, InterruptingAccuracy(),
+                                    **{**kwargs, "checkpoint": None})
+        np.testing.assert_array_equal(resumed["permuted_metrics"], uninterrupted["permuted_metrics"])
+        assert resumed["p_value"] == uninterrupted["p_value"]
+
+    # A finished run is returned from the checkpoint without new work (the one
+    # allowed call computes the observed metric)
+    again = detect_bias(model, X, y, InterruptingAccuracy(fail_after=1), **kwargs)
+    np.testing.assert_array_equal(again["permuted_metrics"], resumed["permuted_metrics"])
+    assert again["checkpoint"]["n_saves"] == 0
+
+
+def test_permute_resume_extends_run(tmp_path, fitted_classifier):
+    X, y, model = fitted_classifier
+    path = tmp_path / "permute"
+    full = detect_bias(model, X, y, accuracy_score, n_permutations=300, random_state=1,
+                       return_permutations=True)
+    detect_bias(model, X, y, accuracy_score, n_permutations=100, random_state=1, checkpoint=path)
+    extended = detect_bias(model, X, y, accuracy_score, n_permutations=300, random_state=1,
+                           return_permutations=True, checkpoint=path, n_jobs=2)
+    assert extended["checkpoint"]["resumed_from"] == 100
+    np.testing.assert_array_equal(extended["permuted_metrics"], full["permuted_metrics"])
+
+
+def test_early_stopping_replay(tmp_path, fitted_classifier):
+    X, y, model = fitted_classifier
+    path = tmp_path / "sequential"
+    kwargs = dict(n_permutations=400, random_state=2, early_stopping="besag_clifford",
+                  checkpoint=path, checkpoint_every=50)
+    noisy = y.copy()
+    noisy[::2] = 1 - noisy[::2]
+    first = detect_bias(model, X, noisy, accuracy_score, **kwargs)
+    second = detect_bias(model, X, noisy, accuracy_score, **kwargs)
+    assert second["p_value"] == first["p_value"]
+    assert second["n_permutations_used"] == first["n_permutations_used"]
+    assert second["stopping_reason"] == first["stopping_reason"]
+
+
+def test_mismatched_inputs_and_exact(tmp_path, fitted_classifier):
+    X, y, model = fitted_classifier
+    path = tmp_path / "run"
+    detect_bias(model, X, y, accuracy_score, n_permutations=20, random_state=0, checkpoint=path)
+    with pytest.raises(ValueError, match="different inputs"):
+        detect_bias(model, X, 1 - y, accuracy_score, n_permutations=20, random_state=0,
+                    checkpoint=path)
+    with pytest.raises(ValueError, match="different inputs"):
+        detect_bias(model, X, y, accuracy_score, n_permutations=20, random_state=1,
+                    checkpoint=path)
+    with pytest.raises(ValueError, match="checkpoint"):
+        detect_bias(model, X, y, accuracy_score, exact=True, checkpoint=tmp_path / "exact")
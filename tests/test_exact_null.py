@@ -0,0 +1,150 @@
+"""Tests for the exact hypergeometric and table-sampling nulls."""
+from functools import partial
+from itertools import permutations
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score, matthews_corrcoef, roc_auc_score
+
+from cbd.api import detect_bias
+from cbd.exact_null import binary_exact_null, mann_whitney_null, sample_contingency_tables
+from cbd.fast_metrics import resolve_batched_metric, roc_auc_positive
+
+
+class TestBinaryExactNull:
+    """The hypergeometric null must match full enumeration of permutations."""
+
+    @pytest.mark.parametrize("metric", [accuracy_score, f1_score, matthews_corrcoef])
+    def test_matches_enumeration(self, metric):
+        y = np.array([0, 1, 1, 0, 1, 0, 0, 1])
+        y_pred = np.array([0, 1, 1, 1, 1, 0, 0, 0])
+        batched = resolve_batched_metric(metric).prepare(y, y_pred)
+        observed = batched.observed()
+
+        all_perms = np.array(list(permutations(range(len(y)))))
+        values = batched.evaluate(all_perms)
+        expected = np.mean(values >= observed - 1e-12)
+
+        result = binary_exact_null(batched)
+        assert result["p_value"] == pytest.approx(expected)
+        assert result["pmf"].sum() == pytest.approx(1.0)
+
+    def test_rejects_multiclass(self):
+        y = np.array([0, 1, 2, 0, 1, 2])
+        batched = resolve_batched_metric(accuracy_score).prepare(y, y)
+        with pytest.raises(ValueError):
+            binary_exact_null(batched)
+
+
+class TestMannWhitneyNull:
+    """Analytic U null for ROC AUC."""
+
+    def test_exact_matches_enumeration(self):
+        y = np.array([0, 1, 1, 0, 1, 0, 0, 1])
+        scores = np.array([0.1, 0.9, 0.35, 0.4, 0.8, 0.2, 0.5, 0.3])
+        ranked = resolve_batched_metric(roc_auc_score).prepare(y, scores)
+        all_perms = np.array(list(permutations(range(len(y)))))
+        expected = np.mean(ranked.evaluate(all_perms) >= ranked.observed() - 1e-12)
+
+        result = mann_whitney_null(ranked, method="exact")
+        assert result["method"] == "exact"
+        assert result["p_value"] == pytest.approx(expected)
+
+    def test_normal_with_ties_close_to_monte_carlo(self):
+        rng = np.random.default_rng(0)
+        y = rng.integers(0, 2, 400)
+        scores = np.round(0.1 * y + rng.random(400), 1)  # heavy ties, weak signal
+        ranked = resolve_batched_metric(roc_auc_score).prepare(y, scores)
+        perm_block = np.stack([rng.permutation(400) for _ in range(5000)])
+        mc = np.mean(ranked.evaluate(perm_block) >= ranked.observed())
+
+        result = mann_whitney_null(ranked)
+        assert result["method"] == "normal"
+        assert result["p_value"] == pytest.approx(mc, abs=0.02)
+
+    def test_exact_with_ties_raises(self):
+        y = np.array([0, 1, 0, 1])
+        ranked = resolve_batched_metric(roc_auc_score).prepare(y, np.array([0.1, 0.1, 0.2, 0.3]))
+        with pytest.raises(ValueError, match="untied"):
+            mann_whitney_null(ranked, method="exact")
+
+
+class TestTableSampling:
+    """Sampled contingency tables follow the permutation null."""
+
+    def test_margins_preserved(self):
+        rng = np.random.default_rng(0)
+        true_counts = np.array([30, 50, 20])
+        pred_counts = np.array([10, 60, 30])
+        tables = sample_contingency_tables(true_counts, pred_counts, 500, rng)
+        np.testing.assert_array_equal(tables.sum(axis=2), np.tile(true_counts, (500, 1)))
+        np.testing.assert_array_equal(tables.sum(axis=1), np.tile(pred_counts, (500, 1)))
+        assert (tables >= 0).all()
+
+    def test_cell_means(self):
+        rng = np.random.default_rng(1)
+        true_counts = np.array([30, 50, 20])
+        pred_counts = np.array([10, 60, 30])
+        tables = sample_contingency_tables(true_counts, pred_counts, 20000, rng)
+        expected = np.outer(true_counts, pred_counts) / true_counts.sum()
+        np.testing.assert_allclose(tables.mean(axis=0), expected, atol=0.1)
+
+
+class TestDetectBiasExact:
+    """detect_bias(exact=True) integration."""
+
+    @pytest.fixture
+    def fitted(self):
+        X, y = make_classification(n_samples=300, n_features=8, random_state=3)
+        model = LogisticRegression(max_iter=1000).fit(X, y)
+        return model, X, y
+
+    def test_binary_exact_close_to_monte_carlo(self, fitted):
+        model, X, y = fitted
+        # a weak model so that the p-value is not at the floor
+        noisy = y.copy()
+        noisy[::2] = 1 - noisy[::2]
+        exact = detect_bias(model, X, noisy, accuracy_score, exact=True)
+        mc = detect_bias(model, X, noisy, accuracy_score, n_permutations=20000,
+                         random_state=0)
+        assert exact["p_value_method"] == "hypergeometric"
+        assert exact["n_permutations"] == 0
+        assert "p_value_ci" not in exact
+        assert exact["p_value"] == pytest.approx(mc["p_value"], abs=0.02)
+
+    def test_binary_exact_returns_null_support(self, fitted):
+        model, X, y = fitted
+        result = detect_bias(model, X, y, accuracy_score, exact=True,
+                             return_permutations=True)
+        assert len(result["null_support"]) == len(result["null_pmf"])
+        assert sum(result["null_pmf"]) == pytest.approx(1.0)
+
+    def test_multiclass_table_sampling(self):
+        X, y = make_classification(n_samples=300, n_features=8, n_informative=5,
+                                   n_classes=3, random_state=0)
+        model = LogisticRegression(max_iter=1000).fit(X, y)
+        result = detect_bias(model, X, y, partial(f1_score, average="macro"),
+                             n_permutations=500, exact=True, random_state=0,
+                             return_permutations=True)
+        assert result["p_value_method"] == "table_sampling"
+        assert len(result["permuted_metrics"]) == 500
+        assert result["p_value"] < 0.05
+
+    def test_auc_uses_u_null(self, fitted):
+        model, X, y = fitted
+        result = detect_bias(model, X, y, roc_auc_positive, allow_proba=True,
+                             exact=True, auc_null="normal")
+        assert result["p_value_method"] == "mann_whitney_normal"
+        assert result["p_value"] < 1e-6
+
+    def test_unrecognized_metric_raises(self, fitted):
+        model, X, y = fitted
+        with pytest.raises(ValueError, match="exact=True requires a count-based or ROC AUC metric"):
+            detect_bias(model, X, y, lambda yt, yp: accuracy_score(yt, yp), exact=True)
+
+    def test_retrain_raises(self, fitted):
+        model, X, y = fitted
+        with pytest.raises(ValueError, match="exact=True requires null_method"):
+            detect_bias(model, X, y, accuracy_score, null_method="retrain", exact=True)
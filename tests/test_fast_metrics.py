@@ -0,0 +1,280 @@
+"""Tests for the vectorized batched-permutation metric kernels."""
+from functools import partial
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.datasets import make_regression
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.metrics import (
+    accuracy_score,
+    balanced_accuracy_score,
+    brier_score_loss,
+    f1_score,
+    log_loss,
+    matthews_corrcoef,
+    mean_squared_error,
+    precision_score,
+    r2_score,
+    recall_score,
+    roc_auc_score,
+)
+
+from cbd.api import detect_bias
+from cbd.fast_metrics import (
+    code_dtype,
+    confusion_counts,
+    encode_labels,
+    pearson_r,
+    resolve_batched_metric,
+    roc_auc_positive,
+)
+
+
+def _reference(metric, y, y_pred, perm_block):
+    return np.array([metric(y[idx], y_pred) for idx in perm_block])
+
+
+@pytest.fixture
+def binary_labels():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 300)
+    y_pred = np.where(rng.random(300) < 0.7, y, 1 - y)
+    perm_block = np.stack([rng.permutation(300) for _ in range(25)])
+    return y, y_pred, perm_block
+
+
+@pytest.fixture
+def multiclass_labels():
+    rng = np.random.default_rng(1)
+    y = rng.integers(0, 4, 250)
+    y_pred = np.where(rng.random(250) < 0.5, y, rng.integers(0, 4, 250))
+    perm_block = np.stack([rng.permutation(250) for _ in range(25)])
+    return y, y_pred, perm_block
+
+
+class TestKernelsMatchSklearn:
+    """Batched kernels must agree with per-call scikit-learn metrics."""
+
+    @pytest.mark.parametrize("metric", [
+        accuracy_score,
+        balanced_accuracy_score,
+        partial(balanced_accuracy_score, adjusted=True),
+        precision_score,
+        recall_score,
+        f1_score,
+        partial(f1_score, average="macro"),
+        partial(f1_score, average="micro"),
+        partial(precision_score, pos_label=0),
+        matthews_corrcoef,
+    ])
+    def test_binary(self, binary_labels, metric):
+        y, y_pred, perm_block = binary_labels
+        batched = resolve_batched_metric(metric).prepare(y, y_pred)
+        np.testing.assert_allclose(
+            batched.evaluate(perm_block), _reference(metric, y, y_pred, perm_block)
+        )
+
+    @pytest.mark.parametrize("metric", [
+        accuracy_score,
+        balanced_accuracy_score,
+        partial(precision_score, average="macro", zero_division=0),
+        partial(recall_score, average="weighted"),
+        partial(f1_score, average="macro"),
+        partial(f1_score, average="micro"),
+        partial(f1_score, average="weighted"),
+        matthews_corrcoef,
+    ])
+    def test_multiclass(self, multiclass_labels, metric):
+        y, y_pred, perm_block = multiclass_labels
+        batched = resolve_batched_metric(metric).prepare(y, y_pred)
+        np.testing.assert_allclose(
+            batched.evaluate(perm_block), _reference(metric, y, y_pred, perm_block)
+        )
+
+    def test_string_labels(self):
+        y = np.array(["a", "b", "c", "a", "b", "c", "a", "a"])
+        y_pred = np.array(["a", "b", "b", "a", "c", "c", "b", "a"])
+        perm_block = np.stack([np.random.default_rng(i).permutation(8) for i in range(5)])
+        metric = partial(f1_score, average="macro")
+        batched = resolve_batched_metric(metric).prepare(y, y_pred)
+        np.testing.assert_allclose(
+            batched.evaluate(perm_block), _reference(metric, y, y_pred, perm_block)
+        )
+
+
+class TestRankAUC:
+    """Rank-sum AUC kernel must agree with roc_auc_score."""
+
+    def test_matches_sklearn_with_ties(self, binary_labels):
+        y, _, perm_block = binary_labels
+        scores = np.round(np.random.default_rng(2).random(len(y)), 1)  # many ties
+        batched = resolve_batched_metric(roc_auc_score).prepare(y, scores)
+        assert batched.family == "rank"
+        np.testing.assert_allclose(
+            batched.evaluate(perm_block), _reference(roc_auc_score, y, scores, perm_block)
+        )
+        assert batched.observed() == pytest.approx(roc_auc_score(y, scores))
+
+    def test_positive_column_of_proba(self, binary_labels):
+        y, _, perm_block = binary_labels
+        p1 = np.random.default_rng(3).random(len(y))
+        proba = np.column_stack([1 - p1, p1])
+        batched = resolve_batched_metric(roc_auc_positive).prepare(y, proba)
+        np.testing.assert_allclose(
+            batched.evaluate(perm_block), _reference(roc_auc_positive, y, proba, perm_block)
+        )
+
+    def test_string_labels_use_greater_label(self):
+        y = np.array(["neg", "pos", "pos", "neg", "pos", "neg"])
+        scores = np.array([0.1, 0.8, 0.3, 0.4, 0.9, 0.2])
+        batched = resolve_batched_metric(roc_auc_score).prepare(y, scores)
+        assert batched.observed() == pytest.approx(roc_auc_score(y, scores))
+
+    def test_multiclass_not_supported(self, multiclass_labels):
+        y, _, _ = multiclass_labels
+        scores = np.random.default_rng(4).random(len(y))
+        assert resolve_batched_metric(roc_auc_score).prepare(y, scores) is None
+
+
+class TestLinearMetrics:
+    """Linear-in-labels kernels must agree with per-call metrics."""
+
+    @pytest.mark.parametrize("metric", [mean_squared_error, r2_score, pearson_r])
+    def test_regression(self, metric):
+        rng = np.random.default_rng(5)
+        y = rng.normal(size=200)
+        y_pred = y + rng.normal(size=200)
+        perm_block = np.stack([rng.permutation(200) for _ in range(20)])
+        batched = resolve_batched_metric(metric).prepare(y, y_pred)
+        assert batched.family == "linear"
+        np.testing.assert_allclose(
+            batched.evaluate(perm_block), _reference(metric, y, y_pred, perm_block)
+        )
+
+    @pytest.mark.parametrize("metric", [brier_score_loss, log_loss])
+    def test_scoring_rules(self, binary_labels, metric):
+        y, _, perm_block = binary_labels
+        p1 = np.random.default_rng(6).random(len(y))
+        batched = resolve_batched_metric(metric).prepare(y, p1)
+        np.testing.assert_allclose(
+            batched.evaluate(perm_block), _reference(metric, y, p1, perm_block)
+        )
+
+    def test_log_loss_on_predict_proba(self, binary_labels):
+        y, _, perm_block = binary_labels
+        p1 = np.random.default_rng(7).random(len(y))
+        proba = np.column_stack([1 - p1, p1])
+        batched = resolve_batched_metric(log_loss).prepare(y, proba)
+        np.testing.assert_allclose(
+            batched.evaluate(perm_block), _reference(log_loss, y, proba, perm_block)
+        )
+
+    def test_constant_predictions_fall_back(self):
+        y = np.arange(10, dtype=float)
+        assert resolve_batched_metric(pearson_r).prepare(y, np.ones(10)) is None
+
+
+class TestResolution:
+    """Metric recognition and fallback."""
+
+    def test_confusion_counts(self):
+        block = np.array([[0, 1, 1], [1, 0, 0]])
+        C = confusion_counts(block, np.array([0, 1, 0]), 2)
+        np.testing.assert_array_equal(C[0], [[1, 0], [1, 1]])
+        np.testing.assert_array_equal(C[1], [[1, 1], [1, 0]])
+
+    def test_lambda_not_recognized(self):
+        assert resolve_batched_metric(lambda yt, yp: accuracy_score(yt, yp)) is None
+
+    def test_unsupported_kwargs_not_recognized(self):
+        assert resolve_batched_metric(partial(f1_score, average="samples")) is None
+        assert resolve_batched_metric(partial(accuracy_score, sample_weight=None)) is None
+
+    def test_binary_average_on_multiclass_falls_back(self, multiclass_labels):
+        y, y_pred, _ = multiclass_labels
+        assert resolve_batched_metric(f1_score).prepare(y, y_pred) is None
+
+    def test_probability_outputs_fall_back(self, binary_labels):
+        y, _, _ = binary_labels
+        proba = np.random.default_rng(0).random((len(y), 2))
+        assert resolve_batched_metric(accuracy_score).prepare(y, proba) is None
+
+
+class TestDetectBiasRouting:
+    """detect_bias routes recognized metrics to the batched engine."""
+
+    @pytest.fixture
+    def fitted(self):
+        X, y = make_classification(n_samples=200, n_features=8, random_state=42)
+        model = LogisticRegression(max_iter=1000).fit(X, y)
+        return model, X, y
+
+    def test_batched_matches_per_call(self, fitted):
+        model, X, y = fitted
+        fast = detect_bias(model, X, y, accuracy_score, n_permutations=100,
+                           random_state=0, return_permutations=True)
+        slow = detect_bias(model, X, y, lambda yt, yp: accuracy_score(yt, yp),
+                           n_permutations=100, random_state=0, return_permutations=True)
+        assert fast["metric_engine"] == "batched"
+        assert slow["metric_engine"] == "per_call"
+        np.testing.assert_allclose(fast["permuted_metrics"], slow["permuted_metrics"])
+        assert fast["p_value"] == slow["p_value"]
+        assert fast["observed_metric"] == slow["observed_metric"]
+
+    def test_auc_with_proba_is_batched(self, fitted):
+        model, X, y = fitted
+        result = detect_bias(model, X, y, roc_auc_positive, n_permutations=100,
+                             allow_proba=True, random_state=0)
+        assert result["metric_engine"] == "batched"
+        assert result["observed_metric"] == pytest.approx(
+            roc_auc_score(y, model.predict_proba(X)[:, 1]))
+
+    def test_regression_continuous_target(self):
+        X, y = make_regression(n_samples=200, n_features=5, noise=1.0, random_state=0)
+        model = LinearRegression().fit(X, y)
+        result = detect_bias(model, X, y, r2_score, n_permutations=200, random_state=0)
+        assert result["metric_engine"] == "batched"
+        assert result["n_classes"] is None
+        assert result["p_value"] < 0.05
+
+    @pytest.mark.parametrize("metric,estimator,allow_proba", [
+        (mean_squared_error, LinearRegression(), False),
+        (log_loss, LogisticRegression(), True),
+    ])
+    def test_losses_are_tested_towards_smaller_values(self, metric, estimator, allow_proba):
+        X, y = make_classification(n_samples=200, n_features=5, random_state=0)
+        model = estimator.fit(X, y)
+        kwargs = dict(n_permutations=200, random_state=0, allow_proba=allow_proba)
+        result = detect_bias(model, X, y, metric, **kwargs)
+        assert result["metric_engine"] == "batched"
+        assert result["greater_is_better"] is False
+        assert result["p_value"] < 0.01
+        scored = detect_bias(model, X, y, lambda a, b: -metric(a, b), **kwargs)
+        assert scored["p_value"] == result["p_value"]
+
+    def test_retrain_uses_per_call(self, fitted):
+        model, X, y = fitted
+        result = detect_bias(model, X, y, accuracy_score, n_permutations=5,
+                             null_method="retrain", random_state=0)
+        assert result["metric_engine"] == "per_call"
+
+
+def test_label_codes_use_compact_dtype():
+    y = np.array([0, 1, 1, 0])
+    _, true_codes, pred_codes = encode_labels(y, y[::-1])
+    assert true_codes.dtype == np.uint8 and pred_codes.dtype == np.uint8
+    many = np.arange(300)
+    assert encode_labels(many, many)[1].dtype == np.uint16
+    assert code_dtype(256) == np.uint8 and code_dtype(257) == np.uint16
+
+
+def test_confusion_counts_in_key_buffer_passes(monkeypatch):
+    from cbd import fast_metrics
+    rng = np.random.default_rng(0)
+    block = rng.integers(0, 3, size=(7, 50)).astype(np.uint8)
+    pred = rng.integers(0, 3, size=50).astype(np.uint8)
+    expected = confusion_counts(block, pred, 3)
+    monkeypatch.setattr(fast_metrics, "MAX_KEY_ELEMENTS", 60)
+    np.testing.assert_array_equal(confusion_counts(block, pred, 3), expected)
+    assert expected[0].sum() == 50
@@ -0,0 +1,68 @@
+"""Tests for the zero-copy input path and peak memory of cbd.detect_bias."""
+import tracemalloc
+
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.metrics import accuracy_score
+
+from cbd.api import detect_bias
+
+
+@pytest.fixture
+def labels():
+    rng = np.random.default_rng(0)
+    n = 200_000
+    return rng.integers(0, 2, n), rng.integers(0, 2, n)
+
+
+def _tfidf_like(n, n_features=1_000_000, rng=None):
+    # One stored value per row: a 200k x 1M CSR matrix that would be 800 GB dense
+    rng = rng or np.random.default_rng(1)
+    return sparse.csr_matrix(
+        (rng.random(n).astype(np.float32), rng.integers(0, n_features, n).astype(np.int32),
+         np.arange(n + 1, dtype=np.int32)),
+        shape=(n, n_features),
+    )
+
+
+def test_sparse_input_reaches_predict_without_copy(labels, stored_predictor):
+    y, y_pred = labels
+    X = _tfidf_like(len(y))
+    model = stored_predictor(y_pred, by_row_id=False)
+    detect_bias(model, X, y, accuracy_score, n_permutations=10, random_state=0)
+    assert model.seen is X
+
+
+def test_float32_dense_input_is_preserved(stored_predictor):
+    rng = np.random.default_rng(0)
+    X = rng.random((500, 4)).astype(np.float32)
+    y = rng.integers(0, 2, 500)
+    model = stored_predictor(y, by_row_id=False)
+    detect_bias(model, X, y, accuracy_score, n_permutations=10, random_state=0)
+    assert model.seen is X and model.seen.dtype == np.float32
+
+
+def test_subsample_keeps_sparse_rows(labels, stored_predictor):
+    y, y_pred = labels
+    X = _tfidf_like(len(y)).tocoo()
+    model = stored_predictor(y_pred, by_row_id=False)
+    result = detect_bias(model, X, y, accuracy_score, n_permutations=10, random_state=0,
+                         subsample_size=1000)
+    assert result["n_samples"] == 1000
+    assert sparse.issparse(model.seen) and model.seen.format == "csr"
+    assert model.seen.dtype == np.float32
+
+
+def test_peak_memory_is_bounded(labels, stored_predictor):
+    # Documented bound: about 30 MB for permutation blocks plus tens of bytes per sample
+    y, y_pred = labels
+    X = _tfidf_like(len(y))
+    tracemalloc.start()
+    try:
+        detect_bias(stored_predictor(y_pred, by_row_id=False), X, y, accuracy_score,
+                    n_permutations=100, random_state=0)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 30e6 + 64 * len(y)
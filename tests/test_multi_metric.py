@@ -0,0 +1,116 @@
+"""Tests for the single-pass multi-metric test (cbd.multi_metric)."""
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, f1_score, log_loss
+
+from cbd import detect_bias, detect_bias_multi
+from cbd.fast_metrics import roc_auc_positive
+
+
+class CountingModel:
+    """Wraps a fitted estimator and counts inference calls."""
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self.calls = {"predict": 0, "predict_proba": 0}
+
+    def predict(self, X):
+        self.calls["predict"] += 1
+        return self.estimator.predict(X)
+
+    def predict_proba(self, X):
+        self.calls["predict_proba"] += 1
+        return self.estimator.predict_proba(X)
+
+
+def _plain_accuracy(y_true, y_pred):
+    return float(np.mean(np.asarray(y_true) == np.asarray(y_pred)))
+
+
+METRICS = {
+    "accuracy": accuracy_score,
+    "f1": f1_score,
+    "auc": roc_auc_positive,
+    "neg_log_loss": lambda y_true, proba: -log_loss(y_true, proba, labels=[0, 1]),
+    "plain_accuracy": _plain_accuracy,
+}
+PROBA = ["auc", "neg_log_loss"]
+
+
+def test_single_inference_pass_and_null_matrix(fitted_classifier):
+    X, y, estimator = fitted_classifier
+    model = CountingModel(estimator)
+    result = detect_bias_multi(model, X, y, METRICS, n_permutations=50,
+                               random_state=0, proba_metrics=PROBA)
+    assert model.calls == {"predict": 1, "predict_proba": 1}
+    assert result["inference_calls"] == {"predict": 1, "predict_proba": 1}
+    assert result["metric_names"] == list(METRICS)
+    assert result["null_matrix"].shape == (50, 5)
+    assert result["metrics"]["accuracy"]["metric_engine"] == "batched"
+    assert result["metrics"]["neg_log_loss"]["metric_engine"] == "per_call"
+    assert result["metrics"]["auc"]["uses_proba"]
+    # Rows share one permutation: batched and per-call accuracy agree
+    np.testing.assert_allclose(result["null_matrix"][:, 0], result["null_matrix"][:, 4])
+
+
+@pytest.mark.parametrize("name", ["accuracy", "auc", "plain_accuracy"])
+def test_matches_detect_bias(fitted_classifier, name):
+    X, y, model = fitted_classifier
+    multi = detect_bias_multi(model, X, y, METRICS, n_permutations=40,
+                              random_state=7, proba_metrics=PROBA)
+    single = detect_bias(model, X, y, METRICS[name], n_permutations=40, random_state=7,
+                         allow_proba=name in PROBA, return_permutations=True)
+    column = multi["null_matrix"][:, multi["metric_names"].index(name)]
+    np.testing.assert_allclose(column, single["permuted_metrics"])
+    assert multi["metrics"][name]["p_value"] == single["p_value"]
+
+
+def test_parallel_matches_sequential(fitted_classifier):
+    X, y, model = fitted_classifier
+    seq = detect_bias_multi(model, X, y, METRICS, n_permutations=30,
+                            random_state=1, proba_metrics=PROBA)
+    par = detect_bias_multi(model, X, y, METRICS, n_permutations=30, random_state=1,
+                            proba_metrics=PROBA, n_jobs=2, chunk_size=4)
+    np.testing.assert_array_equal(seq["null_matrix"], par["null_matrix"])
+
+
+def test_labels_only_skips_predict_proba(fitted_classifier):
+    X, y, estimator = fitted_classifier
+    model = CountingModel(estimator)
+    detect_bias_multi(model, X, y, {"accuracy": accuracy_score}, n_permutations=5)
+    assert model.calls == {"predict": 1, "predict_proba": 0}
+
+
+def test_invalid_arguments(fitted_classifier):
+    X, y, model = fitted_classifier
+    with pytest.raises(ValueError, match="at least one"):
+        detect_bias_multi(model, X, y, {})
+    with pytest.raises(ValueError, match="proba_metrics"):
+        detect_bias_multi(model, X, y, {"accuracy": accuracy_score}, proba_metrics=["auc"])
+    with pytest.raises(ValueError, match="2 unique classes"):
+        detect_bias_multi(model, X, np.zeros(len(y)), {"accuracy": accuracy_score})
+
+
+def test_losses_oriented_like_scores(fitted_classifier):
+    X, y, model = fitted_classifier
+    result = detect_bias_multi(
+        model, X, y, {"log_loss": log_loss, "neg_log_loss": METRICS["neg_log_loss"],
+                      "custom_loss": lambda a, b: 1 - accuracy_score(a, b)},
+        n_permutations=100, random_state=0, proba_metrics=["log_loss", "neg_log_loss"],
+        lower_is_better=["custom_loss"])
+    metrics = result["metrics"]
+    assert not metrics["log_loss"]["greater_is_better"]
+    assert metrics["log_loss"]["p_value"] == metrics["neg_log_loss"]["p_value"] < 0.05
+    assert metrics["custom_loss"]["p_value"] < 0.05
+
+
+def test_float32_input_is_not_copied(fitted_classifier, monkeypatch):
+    X, y, model = fitted_classifier
+    X32 = np.asarray(X, dtype=np.float32)
+    seen = []
+    predict = model.predict
+    monkeypatch.setattr(model, "predict", lambda X_: seen.append(X_) or predict(X_),
+                        raising=False)
+    detect_bias_multi(model, X32, y, {"accuracy": accuracy_score}, n_permutations=10,
+                      random_state=0)
+    assert seen[0] is X32
@@ -0,0 +1,174 @@
+"""Tests for the precomputed permutation-null tables (cbd.null_tables)."""
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, f1_score, matthews_corrcoef, roc_auc_score
+
+from cbd.api import detect_bias
+from cbd.fast_metrics import resolve_batched_metric, roc_auc_positive
+from cbd.null_tables import (NullTables, generate_null_tables, grid_class_counts,
+                             load_null_tables, main, null_moments)
+from cbd.thresholds import detect_bias_fast
+
+
+@pytest.fixture(scope="module")
+def small_tables():
+    return generate_null_tables(n_grid=(50, 200), balance_grid=(0.5, 1.0), class_grid=(2, 3),
+                                n_permutations=20000, random_state=0)
+
+
+def _permuted(metric, y, y_pred, rng, n=20000):
+    block = np.argsort(rng.random((n, len(y))), axis=1)
+    return resolve_batched_metric(metric).prepare(y, y_pred).evaluate(block)
+
+
+def _noisy(y, rng, keep, n_classes=2):
+    return np.where(rng.random(len(y)) < keep, y, rng.integers(0, n_classes, len(y)))
+
+
+@pytest.mark.parametrize("name,metric,scores", [
+    ("accuracy", accuracy_score, False),
+    ("f1", f1_score, False),
+    ("auc", roc_auc_score, True),
+])
+def test_moments_match_permutations(name, metric, scores):
+    rng = np.random.default_rng(0)
+    y = (rng.random(60) < 0.3).astype(int)
+    y_pred = np.round(rng.random(60), 1) if scores else (rng.random(60) < 0.5).astype(int)
+    values = _permuted(metric, y, y_pred, rng)
+    moments = null_moments(name, y, y_pred)
+    assert moments["mean"] == pytest.approx(values.mean(), abs=3 * values.std() / 100)
+    assert moments["std"] == pytest.approx(values.std(), rel=0.03)
+
+
+def test_multiclass_accuracy_moments():
+    rng = np.random.default_rng(1)
+    y = rng.integers(0, 4, 40)
+    y_pred = rng.integers(0, 3, 40)
+    values = _permuted(accuracy_score, y, y_pred, rng)
+    moments = null_moments("accuracy", y, y_pred)
+    assert moments["std"] == pytest.approx(values.std(), rel=0.03)
+    assert moments["n_classes"] == 4
+    assert null_moments("f1", y, y_pred) is None
+
+
+def test_grid_class_counts():
+    counts = grid_class_counts(100, 3, 0.3)
+    assert counts.sum() == 100 and counts[0] == 10
+    assert grid_class_counts(20, 5, 0.1)[0] == 1
+
+
+@pytest.mark.parametrize("n,keep", [(120, 0.15), (120, 0.3), (80, 0.0)])
+def test_p_value_matches_permutation_test(small_tables, n, keep, stored_predictor):
+    rng = np.random.default_rng(n + int(100 * keep))
+    y = (rng.random(n) < 0.4).astype(int)
+    y_pred = _noisy(y, rng, keep)
+    reference = detect_bias(stored_predictor(y_pred), np.arange(n).reshape(-1, 1), y,
+                            accuracy_score, n_permutations=20000, random_state=0)["p_value"]
+    lookup = small_tables.p_value("accuracy", y, y_pred, accuracy_score(y, y_pred))
+    assert lookup["p_value"] == pytest.approx(reference, rel=0.35, abs=0.01)
+
+
+def test_outside_grid_and_degenerate(small_tables):
+    y = np.array([0, 1] * 20)
+    assert small_tables.p_value("accuracy", y, y, 1.0) is None  # n=40 < 50
+    y = np.array([0, 1] * 50)
+    constant = np.zeros(100, dtype=int)
+    assert small_tables.p_value("accuracy", y, constant, 0.5)["p_value"] == 1.0
+    assert small_tables.p_value("auc", np.arange(100) % 3, np.arange(100.0), 0.5) is None
+
+
+def test_save_load_roundtrip(small_tables, tmp_path):
+    path = tmp_path / "tables.npz"
+    small_tables.save(path)
+    loaded = NullTables.load(path)
+    assert loaded.metrics == small_tables.metrics
+    np.testing.assert_allclose(loaded.quantiles["accuracy"], small_tables.quantiles["accuracy"],
+                               rtol=1e-6)
+
+
+def test_missing_tables_warn(tmp_path):
+    with pytest.warns(UserWarning, match="could not be loaded"):
+        assert load_null_tables(tmp_path / "missing.npz") is None
+
+
+def test_generator_command(tmp_path):
+    path = tmp_path / "out" / "tables.npz"
+    main(["--output", str(path), "--n-permutations", "500", "--n-grid", "20", "50",
+          "--balance-grid", "0.5", "1.0", "--class-grid", "2", "--metrics", "accuracy"])
+    tables = NullTables.load(path)
+    assert tables.metrics == ("accuracy",) and tables.n_permutations == 500
+
+
+def test_shipped_tables_cover_grid():
+    tables = load_null_tables()
+    assert tables is not None
+    assert set(tables.metrics) == {"accuracy", "f1", "auc"}
+    assert tables.covers("accuracy", 750, 4, 0.5)
+    assert tables.covers("auc", 300, 2, 0.25)
+    assert not tables.covers("f1", 300, 3, 0.5)
+    assert not tables.covers("accuracy", 50000, 2, 1.0)
+
+
+class TestDetectBiasFast:
+    """detect_bias_fast interpolates real p-values from the shipped tables."""
+
+    @pytest.mark.parametrize("metric,keep", [
+        (accuracy_score, 0.2), (f1_score, 0.25), (accuracy_score, 0.0)])
+    def test_agrees_with_permutation_test(self, metric, keep, stored_predictor):
+        rng = np.random.default_rng(7)
+        y = (rng.random(300) < 0.35).astype(int)
+        y_pred = _noisy(y, rng, keep)
+        X = np.arange(300).reshape(-1, 1)
+        fast = detect_bias_fast(stored_predictor(y_pred), X, y, metric)
+        reference = detect_bias(stored_predictor(y_pred), X, y, metric,
+                                n_permutations=20000, random_state=0)["p_value"]
+        assert fast["mode"] == "precomputed"
+        assert fast["p_value"] == pytest.approx(reference, rel=0.35, abs=0.01)
+        assert fast["computation_time"] < 0.5
+
+    def test_auc_with_proba(self, stored_predictor):
+        rng = np.random.default_rng(8)
+        y = rng.integers(0, 2, 400)
+        p1 = np.clip(0.5 + 0.1 * (y - 0.5) + rng.normal(0, 0.3, 400), 0, 1)
+        model = stored_predictor(np.column_stack([1 - p1, p1]))
+        X = np.arange(400).reshape(-1, 1)
+        fast = detect_bias_fast(model, X, y, roc_auc_positive, allow_proba=True)
+        reference = detect_bias(model, X, y, roc_auc_positive, allow_proba=True,
+                                n_permutations=20000, random_state=0)["p_value"]
+        assert fast["metric_name"] == "auc"
+        assert fast["p_value"] == pytest.approx(reference, rel=0.35, abs=0.01)
+
+    def test_strong_signal_is_bounded(self, stored_predictor):
+        y = np.array([0, 1] * 500)
+        fast = detect_bias_fast(stored_predictor(y), np.arange(1000).reshape(-1, 1), y,
+                                accuracy_score)
+        assert fast["null_table"]["p_value_is_bound"]
+        assert fast["p_value"] <= 0.001
+
+    def test_falls_back_outside_grid(self, stored_predictor):
+        y = np.array([0, 1] * 5)
+        result = detect_bias_fast(stored_predictor(y), np.arange(10).reshape(-1, 1), y,
+                                  accuracy_score, n_permutations_fallback=30)
+        assert result["mode"] == "quick_permutation"
+        assert result["fallback_reason"] == "data outside the null table grid"
+
+    def test_untabulated_metric_falls_back(self, stored_predictor):
+        y = np.array([0, 1, 1] * 40)
+        result = detect_bias_fast(stored_predictor(y), np.arange(120).reshape(-1, 1), y,
+                                  lambda a, b: float(np.mean(a == b)), metric_name="mcc",
+                                  n_permutations_fallback=30)
+        assert result["fallback_reason"] == "metric has no null table"
+
+    def test_unrecognized_callable_needs_explicit_name(self, stored_predictor):
+        rng = np.random.default_rng(9)
+        y = rng.integers(0, 2, 300)
+        y_pred = _noisy(y, rng, 0.2)
+        X = np.arange(300).reshape(-1, 1)
+        mcc = lambda a, b: matthews_corrcoef(a, b)  # noqa: E731
+        result = detect_bias_fast(stored_predictor(y_pred), X, y, mcc,
+                                  n_permutations_fallback=30)
+        assert result["mode"] == "quick_permutation"
+        assert result["fallback_reason"] == "metric has no null table"
+        named = detect_bias_fast(stored_predictor(y_pred), X, y,
+                                 lambda a, b: accuracy_score(a, b), metric_name="accuracy")
+        assert named["mode"] == "precomputed"
@@ -24,6 +24,21 @@ def ccs_wrapper(perf, const):
     return compute_ccs(const)
 
 
+class MemmapProbe:
+    """Predicts 1.0 everywhere when fitted and evaluated on memory-mapped X."""
+    
+    def fit(self, X, y):
+        self.shared_ = isinstance(X, np.memmap)
+        return self
+    
+    def predict(self, X):
+        return np.full(X.shape[0], float(self.shared_ and isinstance(X, np.memmap)))
+
+
+def mean_prediction(y_true, y_pred):
+    return float(np.mean(y_pred))
+
+
 class TestPermutationTest:
     """Tests for basic permutation testing."""
     
@@ -107,6 +122,22 @@ class TestPermutationTest:
         assert results['n_permutations'] <= 50
         assert 0 <= results['p_value'] <= 1
     
+    def test_permutation_test_executor(self):
+        """Test that an executor gives the same null as sequential execution."""
+        from concurrent.futures import ProcessPoolExecutor
+        np.random.seed(42)
+        perf = np.random.rand(10, 3)
+        const = np.random.rand(10, 2)
+        
+        sequential = permutation_test(perf, const, psi_wrapper, n_permutations=40, random_seed=7)
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            results = permutation_test(
+                perf, const, psi_wrapper, n_permutations=40, random_seed=7, executor=pool
+            )
+        
+        np.testing.assert_array_equal(results['permuted_values'], sequential['permuted_values'])
+        assert results['p_value'] == sequential['p_value']
+    
     def test_permutation_test_different_metrics(self):
         """Test with different metric functions."""
         np.random.seed(42)
@@ -257,6 +288,119 @@ class TestRetrainNullTest:
         )
         
         assert results['n_permutations'] <= 10
+    
+    def test_retrain_null_executor(self):
+        """Test retrain-null on a concurrent.futures executor."""
+        pytest.importorskip('sklearn')
+        from concurrent.futures import ThreadPoolExecutor
+        from functools import partial
+        from sklearn.tree import DecisionTreeClassifier
+        from sklearn.metrics import accuracy_score
+        from sklearn.datasets import make_classification
+        
+        X, y = make_classification(n_samples=80, n_features=5, random_state=0)
+        args = (X[:60], y[:60], X[60:], y[60:],
+                partial(DecisionTreeClassifier, max_depth=3, random_state=0), accuracy_score)
+        
+        sequential = retrain_null_test(*args, n_permutations=8, random_seed=3)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = retrain_null_test(*args, n_permutations=8, random_seed=3, executor=pool)
+        
+        np.testing.assert_array_equal(results['permuted_values'], sequential['permuted_values'])
+    
+    def test_retrain_null_inner_threads(self):
+        """Test that inner_threads limits native threads and reports the layout."""
+        pytest.importorskip('sklearn')
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.metrics import accuracy_score
+        from sklearn.datasets import make_classification
+        
+        X, y = make_classification(n_samples=80, n_features=5, random_state=0)
+        args = (X[:60], y[:60], X[60:], y[60:], LogisticRegression, accuracy_score)
+        
+        sequential = retrain_null_test(*args, n_permutations=6, random_seed=1)
+        assert 'thread_layout' not in sequential
+        results = retrain_null_test(*args, n_permutations=6, random_seed=1, n_jobs=2,
+                                    backend='processes', inner_threads=1)
+        
+        np.testing.assert_allclose(results['permuted_values'], sequential['permuted_values'])
+        assert results['thread_layout']['threads_per_worker'] == 1
+        assert results['thread_layout']['scope'] == 'worker'
+    
+    def test_retrain_null_checkpoint_resume(self, tmp_path, monkeypatch):
+        """Test resuming an interrupted retrain-null run from its checkpoint."""
+        pytest.importorskip('sklearn')
+        from sklearn.tree import DecisionTreeClassifier
+        from sklearn.metrics import accuracy_score
+        from sklearn.datasets import make_classification
+        from cbd.checkpoint import PermutationCheckpoint
+        
+        X, y = make_classification(n_samples=80, n_features=5, random_state=42)
+        args = (X[:60], y[:60], X[60:], y[60:],
+                lambda: DecisionTreeClassifier(max_depth=3, random_state=0), accuracy_score)
+        kwargs = dict(n_permutations=12, checkpoint=tmp_path / "null", checkpoint_every=4)
+        
+        # Pre-empt the run after its second checkpoint
+        original_save = PermutationCheckpoint.save
+        
+        def preempted_save(self, arrays, **state):
+            original_save(self, arrays, **state)
+            if self.n_saves == 2:
+                raise KeyboardInterrupt
+        
+        monkeypatch.setattr(PermutationCheckpoint, 'save', preempted_save)
+        with pytest.raises(KeyboardInterrupt):
+            retrain_null_test(*args, **kwargs)
+        monkeypatch.setattr(PermutationCheckpoint, 'save', original_save)
+        
+        # Unseeded: the resumed run reuses the seed recorded by the first run
+        resumed = retrain_null_test(*args, **kwargs)
+        assert resumed['checkpoint']['resumed_from'] == 8
+        assert resumed['n_permutations'] + resumed['n_failed'] == 12
+        
+        import json
+        recorded = json.loads(open(resumed['checkpoint']['path']).read())['random_seed']
+        uninterrupted = retrain_null_test(*args, n_permutations=12, random_seed=recorded)
+        np.testing.assert_array_equal(resumed['permuted_values'], uninterrupted['permuted_values'])
+    
+    def test_retrain_null_shares_X_with_processes(self, monkeypatch):
+        """Test that process workers fit on memory-mapped X written once per run."""
+        from cbd import scheduler
+        monkeypatch.setattr(scheduler, 'MIN_SHARED_BYTES', 0)
+        X = np.random.RandomState(0).rand(40, 3)
+        y = np.arange(40) % 2
+        
+        results = retrain_null_test(X[:30], y[:30], X[30:], y[30:], MemmapProbe, mean_prediction,
+                                    n_permutations=4, random_seed=0, n_jobs=2)
+        assert np.all(results['permuted_values'] == 1.0)
+        
+        sequential = retrain_null_test(X[:30], y[:30], X[30:], y[30:], MemmapProbe, mean_prediction,
+                                       n_permutations=4, random_seed=0)
+        assert np.all(sequential['permuted_values'] == 0.0)
+    
+    def test_retrain_null_shared_folder_removed_on_failure(self, tmp_path, monkeypatch):
+        """Test that the shared-memory folder is deleted when the run fails."""
+        from cbd import scheduler
+        from cbd.checkpoint import PermutationCheckpoint
+        monkeypatch.setattr(scheduler, 'MIN_SHARED_BYTES', 0)
+        folders = []
+        make_folder = scheduler._shared_folder
+        monkeypatch.setattr(scheduler, '_shared_folder',
+                            lambda: folders.append(make_folder()) or folders[-1])
+        
+        def failing_save(self, arrays, **state):
+            raise KeyboardInterrupt
+        
+        monkeypatch.setattr(PermutationCheckpoint, 'save', failing_save)
+        X = np.random.RandomState(0).rand(40, 3)
+        y = np.arange(40) % 2
+        with pytest.raises(KeyboardInterrupt):
+            retrain_null_test(X[:30], y[:30], X[30:], y[30:], MemmapProbe, mean_prediction,
+                              n_permutations=4, random_seed=0, n_jobs=2,
+                              checkpoint=tmp_path / 'null')
+        assert len(folders) == 1
+        import os
+        assert not os.path.exists(folders[0])
 
 
 class TestAdaptivePermutationTest:
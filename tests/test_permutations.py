@@ -0,0 +1,199 @@
+"""Tests for the streaming permutation generator (cbd.permutations)."""
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score
+
+from cbd.api import detect_bias
+from cbd.multivariate_detection import detect_multivariate_bias
+from cbd.permutations import (
+    PermutationStream, STREAM_BLOCK, as_seed_sequence, spawn_child, index_dtype,
+    grouped_permutations, permute_within_groups
+)
+
+
+def _collect(stream, chunk_size, start=0, stop=None):
+    blocks = list(stream.chunks(chunk_size, start, stop))
+    return np.concatenate(blocks) if blocks else np.empty((0, stream.n_samples))
+
+
+def test_chunks_are_permutations():
+    stream = PermutationStream(50, 20, random_state=0)
+    perms = _collect(stream, 7)
+    assert perms.shape == (20, 50)
+    assert perms.dtype == np.int32
+    for row in perms:
+        np.testing.assert_array_equal(np.sort(row), np.arange(50))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, STREAM_BLOCK, STREAM_BLOCK + 1, 500])
+def test_stream_independent_of_chunk_size(chunk_size):
+    stream = PermutationStream(30, 200, random_state=42)
+    reference = _collect(stream, 200)
+    np.testing.assert_array_equal(_collect(stream, chunk_size), reference)
+
+
+def test_ranges_can_be_regenerated_independently():
+    stream = PermutationStream(25, 300, random_state=7)
+    reference = _collect(stream, 300)
+    # Ranges starting inside a stream block skip ahead within that block
+    for start, stop in [(0, 10), (5, 70), (STREAM_BLOCK, 2 * STREAM_BLOCK + 3), (290, 300)]:
+        np.testing.assert_array_equal(stream.take(start, stop), reference[start:stop])
+
+
+def test_block_seeds_match_seed_sequence_spawn():
+    root = np.random.SeedSequence(123)
+    children = np.random.SeedSequence(123).spawn(3)
+    for j, child in enumerate(children):
+        assert spawn_child(root, j).generate_state(4).tolist() == child.generate_state(4).tolist()
+
+    stream = PermutationStream(40, 2 * STREAM_BLOCK, random_state=123)
+    expected = np.arange(40)
+    np.random.default_rng(children[1]).shuffle(expected)
+    np.testing.assert_array_equal(stream.take(STREAM_BLOCK, STREAM_BLOCK + 1)[0], expected)
+
+
+def test_seeds_and_integers_agree():
+    a = _collect(PermutationStream(20, 10, random_state=5), 10)
+    b = _collect(PermutationStream(20, 10, random_state=as_seed_sequence(5)), 10)
+    c = _collect(PermutationStream(20, 10, random_state=6), 10)
+    np.testing.assert_array_equal(a, b)
+    assert not np.array_equal(a, c)
+
+
+def test_grouped_stream_preserves_groups():
+    groups = np.array([0] * 10 + [1] * 15 + [2])
+    stream = PermutationStream(len(groups), 40, random_state=1, groups=groups)
+    perms = _collect(stream, 9)
+    for row in perms:
+        np.testing.assert_array_equal(groups[row], groups)
+    # The singleton group never moves
+    assert np.all(perms[:, -1] == len(groups) - 1)
+    np.testing.assert_array_equal(_collect(stream, 40), perms)
+
+
+def test_grouped_permutations_block():
+    rng = np.random.default_rng(0)
+    groups = rng.integers(0, 7, 60)
+    _, codes = np.unique(groups, return_inverse=True)
+    perms = grouped_permutations(codes, rng.random((500, 60)))
+    assert perms.shape == (500, 60)
+    for row in perms:
+        np.testing.assert_array_equal(np.sort(row), np.arange(60))
+        np.testing.assert_array_equal(groups[row], groups)
+    # Every member of a group reaches every position of that group
+    first = np.flatnonzero(codes == 0)[0]
+    members = np.flatnonzero(codes == 0)
+    assert set(perms[:, first]) == set(members)
+
+
+@pytest.mark.parametrize("n_groups", [3, 5000])
+def test_grouped_permutations_exact_for_any_group_count(n_groups):
+    rng = np.random.default_rng(3)
+    codes = np.repeat(np.arange(n_groups), 4)
+    keys = rng.random((20, len(codes)))
+    perms = grouped_permutations(codes, keys)
+    for row in perms:
+        np.testing.assert_array_equal(codes[row], codes)
+    # Same order as an exact (group, key) sort
+    order = np.argsort(codes, kind="stable")
+    expected = np.empty_like(perms)
+    expected[:, order] = np.lexsort((keys, np.broadcast_to(codes, keys.shape)), axis=-1)
+    np.testing.assert_array_equal(perms, expected)
+    # Keys are not swamped by large codes (group_code + key in float64 would be)
+    high = np.full(len(codes), 2 ** 60)
+    assert not np.all(grouped_permutations(high, keys) == np.arange(len(codes)))
+
+
+def test_permute_within_groups_string_groups():
+    groups = np.array(["a", "b", "a", "c", "b", "a"])
+    perms = permute_within_groups(groups, 20, np.random.default_rng(1))
+    for row in perms:
+        np.testing.assert_array_equal(groups[row], groups)
+    assert np.all(perms[:, 3] == 3)
+
+
+def test_grouped_stream_skip_ahead():
+    groups = np.repeat(np.arange(5), 8)
+    stream = PermutationStream(len(groups), 3 * STREAM_BLOCK, random_state=2, groups=groups)
+    reference = _collect(stream, 3 * STREAM_BLOCK)
+    np.testing.assert_array_equal(stream.take(70, 140), reference[70:140])
+
+
+def test_detect_bias_group_array(classification_data, stored_predictor):
+    X, y, y_pred = classification_data
+    groups = np.arange(len(y)) % 4
+    result = detect_bias(stored_predictor(y_pred), X, y, accuracy_score, n_permutations=20,
+                         random_state=0, stratify=groups)
+    assert result["stratified"] is True
+    with pytest.raises(ValueError):
+        detect_bias(stored_predictor(y_pred), X, y, accuracy_score, stratify=groups[:10])
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        PermutationStream(0, 10)
+    with pytest.raises(ValueError):
+        PermutationStream(10, 10, groups=[0, 1])
+    with pytest.raises(ValueError):
+        next(PermutationStream(10, 10).chunks(0))
+    assert index_dtype(10) == np.int32
+    assert index_dtype(2 ** 31) == np.int64
+
+
+@pytest.fixture
+def classification_data():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 3, 400)
+    y_pred = np.where(rng.random(400) < 0.6, y, rng.integers(0, 3, 400))
+    return np.arange(400).reshape(-1, 1), y, y_pred
+
+
+@pytest.mark.parametrize("stratify", [False, True])
+def test_detect_bias_independent_of_chunk_size(classification_data, stratify, stored_predictor):
+    X, y, y_pred = classification_data
+    model = stored_predictor(y_pred)
+    results = [
+        detect_bias(model, X, y, accuracy_score, n_permutations=150, random_state=3,
+                    return_permutations=True, stratify=stratify, chunk_size=chunk)
+        for chunk in (None, 1, 17, 150)
+    ]
+    for res in results[1:]:
+        np.testing.assert_array_equal(res["permuted_metrics"], results[0]["permuted_metrics"])
+        assert res["p_value"] == results[0]["p_value"]
+
+
+def test_detect_bias_per_call_metric_matches_batched(classification_data, stored_predictor):
+    X, y, y_pred = classification_data
+    model = stored_predictor(y_pred)
+
+    def plain_accuracy(y_true, y_hat):
+        return float(np.mean(np.asarray(y_true) == np.asarray(y_hat)))
+
+    batched = detect_bias(model, X, y, accuracy_score, n_permutations=80,
+                          random_state=9, return_permutations=True)
+    per_call = detect_bias(model, X, y, plain_accuracy, n_permutations=80,
+                           random_state=9, return_permutations=True, chunk_size=13,
+                           n_jobs=2)
+    assert per_call["metric_engine"] == "per_call"
+    np.testing.assert_allclose(per_call["permuted_metrics"], batched["permuted_metrics"])
+
+
+def test_detect_bias_rejects_bad_chunk_size(classification_data, stored_predictor):
+    X, y, y_pred = classification_data
+    with pytest.raises(ValueError, match="chunk_size"):
+        detect_bias(stored_predictor(y_pred), X, y, accuracy_score, chunk_size=0)
+
+
+def test_multivariate_uses_stream(classification_data, stored_predictor):
+    X, y, y_pred = classification_data
+    from sklearn.metrics import f1_score
+
+    def macro_f1(y_true, y_hat):
+        return f1_score(y_true, y_hat, average="macro")
+
+    res = detect_multivariate_bias(stored_predictor(y_pred), X, y, [accuracy_score, macro_f1],
+                                   n_permutations=60, random_state=4)
+    stream = PermutationStream(len(y), 60, random_state=4)
+    expected = [accuracy_score(y[p], y_pred) for p in stream.take(0, 60)]
+    mean_acc = res["individual_stats"]["Metric_1"]["mean_permuted"]
+    assert mean_acc == pytest.approx(np.mean(expected))
@@ -0,0 +1,117 @@
+"""Tests for progressive subsampling (cbd.progressive)."""
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score
+
+from cbd.api import detect_bias
+from cbd.progressive import NestedSampler
+
+
+@pytest.fixture
+def large():
+    rng = np.random.default_rng(0)
+    n = 200_000
+    y = (rng.random(n) < 0.3).astype(int)
+    return np.arange(n).reshape(-1, 1), y, rng
+
+
+def test_sampler_is_nested_without_replacement():
+    sampler = NestedSampler(1000, random_state=0)
+    first = sampler.grow(50)
+    second = sampler.grow(120)
+    assert len(first) == 50 and len(second) == 70
+    np.testing.assert_array_equal(sampler.indices[:50], first)
+    assert len(np.unique(sampler.indices)) == 120
+    rest = sampler.grow(1000)
+    np.testing.assert_array_equal(np.sort(sampler.indices), np.arange(1000))
+    assert len(rest) == 880
+
+
+def test_sampler_is_uniform():
+    counts = np.zeros(20)
+    for seed in range(2000):
+        counts[NestedSampler(20, random_state=seed).grow(5)] += 1
+    # Each index is selected with probability 1/4
+    assert np.all(np.abs(counts - 500) < 100)
+
+
+def test_sampler_keeps_class_shares():
+    strata = np.array([0] * 900 + [1] * 90 + [2] * 10)
+    sampler = NestedSampler(len(strata), strata, random_state=1)
+    sampler.grow(20)
+    np.testing.assert_array_equal(np.bincount(strata[sampler.indices]), [18, 1, 1])
+    sampler.grow(200)
+    np.testing.assert_array_equal(np.bincount(strata[sampler.indices]), [180, 18, 2])
+
+
+def test_sampler_rare_class_is_drawn_directly():
+    strata = np.zeros(2_000_000, dtype=np.int8)
+    strata[[5, 1_000_000, 1_999_999]] = 1
+    sampler = NestedSampler(len(strata), strata, random_state=2)
+    sampler.grow(1000)
+    sampler.grow(4000)
+    assert np.bincount(strata[sampler.indices]).tolist() == [3999, 1]
+    assert len(np.unique(sampler.indices)) == 4000
+
+
+def test_progressive_budget_covers_all_steps(large, monkeypatch, stored_predictor):
+    from cbd import api
+    X, y, rng = large
+    budgets = []
+    run = api.detect_bias
+
+    def recording(*args, **kwargs):
+        budgets.append(kwargs.get("time_budget_s"))
+        return run(*args, **kwargs)
+
+    monkeypatch.setattr(api, "detect_bias", recording)
+    result = run(stored_predictor(rng.integers(0, 2, len(y))), X, y, accuracy_score,
+                 n_permutations=100, random_state=0, progressive=True, subsample_size=200,
+                 time_budget_s=5.0)
+    assert len(budgets) == len(result["progressive"]["steps"]) >= 2
+    assert budgets[0] <= 5.0 and all(b < a for a, b in zip(budgets, budgets[1:]))
+
+
+def test_progressive_stops_when_decision_is_stable(large, stored_predictor):
+    X, y, rng = large
+    predictions = np.where(rng.random(len(y)) < 0.6, y, 1 - y)
+    model = stored_predictor(predictions)
+    result = detect_bias(model, X, y, accuracy_score, n_permutations=200, random_state=0,
+                         progressive=True, subsample_size=500)
+    steps = result["progressive"]["steps"]
+    assert result["progressive"]["stable"]
+    assert [s["n_samples"] for s in steps] == [500, 1000]
+    assert all(s["significant"] for s in steps)
+    assert result["n_samples"] == 1000 and result["subsampled"]
+    # Earlier predictions are reused: every row is predicted once
+    assert model.n_predicted == 1000
+
+
+def test_progressive_grows_until_stable_or_full(large, stored_predictor):
+    X, y, rng = large
+    n = 4000
+    result = detect_bias(stored_predictor(rng.integers(0, 2, n)), X[:n], y[:n], accuracy_score,
+                         n_permutations=100, random_state=3, progressive=True,
+                         subsample_size=100, progressive_growth=3.0)
+    sizes = [s["n_samples"] for s in result["progressive"]["steps"]]
+    assert sizes[0] == 100
+    assert all(b == min(3 * a, n) or b == n for a, b in zip(sizes, sizes[1:]))
+    decisions = [s["significant"] for s in result["progressive"]["steps"]]
+    assert result["progressive"]["stable"] == (len(decisions) > 1 and decisions[-1] == decisions[-2])
+
+
+def test_progressive_small_data_uses_all_rows(stored_predictor):
+    y = np.array([0, 1] * 30)
+    result = detect_bias(stored_predictor(y), np.arange(60).reshape(-1, 1), y, accuracy_score,
+                         n_permutations=50, random_state=0, progressive=True)
+    assert result["n_samples"] == 60 and not result["subsampled"]
+    assert len(result["progressive"]["steps"]) == 1
+
+
+def test_progressive_invalid_options(large, stored_predictor):
+    X, y, _ = large
+    model = stored_predictor(y)
+    with pytest.raises(ValueError, match="null_method"):
+        detect_bias(model, X, y, accuracy_score, null_method="retrain", progressive=True)
+    with pytest.raises(ValueError, match="progressive_growth"):
+        detect_bias(model, X, y, accuracy_score, progressive=True, progressive_growth=1.0)
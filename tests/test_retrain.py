@@ -0,0 +1,164 @@
+"""Tests for the retrain-null engine (cbd.retrain)."""
+import numpy as np
+import pytest
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import Lasso, LogisticRegression, SGDClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.neural_network import MLPClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from cbd import scheduler
+from cbd.api import detect_bias
+from cbd.permutations import PermutationStream
+from cbd.retrain import (
+    RetrainEngine, convex_warm_start, resolve_strategy, supports_warm_start, unfitted_template
+)
+
+
+class MemmapProbe(BaseEstimator, ClassifierMixin):
+    """Predicts class 1 everywhere when fitted and evaluated on memory-mapped X."""
+
+    def fit(self, X, y):
+        self.classes_ = np.unique(y)
+        self.shared_ = isinstance(X, np.memmap)
+        return self
+
+    def predict(self, X):
+        return np.full(X.shape[0], int(self.shared_ and isinstance(X, np.memmap)))
+
+
+def _mean_prediction(y_true, y_pred):
+    return float(np.mean(y_pred))
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(120, 4))
+    y = (X[:, 0] - X[:, 1] + rng.normal(scale=0.7, size=120) > 0).astype(int)
+    return X, y
+
+
+def test_strategy_resolution(data):
+    X, y = data
+    assert supports_warm_start(LogisticRegression())
+    assert not supports_warm_start(RandomForestClassifier())
+    assert not supports_warm_start(DecisionTreeClassifier())
+    assert resolve_strategy(LogisticRegression(), "auto") == "warm_start"
+    assert resolve_strategy(RandomForestClassifier(), "auto") == "refit"
+    # Non-convex: warm starts on request only, never picked by 'auto'
+    assert supports_warm_start(MLPClassifier()) and not convex_warm_start(MLPClassifier())
+    assert resolve_strategy(MLPClassifier(), "auto") == "refit"
+    assert resolve_strategy(MLPClassifier(), "warm_start") == "warm_start"
+    # Stochastic solvers stop at a start-dependent solution
+    assert resolve_strategy(SGDClassifier(), "auto") == "refit"
+    assert resolve_strategy(Lasso(), "auto") == "warm_start"
+    with pytest.raises(ValueError, match="warm_start"):
+        resolve_strategy(DecisionTreeClassifier(), "warm_start")
+    with pytest.raises(ValueError, match="partial_fit"):
+        resolve_strategy(LogisticRegression(), "partial_fit")
+    with pytest.raises(ValueError, match="retrain_strategy"):
+        resolve_strategy(LogisticRegression(), "fast")
+
+
+def test_template_is_unfitted(data):
+    X, y = data
+    model = LogisticRegression().fit(X, y)
+    template = unfitted_template(model)
+    assert not hasattr(template, "coef_")
+    assert template.get_params() == model.get_params()
+
+
+def test_refit_matches_fresh_fit(data):
+    X, y = data
+    model = DecisionTreeClassifier(random_state=0).fit(X, y)
+    engine = RetrainEngine(model, "predict", strategy="refit")
+    perms = PermutationStream(len(y), 3, random_state=1).take(0, 3)
+    out = engine.evaluate(X, y, perms, accuracy_score)
+    assert out.shape == (3, 3)
+    assert np.all(out[:, 1:] >= 0)
+    for row, perm in zip(out, perms):
+        fresh = DecisionTreeClassifier(random_state=0).fit(X, y[perm])
+        assert row[0] == accuracy_score(y[perm], fresh.predict(X))
+
+
+def test_warm_start_independent_of_order(data):
+    X, y = data
+    model = LogisticRegression().fit(X, y)
+    engine = RetrainEngine(model, "predict_proba", strategy="warm_start")
+    perms = PermutationStream(len(y), 4, random_state=2).take(0, 4)
+
+    def log_score(y_true, proba):
+        return float(np.mean(np.log(proba[np.arange(len(y_true)), y_true])))
+
+    forward = engine.evaluate(X, y, perms, log_score)[:, 0]
+    backward = engine.evaluate(X, y, perms[::-1], log_score)[::-1, 0]
+    np.testing.assert_array_equal(forward, backward)
+    cold = [log_score(y[p], LogisticRegression().fit(X, y[p]).predict_proba(X)) for p in perms]
+    np.testing.assert_allclose(forward, cold, atol=1e-3)
+
+
+def test_partial_fit(data):
+    X, y = data
+    model = SGDClassifier(random_state=0).fit(X, y)
+    engine = RetrainEngine(model, "predict", strategy="partial_fit", classes=np.unique(y),
+                           partial_fit_epochs=3)
+    perms = PermutationStream(len(y), 2, random_state=3).take(0, 2)
+    out = engine.evaluate(X, y, perms, accuracy_score)
+    assert np.all((out[:, 0] >= 0) & (out[:, 0] <= 1))
+
+
+def test_detect_bias_reports_timings(data):
+    X, y = data
+    model = LogisticRegression().fit(X, y)
+    result = detect_bias(model, X, y, accuracy_score, n_permutations=8,
+                         null_method="retrain", random_state=0)
+    info = result["retrain"]
+    assert info["strategy"] == "warm_start"
+    assert len(info["fit_times"]) == len(info["predict_times"]) == 8
+    assert info["fit_time_total"] == pytest.approx(sum(info["fit_times"]))
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_detect_bias_refit_deterministic(data, n_jobs):
+    X, y = data
+    model = DecisionTreeClassifier(random_state=0, max_depth=3).fit(X, y)
+    kwargs = dict(n_permutations=10, null_method="retrain", random_state=4,
+                  return_permutations=True, retrain_strategy="refit")
+    reference = detect_bias(model, X, y, accuracy_score, **kwargs)
+    result = detect_bias(model, X, y, accuracy_score, n_jobs=n_jobs, chunk_size=3, **kwargs)
+    np.testing.assert_array_equal(result["permuted_metrics"], reference["permuted_metrics"])
+
+
+def test_detect_bias_subsample_error_bound(data):
+    X, y = data
+    model = LogisticRegression().fit(X, y)
+    result = detect_bias(model, X, y, accuracy_score, n_permutations=20,
+                         null_method="retrain", random_state=0, retrain_subsample=0.5)
+    info = result["retrain"]
+    assert info["subsample_size"] == 60
+    approx = info["approximation"]
+    assert approx["n_calibration"] == 5
+    assert approx["max_abs_error"] >= approx["mean_abs_error"] >= 0
+    low, high = approx["p_value_bounds"]
+    assert low <= result["p_value"] <= high
+
+
+def test_detect_bias_invalid_subsample(data):
+    X, y = data
+    model = LogisticRegression().fit(X, y)
+    with pytest.raises(ValueError, match="retrain_subsample"):
+        detect_bias(model, X, y, accuracy_score, null_method="retrain", retrain_subsample=1)
+
+
+def test_process_workers_fit_on_shared_X(data, monkeypatch):
+    monkeypatch.setattr(scheduler, "MIN_SHARED_BYTES", 0)
+    X, y = data
+    model = MemmapProbe().fit(X, y)
+    kwargs = dict(null_method="retrain", n_permutations=6, random_state=0,
+                  return_permutations=True, retrain_strategy="refit")
+    shared = detect_bias(model, X, y, _mean_prediction, n_jobs=2, backend="processes", **kwargs)
+    assert np.all(shared["permuted_metrics"] == 1.0)
+    local = detect_bias(model, X, y, _mean_prediction, **kwargs)
+    assert np.all(local["permuted_metrics"] == 0.0)
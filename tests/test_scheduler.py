@@ -0,0 +1,307 @@
+"""Tests for the block scheduler (cbd.scheduler)."""
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+from cbd import scheduler as scheduler_module
+from cbd.api import detect_bias
+from cbd.permutations import PermutationStream
+from cbd.multivariate_detection import detect_multivariate_bias
+from cbd.scheduler import (BlockScheduler, auto_block_size, effective_n_jobs,
+                           executor_workers, limit_inner_threads, map_blocks,
+                           resolve_inner_threads)
+
+
+def _sum_task(arrays, perm_block, offset=0.0):
+    return arrays["y"][perm_block] @ arrays["w"] + offset
+
+
+def _kind_task(arrays, perm_block):
+    # 1.0 if the worker sees a memory map, 0.0 if it got a pickled copy
+    return np.full(len(perm_block), float(isinstance(arrays["y"], np.memmap)))
+
+
+def _sparse_task(arrays, perm_block):
+    X = arrays["X"]
+    assert sparse.issparse(X)
+    return np.asarray(X.sum(axis=1)).ravel()[perm_block].sum(axis=1)
+
+
+def _failing_task(arrays, perm_block):
+    raise RuntimeError("boom")
+
+
+def _plain_accuracy(y_true, y_pred):
+    return float(np.mean(np.asarray(y_true) == np.asarray(y_pred)))
+
+
+@pytest.fixture
+def inputs():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=300), rng.normal(size=300)
+
+
+def test_auto_block_size():
+    assert auto_block_size(1000, 4, 100) == 63
+    assert auto_block_size(3, 8, 100) == 1
+    # Capped by the memory bound on index blocks
+    assert auto_block_size(1000, 1, 2 ** 21) == 2
+    assert effective_n_jobs(3) == 3
+    with pytest.raises(ValueError):
+        effective_n_jobs(0)
+
+
+@pytest.mark.parametrize("n_jobs,backend,block", [
+    (1, "threads", None), (2, "threads", None), (3, "threads", 7), (2, "processes", 11),
+])
+def test_results_in_order_and_independent_of_layout(inputs, n_jobs, backend, block):
+    y, w = inputs
+    stream = PermutationStream(len(y), 120, random_state=1)
+    expected = stream.take(0, 120)
+    expected = y[expected] @ w + 2.0
+    with BlockScheduler(n_jobs=n_jobs, backend=backend, block_size=block) as sched:
+        sched.share(y=y, w=w)
+        values = np.concatenate([
+            sched.run(_sum_task, stream, 0, 50, offset=2.0),
+            sched.run(_sum_task, stream, 50, 120, offset=2.0),
+        ])
+    np.testing.assert_allclose(values, expected)
+
+
+def test_process_backend_memory_maps_large_inputs(inputs, monkeypatch):
+    monkeypatch.setattr(scheduler_module, "MIN_SHARED_BYTES", 0)
+    y, _ = inputs
+    stream = PermutationStream(len(y), 8, random_state=0)
+    sched = BlockScheduler(n_jobs=2, backend="processes")
+    sched.share(y=y)
+    folder = sched._folder
+    assert os.path.exists(os.path.join(folder, "y.npy"))
+    try:
+        assert np.all(sched.run(_kind_task, stream, 0, 8) == 1.0)
+    finally:
+        sched.close()
+    assert not os.path.exists(folder)
+
+
+def test_small_inputs_are_not_shared(inputs):
+    y, _ = inputs
+    with BlockScheduler(n_jobs=2, backend="processes") as sched:
+        sched.share(y=y)
+        assert sched._specs["y"][0] == "inline"
+        assert sched._folder is not None
+
+
+def test_sparse_inputs_shared_componentwise(monkeypatch):
+    monkeypatch.setattr(scheduler_module, "MIN_SHARED_BYTES", 0)
+    X = sparse.random(40, 10, density=0.3, format="csr", random_state=0)
+    stream = PermutationStream(40, 6, random_state=2)
+    expected = np.asarray(X.sum(axis=1)).ravel()[stream.take(0, 6)].sum(axis=1)
+    with BlockScheduler(n_jobs=2, backend="processes", block_size=2) as sched:
+        sched.share(X=X)
+        assert sched._specs["X"][0] == "sparse"
+        np.testing.assert_allclose(sched.run(_sparse_task, stream, 0, 6), expected)
+
+
+def test_shared_files_removed_on_failure(inputs, monkeypatch):
+    monkeypatch.setattr(scheduler_module, "MIN_SHARED_BYTES", 0)
+    y, _ = inputs
+    stream = PermutationStream(len(y), 4, random_state=0)
+    with pytest.raises(RuntimeError, match="boom"):
+        with BlockScheduler(n_jobs=2, backend="processes") as sched:
+            sched.share(y=y)
+            folder = sched._folder
+            sched.run(_failing_task, stream, 0, 4)
+    assert not os.path.exists(folder)
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError, match="backend"):
+        BlockScheduler(backend="dask")
+    with pytest.raises(ValueError, match="block_size"):
+        BlockScheduler(block_size=0)
+
+
+@pytest.mark.parametrize("n_jobs,backend", [(2, "threads"), (2, "processes")])
+def test_detect_bias_parallel_matches_sequential(fitted_classifier, n_jobs, backend):
+    X, y, model = fitted_classifier
+    kwargs = dict(n_permutations=60, random_state=5, return_permutations=True)
+    seq = detect_bias(model, X, y, _plain_accuracy, **kwargs)
+    par = detect_bias(model, X, y, _plain_accuracy, n_jobs=n_jobs, backend=backend, **kwargs)
+    np.testing.assert_array_equal(par["permuted_metrics"], seq["permuted_metrics"])
+    assert par["block_size"] == auto_block_size(60, 2, len(y))
+
+
+def test_detect_bias_retrain_uses_refit_predictions(fitted_classifier):
+    X, y, model = fitted_classifier
+    kwargs = dict(null_method="retrain", n_permutations=6, random_state=0,
+                  return_permutations=True)
+    seq = detect_bias(model, X, y, _plain_accuracy, **kwargs)
+    par = detect_bias(model, X, y, _plain_accuracy, n_jobs=2, chunk_size=1, **kwargs)
+    np.testing.assert_array_equal(seq["permuted_metrics"], par["permuted_metrics"])
+    # Scores of refit models on shuffled labels, not of the original model
+    original = _plain_accuracy(y, model.predict(X))
+    assert max(seq["permuted_metrics"]) < original
+
+
+def _square(x, offset=0):
+    return x * x + offset
+
+
+def test_map_blocks_keeps_item_order():
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        assert executor_workers(pool) == 3
+        assert map_blocks(pool, _square, list(range(25)), offset=1) == [x * x + 1 for x in range(25)]
+        assert map_blocks(pool, _square, []) == []
+
+
+@pytest.mark.parametrize("make_pool", [
+    lambda: ThreadPoolExecutor(max_workers=2), lambda: ProcessPoolExecutor(max_workers=2),
+])
+def test_executor_matches_sequential(inputs, make_pool):
+    y, w = inputs
+    stream = PermutationStream(len(y), 90, random_state=4)
+    with BlockScheduler() as sched:
+        sched.share(y=y, w=w)
+        expected = sched.run(_sum_task, stream, 0, 90)
+    with make_pool() as pool:
+        with BlockScheduler(executor=pool) as sched:
+            sched.share(y=y, w=w)
+            assert sched.parallel and sched.n_workers == 2
+            np.testing.assert_array_equal(sched.run(_sum_task, stream, 0, 90), expected)
+        # The scheduler does not shut down the caller's executor
+        assert pool.submit(_square, 3).result() == 9
+
+
+def test_executor_failure_propagates(inputs):
+    y, _ = inputs
+    stream = PermutationStream(len(y), 10, random_state=0)
+    with ThreadPoolExecutor(max_workers=2) as pool, BlockScheduler(executor=pool) as sched:
+        sched.share(y=y)
+        with pytest.raises(RuntimeError, match="boom"):
+            sched.run(_failing_task, stream, 0, 10)
+
+
+def test_detect_bias_executor(fitted_classifier):
+    X, y, model = fitted_classifier
+    kwargs = dict(n_permutations=60, random_state=5, return_permutations=True)
+    seq = detect_bias(model, X, y, _plain_accuracy, **kwargs)
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        result = detect_bias(model, X, y, _plain_accuracy, executor=pool, **kwargs)
+    np.testing.assert_array_equal(result["permuted_metrics"], seq["permuted_metrics"])
+    assert result["backend"] == "executor:ProcessPoolExecutor"
+    with pytest.raises(ValueError, match="submit"):
+        detect_bias(model, X, y, _plain_accuracy, executor=object())
+
+
+def test_detect_bias_shares_only_task_inputs(fitted_classifier, monkeypatch):
+    from sklearn.metrics import accuracy_score
+    X, y, model = fitted_classifier
+    shared, sent = [], []
+    share, run = BlockScheduler.share, BlockScheduler.run
+    monkeypatch.setattr(BlockScheduler, "share",
+                        lambda self, **arrays: shared.append(set(arrays)) or share(self, **arrays))
+    monkeypatch.setattr(BlockScheduler, "run", lambda self, task, *args, **kwargs:
+                        sent.append(kwargs) or run(self, task, *args, **kwargs))
+    kwargs = dict(n_permutations=60, random_state=0, return_permutations=True)
+    seq = detect_bias(model, X, y, accuracy_score, **kwargs)
+    par = detect_bias(model, X, y, accuracy_score, n_jobs=2, backend="processes", **kwargs)
+    np.testing.assert_array_equal(par["permuted_metrics"], seq["permuted_metrics"])
+    # Label codes are shared once; tasks carry the metric without them
+    assert shared[-1] == {"true_codes", "pred_codes"}
+    assert sent[-1]["batched"].true_codes is None
+    detect_bias(model, X, y, _plain_accuracy, **kwargs)
+    assert shared[-1] == {"y", "y_pred"}
+    detect_bias(model, X, y, _plain_accuracy, null_method="retrain", retrain_strategy="refit",
+                n_permutations=4, random_state=0)
+    assert shared[-1] == {"y", "X"}
+
+
+def test_multivariate_executor(fitted_classifier):
+    from sklearn.metrics import accuracy_score, f1_score
+    X, y, model = fitted_classifier
+    kwargs = dict(n_permutations=40, random_state=1)
+    seq = detect_multivariate_bias(model, X, y, [accuracy_score, f1_score], **kwargs)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        result = detect_multivariate_bias(model, X, y, [accuracy_score, f1_score],
+                                          executor=pool, **kwargs)
+    assert result["p_value"] == seq["p_value"]
+    assert result["individual_stats"] == seq["individual_stats"]
+
+
+def test_multivariate_predicts_once(fitted_classifier, monkeypatch):
+    from sklearn.metrics import accuracy_score, f1_score
+    X, y, model = fitted_classifier
+    calls = []
+    predict = model.predict
+    monkeypatch.setattr(model, "predict", lambda X_: calls.append(1) or predict(X_),
+                        raising=False)
+    kwargs = dict(n_permutations=300, random_state=1)
+    seq = detect_multivariate_bias(model, X, y, [accuracy_score, f1_score], **kwargs)
+    threaded = detect_multivariate_bias(model, X, y, [accuracy_score, f1_score], n_jobs=2,
+                                        **kwargs)
+    assert len(calls) == 2
+    assert threaded["individual_stats"] == seq["individual_stats"]
+
+
+def test_detect_bias_dask_local_cluster(fitted_classifier):
+    distributed = pytest.importorskip("dask.distributed")
+    X, y, model = fitted_classifier
+    kwargs = dict(n_permutations=40, random_state=2, return_permutations=True)
+    seq = detect_bias(model, X, y, _plain_accuracy, **kwargs)
+    with distributed.LocalCluster(n_workers=2, threads_per_worker=1, processes=False) as cluster, \
+            distributed.Client(cluster) as client:
+        result = detect_bias(model, X, y, _plain_accuracy, executor=client, **kwargs)
+    np.testing.assert_array_equal(result["permuted_metrics"], seq["permuted_metrics"])
+
+
+def _blas_threads_task(arrays, perm_block):
+    from threadpoolctl import threadpool_info
+    counts = [info["num_threads"] for info in threadpool_info() if info["user_api"] == "blas"]
+    return np.full(len(perm_block), float(max(counts, default=-1)))
+
+
+def test_resolve_inner_threads(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 64)
+    assert resolve_inner_threads(None, 8) is None
+    assert resolve_inner_threads("auto", 1) is None
+    assert resolve_inner_threads("auto", 8) == 8
+    assert resolve_inner_threads("auto", 128) == 1
+    assert resolve_inner_threads(3, 8) == 3
+    for bad in (0, "all", 1.5):
+        with pytest.raises(ValueError, match="inner_threads"):
+            resolve_inner_threads(bad, 2)
+
+
+@pytest.mark.parametrize("n_jobs,backend", [(1, "threads"), (2, "threads"), (2, "processes")])
+def test_inner_threads_limit_native_pools(n_jobs, backend):
+    threadpoolctl = pytest.importorskip("threadpoolctl")
+    if not any(info["user_api"] == "blas" for info in threadpoolctl.threadpool_info()):
+        pytest.skip("no BLAS thread pool loaded")
+    stream = PermutationStream(10, 8, random_state=0)
+    with BlockScheduler(n_jobs=n_jobs, backend=backend, inner_threads=1) as sched:
+        assert np.all(sched.run(_blas_threads_task, stream, 0, 8) == 1.0)
+        layout = sched.layout()
+    assert layout["threads_per_worker"] == 1
+    assert layout["scope"] == ("worker" if backend == "processes" else "process")
+    assert layout["total_threads"] == layout["n_workers"]
+
+
+def test_limit_inner_threads_is_noop_without_limit():
+    with limit_inner_threads(None):
+        pass
+
+
+def test_detect_bias_reports_thread_layout(fitted_classifier):
+    X, y, model = fitted_classifier
+    result = detect_bias(model, X, y, _plain_accuracy, n_permutations=20, random_state=0,
+                         n_jobs=2, inner_threads=2)
+    layout = result["thread_layout"]
+    assert layout["n_workers"] == 2
+    assert layout["threads_per_worker"] == 2 and layout["total_threads"] == 4
+    sequential = detect_bias(model, X, y, _plain_accuracy, n_permutations=20, random_state=0)
+    assert sequential["thread_layout"]["threads_per_worker"] is None
+    with pytest.raises(ValueError, match="inner_threads"):
+        detect_bias(model, X, y, _plain_accuracy, inner_threads=0)
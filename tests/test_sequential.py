@@ -0,0 +1,178 @@
+"""Tests for sequential early-stopping permutation tests."""
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+
+from cbd.api import detect_bias
+from cbd.sequential import SPRT, BesagClifford, TimeBudget, make_stopping_rule
+
+
+class TestStoppingRules:
+    """Unit tests for the stopping rules."""
+
+    def test_besag_clifford_stops_at_h_th_exceedance(self):
+        exceed = np.zeros(100, dtype=bool)
+        exceed[[3, 10, 41, 77]] = True
+        for chunk in (1, 7, 100):
+            rule = BesagClifford(h=3, chunk_size=chunk)
+            for start in range(0, 100, chunk):
+                n_keep, reason = rule.update(exceed[start:start + chunk])
+                if reason is not None:
+                    break
+            assert reason == "h_exceedances"
+            assert rule.n_used == 42
+            assert rule.p_value() == pytest.approx(3 / 42)
+
+    def test_besag_clifford_without_stop(self):
+        rule = BesagClifford(h=5)
+        rule.update(np.array([True, False, False]))
+        assert not rule.stopped
+        assert rule.p_value() == pytest.approx(2 / 4)
+
+    def test_sprt_accepts_quickly_when_p_large(self):
+        rng = np.random.default_rng(0)
+        rule = SPRT(alpha=0.05)
+        n_keep, reason = rule.update(rng.random(1000) < 0.5)
+        assert reason == "not_significant"
+        assert n_keep < 50
+
+    def test_sprt_rejects_when_p_tiny(self):
+        rule = SPRT(alpha=0.05)
+        n_keep, reason = rule.update(np.zeros(1000, dtype=bool))
+        assert reason == "significant"
+        assert rule.p_value() < 0.05
+
+    def test_rule_instances_are_reset(self):
+        rule = BesagClifford(h=1)
+        rule.update(np.array([True]))
+        assert make_stopping_rule(rule, 0.05).n_used == 0
+
+    def test_unknown_rule_raises(self):
+        with pytest.raises(ValueError, match="Unknown early_stopping rule"):
+            make_stopping_rule("bogus", 0.05)
+
+
+class TestDetectBiasEarlyStopping:
+    """detect_bias(early_stopping=...) integration."""
+
+    @pytest.fixture
+    def data(self):
+        X, y = make_classification(n_samples=200, n_features=8, random_state=0)
+        return X, y
+
+    def test_clean_model_stops_early(self, data):
+        X, y = data
+        y_unrelated = np.roll(y, 5)
+
+        class RandomModel:
+            def predict(self, X):
+                return y_unrelated
+
+        result = detect_bias(RandomModel(), X, y, accuracy_score, n_permutations=5000,
+                             random_state=0, early_stopping="sprt",
+                             return_permutations=True)
+        assert result["stopping_reason"] == "not_significant"
+        assert result["n_permutations_used"] < 5000
+        assert len(result["permuted_metrics"]) == result["n_permutations_used"]
+        assert result["p_value"] > 0.05
+
+    def test_strong_model_flagged(self, data):
+        X, y = data
+        model = LogisticRegression(max_iter=1000).fit(X, y)
+        result = detect_bias(model, X, y, accuracy_score, n_permutations=5000,
+                             random_state=0, early_stopping="sprt")
+        assert result["stopping_reason"] == "significant"
+        assert result["n_permutations_used"] < 1000
+        assert result["p_value"] <= 0.05
+
+    def test_budget_exhausted(self, data):
+        X, y = data
+        model = LogisticRegression(max_iter=1000).fit(X, y)
+        result = detect_bias(model, X, y, accuracy_score, n_permutations=60,
+                             random_state=0, early_stopping=BesagClifford(h=5))
+        assert result["stopping_reason"] == "completed"
+        assert result["n_permutations_used"] == 60
+        assert result["early_stopping"] == "besag_clifford"
+
+    def test_prefix_of_full_run(self, data):
+        X, y = data
+        model = LogisticRegression(max_iter=1000).fit(X, y)
+        noisy = y.copy()
+        noisy[::2] = 1 - noisy[::2]
+        full = detect_bias(model, X, noisy, accuracy_score, n_permutations=300,
+                           random_state=1, return_permutations=True)
+        early = detect_bias(model, X, noisy, accuracy_score, n_permutations=300,
+                            random_state=1, return_permutations=True,
+                            early_stopping="besag_clifford")
+        n_used = early["n_permutations_used"]
+        np.testing.assert_array_equal(early["permuted_metrics"], full["permuted_metrics"][:n_used])
+
+    def test_exact_incompatible(self, data):
+        X, y = data
+        model = LogisticRegression(max_iter=1000).fit(X, y)
+        with pytest.raises(ValueError, match="early_stopping"):
+            detect_bias(model, X, y, accuracy_score, exact=True, early_stopping="sprt")
+
+
+class TestTimeBudget:
+    """Time-budgeted anytime mode."""
+
+    @pytest.fixture
+    def data(self):
+        X, y = make_classification(n_samples=200, n_features=8, random_state=0)
+        return X, y
+
+    def test_round_sizes(self):
+        budget = TimeBudget(60.0, first_round=10)
+        assert budget.next_round(0, 1000) == 10
+        # Growth is capped relative to the permutations already done
+        assert budget.next_round(10, 1000) <= 20
+        assert budget.next_round(10, 5) <= 5
+        assert budget.next_round(10, 0) == 0
+
+    def test_exhausted_budget(self):
+        budget = TimeBudget(1e-6, first_round=10)
+        assert budget.next_round(0, 1000) == 10
+        assert budget.next_round(10, 990) == 0
+        assert budget.exhausted
+
+    def test_invalid_budget(self):
+        with pytest.raises(ValueError, match="time_budget_s"):
+            TimeBudget(0)
+
+    def test_detect_bias_stops_on_budget(self, data):
+        X, y = data
+        model = LogisticRegression(max_iter=1000).fit(X, y)
+
+        def slow_accuracy(y_true, y_pred):
+            return float(np.mean(np.asarray(y_true) == np.asarray(y_pred)))
+
+        result = detect_bias(model, X, y, slow_accuracy, n_permutations=10 ** 7,
+                             random_state=0, time_budget_s=0.3, return_permutations=True)
+        assert result["stopping_reason"] == "time_budget"
+        assert 64 <= result["n_permutations_used"] < 10 ** 7
+        assert result["elapsed_s"] < 1.0
+        lower, upper = result["p_value_ci"]
+        assert result["p_value_ci_width"] == pytest.approx(upper - lower)
+        assert result["decision_determined"] == (upper <= 0.05 or lower > 0.05)
+        # The budgeted run is a prefix of the fixed-size stream
+        full = detect_bias(model, X, y, slow_accuracy, n_permutations=result["n_permutations_used"],
+                           random_state=0, return_permutations=True)
+        np.testing.assert_array_equal(result["permuted_metrics"], full["permuted_metrics"])
+
+    def test_detect_bias_completes_within_budget(self, data):
+        X, y = data
+        model = LogisticRegression(max_iter=1000).fit(X, y)
+        result = detect_bias(model, X, y, accuracy_score, n_permutations=200,
+                             random_state=0, time_budget_s=30.0)
+        assert result["stopping_reason"] == "completed"
+        assert result["n_permutations_used"] == 200
+        assert result["decision_determined"]
+
+    def test_exact_incompatible(self, data):
+        X, y = data
+        model = LogisticRegression(max_iter=1000).fit(X, y)
+        with pytest.raises(ValueError, match="time_budget_s"):
+            detect_bias(model, X, y, accuracy_score, exact=True, time_budget_s=1.0)
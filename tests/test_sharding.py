@@ -0,0 +1,92 @@
+"""Tests for sharded permutation runs (cbd.sharding)."""
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score
+
+from cbd import merge_permutation_results
+from cbd.api import detect_bias
+from cbd.sharding import save_shard_result, shard_bounds
+from circular_bias_detector.core.permutation import permutation_test
+
+
+def test_shard_bounds_partition():
+    bounds = [shard_bounds(1003, i, 4) for i in range(4)]
+    assert bounds[0][0] == 0 and bounds[-1][1] == 1003
+    assert all(a[1] == b[0] for a, b in zip(bounds, bounds[1:]))
+    assert {b - a for a, b in bounds} <= {250, 251}
+    with pytest.raises(ValueError):
+        shard_bounds(10, 3, 3)
+
+
+@pytest.mark.parametrize("return_permutations", [True, False])
+def test_merge_equals_single_node(fitted_classifier, return_permutations):
+    X, y, model = fitted_classifier
+    kwargs = dict(n_permutations=1200, random_state=5, return_permutations=return_permutations)
+    single = detect_bias(model, X, y, accuracy_score, **kwargs)
+    shards = [detect_bias(model, X, y, accuracy_score, shard_index=i, n_shards=3, **kwargs)
+              for i in (2, 0, 1)]
+    assert shards[1]["n_permutations"] == 400
+    merged = merge_permutation_results(shards)
+    for key in ("p_value", "p_value_ci", "conclusion", "n_permutations", "observed_metric"):
+        assert merged[key] == single[key]
+    assert ("permuted_metrics" in merged) == return_permutations
+    if return_permutations:
+        np.testing.assert_array_equal(merged["permuted_metrics"], single["permuted_metrics"])
+    assert "shard" not in merged
+
+
+def test_merge_from_files(tmp_path, fitted_classifier):
+    X, y, model = fitted_classifier
+    kwargs = dict(null_method="retrain", n_permutations=9, random_state=1, return_permutations=True)
+    single = detect_bias(model, X, y, accuracy_score, **kwargs)
+    paths = []
+    for i in range(2):
+        path = tmp_path / f"shard{i}.json"
+        save_shard_result(detect_bias(model, X, y, accuracy_score, shard_index=i, n_shards=2,
+                                      **kwargs), path)
+        paths.append(path)
+    merged = merge_permutation_results(paths)
+    np.testing.assert_array_equal(merged["permuted_metrics"], single["permuted_metrics"])
+    assert merged["p_value"] == single["p_value"]
+    assert len(merged["retrain"]["fit_times"]) == 9
+
+
+def test_merge_rejects_inconsistent_shards(fitted_classifier):
+    X, y, model = fitted_classifier
+    a = detect_bias(model, X, y, accuracy_score, n_permutations=50, random_state=1,
+                    shard_index=0, n_shards=2)
+    b = detect_bias(model, X, y, accuracy_score, n_permutations=50, random_state=2,
+                    shard_index=1, n_shards=2)
+    with pytest.raises(ValueError, match="fingerprint"):
+        merge_permutation_results([a, b])
+    with pytest.raises(ValueError, match="exactly once"):
+        merge_permutation_results([a, a])
+    with pytest.raises(ValueError, match="exactly once"):
+        merge_permutation_results([a])
+
+
+def test_shard_argument_validation(fitted_classifier):
+    X, y, model = fitted_classifier
+    with pytest.raises(ValueError, match="random_state"):
+        detect_bias(model, X, y, accuracy_score, shard_index=0, n_shards=2)
+    with pytest.raises(ValueError, match="together"):
+        detect_bias(model, X, y, accuracy_score, random_state=0, shard_index=0)
+    with pytest.raises(ValueError, match="early_stopping"):
+        detect_bias(model, X, y, accuracy_score, random_state=0, shard_index=0, n_shards=2,
+                    early_stopping="sprt")
+
+
+def test_permutation_test_shards():
+    rng = np.random.default_rng(0)
+    perf, const = rng.random((12, 3)), rng.random((12, 2))
+
+    def spread(p, c):
+        return float(np.std(p.mean(axis=1) - c.mean(axis=1)))
+
+    single = permutation_test(perf, const, spread, n_permutations=200, random_seed=3)
+    shards = [permutation_test(perf, const, spread, n_permutations=200, random_seed=3,
+                               shard_index=i, n_shards=4) for i in range(4)]
+    merged = merge_permutation_results(shards)
+    np.testing.assert_array_equal(merged["permuted_values"], single["permuted_values"])
+    for key in ("p_value", "ci_lower", "ci_upper", "n_permutations", "n_failed"):
+        assert merged[key] == single[key]
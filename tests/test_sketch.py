@@ -0,0 +1,103 @@
+"""Tests for compact null summaries (cbd.sketch)."""
+import json
+
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, log_loss
+
+from cbd import merge_permutation_results
+from cbd.api import detect_bias
+from cbd.sketch import KLLSketch, NullSummary, summarize_null
+
+
+def _max_rank_error(sketch, sorted_values, qs):
+    ranks = np.searchsorted(sorted_values, sketch.quantile(qs)) / len(sorted_values)
+    return np.max(np.abs(ranks - qs))
+
+
+def test_kll_accuracy_and_size():
+    values = np.random.default_rng(0).normal(size=200_000)
+    sketch = KLLSketch(k=200, random_state=0)
+    for chunk in np.array_split(values, 40):
+        sketch.update(chunk)
+    qs = np.linspace(0.01, 0.99, 99)
+    assert sketch.n == len(values)
+    assert sketch.n_retained < 3 * 200
+    assert _max_rank_error(sketch, np.sort(values), qs) < 0.02
+    assert sketch.count_at_least(0.0) == pytest.approx(np.sum(values >= 0), rel=0.03)
+
+
+def test_kll_merge():
+    values = np.random.default_rng(1).random(100_000)
+    parts = [KLLSketch(random_state=i).update(c) for i, c in enumerate(np.array_split(values, 7))]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    assert merged.n == len(values)
+    assert _max_rank_error(merged, np.sort(values), np.linspace(0.05, 0.95, 19)) < 0.02
+
+
+def test_null_summary_exact_parts_merge_exactly():
+    values = np.random.default_rng(2).exponential(size=50_000)
+    thresholds = [0.5, 3.0]
+    whole = summarize_null(values, thresholds)
+    parts = [summarize_null(c, thresholds) for c in np.array_split(values, 5)]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    for summary in (whole, merged):
+        assert summary.count_extreme(3.0) == np.sum(values >= 3.0)
+        assert summary.p_value(3.0) == (np.sum(values >= 3.0) + 1) / (len(values) + 1)
+        assert summary.mean == pytest.approx(values.mean())
+        assert summary.std == pytest.approx(values.std(ddof=1))
+        assert summary.max == values.max()
+    with pytest.raises(ValueError, match="thresholds"):
+        merged.merge(summarize_null(values, [1.0]))
+
+
+def test_null_summary_round_trip():
+    values = np.random.default_rng(3).normal(size=1_000_000)
+    summary = summarize_null(values, [2.5])
+    encoded = json.dumps(summary.to_dict())
+    assert len(encoded) < 10_000
+    restored = NullSummary.from_dict(json.loads(encoded))
+    assert restored.count_extreme(2.5) == summary.count_extreme(2.5)
+    np.testing.assert_array_equal(restored.quantile([0.1, 0.9]), summary.quantile([0.1, 0.9]))
+
+
+def test_detect_bias_null_summary(fitted_classifier):
+    X, y, model = fitted_classifier
+    result = detect_bias(model, X, y, accuracy_score, n_permutations=500, random_state=0,
+                         return_permutations=True, null_summary=True, null_thresholds=[0.55])
+    null = result["permuted_metrics"]
+    assert isinstance(null, np.ndarray) and null.dtype == np.float64
+    summary = NullSummary.from_dict(json.loads(json.dumps(result["null_summary"])))
+    assert summary.n == 500
+    assert summary.count_extreme(0.55) == np.sum(null >= 0.55)
+    observed = result["observed_metric"]
+    assert summary.p_value(observed) == result["p_value"]
+
+
+def test_loss_null_summary_counts_lower_tail(fitted_classifier):
+    X, y, model = fitted_classifier
+    result = detect_bias(model, X, y, log_loss, n_permutations=300, random_state=0,
+                         allow_proba=True, return_permutations=True, null_summary=True)
+    null = result["permuted_metrics"]
+    summary = NullSummary.from_dict(result["null_summary"])
+    assert not summary.greater_is_better
+    observed = result["observed_metric"]
+    assert summary.count_extreme(observed) == np.sum(null <= observed)
+    assert summary.p_value(observed) == result["p_value"] < 0.05
+    with pytest.raises(ValueError, match="greater_is_better"):
+        summary.merge(summarize_null(null, summary.thresholds))
+
+
+def test_sharded_null_summaries_merge(fitted_classifier):
+    X, y, model = fitted_classifier
+    kwargs = dict(n_permutations=300, random_state=4, null_summary=True)
+    single = detect_bias(model, X, y, accuracy_score, **kwargs)
+    merged = merge_permutation_results(
+        [detect_bias(model, X, y, accuracy_score, shard_index=i, n_shards=3, **kwargs)
+         for i in range(3)])
+    assert merged["null_summary"]["exceedances"] == single["null_summary"]["exceedances"]
+    assert merged["null_summary"]["n"] == 300
@@ -0,0 +1,98 @@
+"""Tests for the closed-form retrain null (cbd.smoothers)."""
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.kernel_ridge import KernelRidge
+from sklearn.linear_model import Lasso, LinearRegression, Ridge
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.neighbors import KNeighborsRegressor
+
+from cbd.api import detect_bias
+from cbd.permutations import PermutationStream
+from cbd.smoothers import LinearSmoother, as_smoother, smoother_from_estimator
+
+
+@pytest.fixture
+def regression():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(80, 5))
+    y = X @ rng.normal(size=5) + rng.normal(scale=0.5, size=80)
+    return X, y
+
+
+@pytest.mark.parametrize("model", [
+    LinearRegression(),
+    LinearRegression(fit_intercept=False),
+    Ridge(alpha=3.0),
+    Ridge(alpha=0.5, fit_intercept=False),
+    KernelRidge(alpha=0.7, kernel="rbf", gamma=0.2),
+    KNeighborsRegressor(n_neighbors=4),
+])
+def test_smoother_matches_refit(regression, model):
+    X, y = regression
+    H = smoother_from_estimator(model, X)
+    assert H is not None
+    perms = PermutationStream(len(y), 3, random_state=1).take(0, 3)
+    predictions = H.apply(y[perms])
+    for perm, pred in zip(perms, predictions):
+        refit = model.fit(X, y[perm]).predict(X)
+        np.testing.assert_allclose(pred, refit, atol=1e-6)
+
+
+def test_low_rank_storage(regression):
+    X, y = regression
+    H = smoother_from_estimator(Ridge(alpha=1.0), X)
+    assert H.matrix is None
+    assert H.basis.shape == (80, 5)
+    assert H.rank == 5
+
+
+def test_unrecognized_estimators(regression):
+    X, y = regression
+    assert smoother_from_estimator(Lasso(), X) is None
+    assert smoother_from_estimator(KNeighborsRegressor(weights="distance"), X) is None
+    assert smoother_from_estimator(Ridge(positive=True), X) is None
+
+
+def test_explicit_smoother_validation(regression):
+    X, y = regression
+    with pytest.raises(ValueError, match="80 rows"):
+        as_smoother(np.eye(10), 80)
+    with pytest.raises(ValueError, match="square"):
+        LinearSmoother(matrix=np.ones((3, 2)))
+    H = as_smoother(sparse.identity(80, format="csr"), 80)
+    np.testing.assert_allclose(H.apply(y[None, :])[0], y)
+
+
+@pytest.mark.parametrize("model", [Ridge(alpha=2.0), KNeighborsRegressor(n_neighbors=3)])
+def test_detect_bias_closed_form_matches_refit(regression, model):
+    X, y = regression
+    model.fit(X, y)
+    kwargs = dict(null_method="retrain", n_permutations=15, random_state=3,
+                  return_permutations=True)
+    closed = detect_bias(model, X, y, r2_score, **kwargs)
+    refit = detect_bias(model, X, y, r2_score, retrain_strategy="refit", **kwargs)
+    assert closed["retrain"]["strategy"] == "closed_form"
+    assert refit["retrain"]["strategy"] == "refit"
+    np.testing.assert_allclose(closed["permuted_metrics"], refit["permuted_metrics"], atol=1e-8)
+    assert closed["p_value"] == refit["p_value"]
+
+
+def test_detect_bias_explicit_smoother(regression):
+    X, y = regression
+    model = LinearRegression().fit(X, y)
+    n = len(y)
+    H = np.full((n, n), 1.0 / n)  # intercept-only model
+    result = detect_bias(model, X, y, mean_squared_error, null_method="retrain",
+                         n_permutations=10, random_state=0, smoother=H,
+                         return_permutations=True)
+    assert result["retrain"]["smoother"] == "explicit"
+    np.testing.assert_allclose(result["permuted_metrics"], np.var(y))
+
+
+def test_detect_bias_closed_form_required(regression):
+    X, y = regression
+    model = Lasso().fit(X, y)
+    with pytest.raises(ValueError, match="closed_form"):
+        detect_bias(model, X, y, r2_score, null_method="retrain",
+                    retrain_strategy="closed_form")
@@ -0,0 +1,78 @@
+"""Tests for the standalone detect_bias in src/cbd/api.py."""
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score
+
+from cbd.permutations import PermutationStream
+
+
+def _load_src_api():
+    path = Path(__file__).resolve().parents[1] / "src" / "cbd" / "api.py"
+    spec = importlib.util.spec_from_file_location("src_cbd_api", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+src_api = _load_src_api()
+
+
+@pytest.mark.parametrize("stratify", [False, True])
+def test_results_identical_for_any_n_jobs(noisy_predictions, stratify, stored_predictor):
+    X, y, y_pred = noisy_predictions
+    groups = np.arange(len(y)) % 5 if stratify else None
+    results = [
+        src_api.detect_bias(stored_predictor(y_pred), X, y, accuracy_score,
+                            n_permutations=97, random_state=11, return_permutations=True,
+                            stratify=groups, n_jobs=n_jobs)
+        for n_jobs in (1, 2, 3, 8)
+    ]
+    for res in results[1:]:
+        assert res["permuted_metrics"] == results[0]["permuted_metrics"]
+        assert res["p_value"] == results[0]["p_value"]
+
+
+def test_permuted_metrics_in_stream_order(noisy_predictions, stored_predictor):
+    X, y, y_pred = noisy_predictions
+    res = src_api.detect_bias(stored_predictor(y_pred), X, y, accuracy_score,
+                              n_permutations=40, random_state=3, return_permutations=True,
+                              n_jobs=4)
+    stream = src_api.PermutationStream(len(y), 40, 3)
+    expected = [accuracy_score(y[idx], y_pred) for idx in stream.take(0, 40)]
+    np.testing.assert_allclose(res["permuted_metrics"], expected)
+
+
+def test_worker_ranges():
+    assert src_api._worker_ranges(10, 3) == [(0, 3), (3, 6), (6, 10)]
+    assert src_api._worker_ranges(2, 8) == [(0, 1), (1, 2)]
+    assert src_api._worker_ranges(0, 4) == []
+
+
+def test_stratified_path_uses_grouped_stream(noisy_predictions, stored_predictor, monkeypatch):
+    X, y, y_pred = noisy_predictions
+    groups = np.arange(len(y)) % 5
+    created = []
+
+    class RecordingStream(src_api.PermutationStream):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(kwargs.get("groups"))
+
+    monkeypatch.setattr(src_api, "PermutationStream", RecordingStream)
+    res = src_api.detect_bias(stored_predictor(y_pred), X, y, accuracy_score,
+                              n_permutations=40, random_state=3, return_permutations=True,
+                              stratify=groups, n_jobs=2)
+    assert len(created) == 1
+    np.testing.assert_array_equal(created[0], groups)
+    stream = PermutationStream(len(y), 40, 3, groups=groups)
+    expected = [accuracy_score(y[idx], y_pred) for idx in stream.take(0, 40)]
+    np.testing.assert_allclose(res["permuted_metrics"], expected)
+
+
+def test_stratify_length_checked(noisy_predictions, stored_predictor):
+    X, y, y_pred = noisy_predictions
+    with pytest.raises(ValueError, match="same length"):
+        src_api.detect_bias(stored_predictor(y_pred), X, y, accuracy_score, stratify=[0, 1])
@@ -0,0 +1,76 @@
+"""Tests for tail-extrapolated permutation p-values (cbd.tail)."""
+import numpy as np
+import pytest
+from scipy import stats
+from sklearn.metrics import accuracy_score, r2_score
+
+from cbd.api import detect_bias
+from cbd.tail import gpd_tail_pvalue
+
+
+def test_empirical_when_enough_exceedances():
+    null = np.random.default_rng(0).normal(size=1000)
+    result = gpd_tail_pvalue(null, 1.0)
+    assert result["method"] == "empirical"
+    assert result["p_value"] == (np.sum(null >= 1.0) + 1) / 1001
+
+
+def test_heavy_tail_extrapolation():
+    null = np.random.default_rng(1).pareto(3, size=2000)
+    result = gpd_tail_pvalue(null, 15.0, random_state=0)
+    truth = stats.lomax.sf(15.0, 3)
+    assert result["method"] == "gpd"
+    assert result["tail_model"] == "gpd"
+    assert result["shape"] > 0
+    lower, upper = result["p_value_ci"]
+    assert lower <= result["p_value"] <= upper
+    assert truth / 5 < result["p_value"] < truth * 5
+
+
+def test_light_tail_is_conservative():
+    # A normal null gives a negative fitted shape; the exponential tail keeps p > 0
+    null = np.random.default_rng(2).normal(size=2000)
+    result = gpd_tail_pvalue(null, 6.0, random_state=0)
+    assert result["tail_model"] == "exponential"
+    assert result["shape"] == 0.0
+    assert stats.norm.sf(6.0) < result["p_value"] < 1 / 2001
+
+
+def test_too_few_permutations():
+    null = np.random.default_rng(3).normal(size=50)
+    result = gpd_tail_pvalue(null, 10.0)
+    assert result["fit_failed"]
+    assert result["p_value"] == 1 / 51
+
+
+def test_detect_bias_tail_approximation(stored_predictor, row_ids):
+    rng = np.random.default_rng(0)
+    y = rng.normal(size=300)
+    y_pred = 0.3 * y + np.sqrt(1 - 0.09) * rng.normal(size=300)
+    X = row_ids(300)
+    kwargs = dict(n_permutations=1000, random_state=1)
+    result = detect_bias(stored_predictor(y_pred), X, y, r2_score, tail_approximation=True, **kwargs)
+    assert result["p_value_method"] == "gpd_tail"
+    assert 0 < result["p_value"] < 1 / 1001
+    assert result["tail_fit"]["n_exceedances"] == 0
+    lower, upper = result["p_value_ci"]
+    assert lower <= result["p_value"] <= upper
+    again = detect_bias(stored_predictor(y_pred), X, y, r2_score, tail_approximation=True, **kwargs)
+    assert again["p_value"] == result["p_value"]
+
+
+def test_detect_bias_tail_not_needed(stored_predictor, row_ids):
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 200)
+    result = detect_bias(stored_predictor(rng.integers(0, 2, 200)), row_ids(200), y,
+                         accuracy_score, n_permutations=200, random_state=0,
+                         tail_approximation=True)
+    assert result["p_value_method"] == "permutation"
+    assert result["tail_fit"]["method"] == "empirical"
+
+
+def test_detect_bias_tail_incompatible_options(stored_predictor, row_ids):
+    y = np.array([0, 1] * 20)
+    with pytest.raises(ValueError, match="tail_approximation"):
+        detect_bias(stored_predictor(y), row_ids(40), y, accuracy_score,
+                    tail_approximation=True, early_stopping="besag_clifford")